@@ -0,0 +1,63 @@
+import os
+from datetime import date
+from typing import Dict, Optional
+
+import numpy as np
+import streamlit.components.v1 as components
+
+from calibration import SCALE_RANGE, SCALE_UPPER_RANGE
+from calibration_curves import UVI_HIGH, UVI_LOW
+from datasets import SECONDS_PER_DAY, NiwaDataset, SeriesDataset, UviDataset, date_to_day
+
+FRONTEND_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "client_scaler_frontend")
+# Same step as the sliders in main.py (only applied to values the user drags)
+SLIDER_STEP = 0.05
+
+_client_scaler = components.declare_component("client_scaler", path=FRONTEND_DIR)
+
+
+def series_payload(dataset: SeriesDataset, selected_date: date) -> Dict:
+    """One date of a series as JSON-friendly lists: local epoch seconds and UVI (3 dp)."""
+    sl = dataset.date_slice(selected_date)
+    return {
+        "t": dataset.local_epoch[sl].tolist(),
+        "v": np.round(dataset.uvi[sl].astype(np.float64), 3).tolist(),
+    }
+
+
+def client_scaler(
+    selected_date: date,
+    niwa_clear_sky_hourly: NiwaDataset,
+    niwa_cloudy_sky_hourly: NiwaDataset,
+    uvi_5min: UviDataset,
+    uvi_scale: float,
+    uvi_scale_upper: float,
+    key: str = "client_scaler"
+) -> Optional[Dict]:
+    """
+    Interactive day plot that applies the calibration in the browser.
+
+    The raw readings and NIWA curves for selected_date are sent once; moving the
+    sliders rescales the device series client-side (same model as scale_uvi), so it
+    costs no reruns. Args only change when the date or the saved settings change.
+
+    Returns:
+        dict: The last saved {"uvi_scale", "uvi_scale_upper", "saved_at"} (epoch ms),
+            or None before the first save.
+    """
+    return _client_scaler(
+        date=str(selected_date),
+        day_start=date_to_day(selected_date) * SECONDS_PER_DAY,
+        clear=series_payload(niwa_clear_sky_hourly, selected_date),
+        cloudy=series_payload(niwa_cloudy_sky_hourly, selected_date),
+        uvi=series_payload(uvi_5min, selected_date),
+        uvi_scale=float(uvi_scale),
+        uvi_scale_upper=float(uvi_scale_upper),
+        uvi_low=UVI_LOW,
+        uvi_high=UVI_HIGH,
+        scale_range=list(SCALE_RANGE),
+        upper_range=list(SCALE_UPPER_RANGE),
+        step=SLIDER_STEP,
+        key=key,
+        default=None,
+    )
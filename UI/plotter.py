@@ -1,92 +1,169 @@
-import matplotlib.pyplot as plt
 import matplotlib.dates as mdates
 from datetime import date
-from typing import List, Dict
+from typing import Optional
+from matplotlib.figure import Figure
 from IPython.display import display
 
+from calibration_curves import Curve, DeviceCurveHistory, TwoFactorCurve
+from datasets import SECONDS_PER_DAY, NiwaDataset, UviDataset
+from decimation import DEFAULT_MAX_POINTS, DecimationPyramid
+from instrumentation import stage
+
+# Fixed margins (roughly what tight_layout picks) for reused figures, so a plot never
+# depends on which date the figure happened to draw before it
+FIXED_LAYOUT = dict(left=0.11, right=0.96, bottom=0.28, top=0.88)
+
+def create_figure():
+    """
+    Builds an empty comparison figure with the object-oriented API (no pyplot state).
+
+    The figure can be redrawn for any date with ``draw_date``, so batch renders reuse
+    one figure rather than rebuilding axes for every date.
+
+    Returns:
+        tuple: (fig, ax, lines) with lines = (clear sky, cloudy sky, device UVI).
+    """
+    fig = Figure(figsize=(8, 3))
+    ax = fig.add_subplot()
+    # Sets the date converter up front, since the lines start out empty
+    ax.xaxis_date()
+    clear_line, = ax.plot([], [], label='Niwa Clear Sky', marker='o', linestyle='-')
+    cloudy_line, = ax.plot([], [], label='Niwa Cloudy Sky', marker='x', linestyle='--')
+    uvi_line, = ax.plot([], [], label='UVI 5-minute', marker='.', linestyle='')
+
+    ax.set_xlabel('Time (NZ Local Time)')
+    ax.set_ylabel('UVI Value')
+    ax.legend()
+    ax.grid(True)
+
+    ax.xaxis.set_major_locator(mdates.HourLocator(interval=1))
+    ax.xaxis.set_major_formatter(mdates.DateFormatter('%H:%M'))
+    ax.tick_params(axis='x', labelrotation=45)
+    return fig, ax, (clear_line, cloudy_line, uvi_line)
+
+def draw_date(
+    ax,
+    lines,
+    selected_date: date,
+    niwa_clear_sky_hourly: NiwaDataset,
+    niwa_cloudy_sky_hourly: NiwaDataset,
+    uvi_5min: UviDataset,
+    curve: Optional[Curve]
+) -> None:
+    """
+    Points the figure's lines at the data for selected_date and rescales the axes.
+
+    Args:
+        ax (Axes): Axes from ``create_figure``.
+        lines (tuple): Lines from ``create_figure``.
+        selected_date (date): The date to plot data for.
+        curve (Curve, optional): Calibration of the date's device readings (None leaves
+            them raw, as before a device's first curve version).
+    """
+    # Prepare data (each is an O(1) slice of the date-indexed columns)
+    niwa_clear_sky_times, niwa_clear_sky_uvis = niwa_clear_sky_hourly.for_date(selected_date)
+    niwa_cloudy_sky_times, niwa_cloudy_sky_uvis = niwa_cloudy_sky_hourly.for_date(selected_date)
+    uvi_5min_times, uvi_5min_uvis = uvi_5min.for_date(selected_date)
+
+    # now scale the uvi values (e.g. the two-factor model, see calibration_curves)
+    if curve is not None:
+        with stage("scaling", rows=len(uvi_5min_uvis)):
+            uvi_5min_uvis = curve.apply(uvi_5min_uvis)
+
+    clear_line, cloudy_line, uvi_line = lines
+    clear_line.set_data(niwa_clear_sky_times, niwa_clear_sky_uvis)
+    cloudy_line.set_data(niwa_cloudy_sky_times, niwa_cloudy_sky_uvis)
+    uvi_line.set_data(uvi_5min_times, uvi_5min_uvis)
+
+    ax.set_title(f'UVI Data for {selected_date}')
+    ax.relim()
+    ax.autoscale_view()
+
 def update_graph(
     selected_date: date,
-    niwa_clear_sky_hourly: Dict[date, List[Dict]],
-    niwa_cloudy_sky_hourly: Dict[date, List[Dict]],
-    uvi_5min: Dict[date, List[Dict]],
+    niwa_clear_sky_hourly: NiwaDataset,
+    niwa_cloudy_sky_hourly: NiwaDataset,
+    uvi_5min: UviDataset,
     uvi_scale: float,
     uvi_scale_upper: float
-) -> None:
+) -> Figure:
     """
-    Filters data for the selected date and re-plots everything cleanly.
+    Slices data for the selected date and re-plots everything cleanly.
 
     Args:
         selected_date (date): The date to plot data for.
-        niwa_clear_sky_hourly (List[Dict]): Clear sky forecast data.
-        niwa_cloudy_sky_hourly (List[Dict]): Cloudy sky forecast data.
-        uvi_5min (List[Dict]): Actual UVI 5-minute readings.
+        niwa_clear_sky_hourly (NiwaDataset): Date-indexed clear sky forecast data.
+        niwa_cloudy_sky_hourly (NiwaDataset): Date-indexed cloudy sky forecast data.
+        uvi_5min (UviDataset): Date-indexed actual UVI 5-minute readings.
     """
     if selected_date is None:
         print("No data available for this date.")
         return
 
-    # Filter data
-    # niwa_clear_sky_today = [
-    #     item for item in niwa_clear_sky_hourly
-    #     if item['datetime_nz'].date() == selected_date
-    # ]
-    # niwa_cloudy_sky_today = [
-    #     item for item in niwa_cloudy_sky_hourly
-    #     if item['datetime_nz'].date() == selected_date
-    # ]
-    # uvi_5min_today = [
-    #     item for item in uvi_5min
-    #     if item['datetime_nz'].date() == selected_date
-    # ]
-
-    niwa_clear_sky_today = niwa_clear_sky_hourly.get(selected_date, [])
-    niwa_cloudy_sky_today = niwa_cloudy_sky_hourly.get(selected_date, [])
-    uvi_5min_today = uvi_5min.get(selected_date, [])
-
-    # Prepare data
-    niwa_clear_sky_times = [item['datetime_nz'] for item in niwa_clear_sky_today]
-    niwa_clear_sky_uvis = [float(item['uvi']) for item in niwa_clear_sky_today]
-
-    niwa_cloudy_sky_times = [item['datetime_nz'] for item in niwa_cloudy_sky_today]
-    niwa_cloudy_sky_uvis = [float(item['uvi']) for item in niwa_cloudy_sky_today]
-
-    uvi_5min_times = [item['datetime_nz'] for item in uvi_5min_today]
-    uvi_5min_uvis = [float(item['uvi']) for item in uvi_5min_today]
-
-    # now scale the uvi values
-    # We have two scale
-    # if below 2 then scale by uvi_scale
-    # if above 2 then we interpolate between uvi_scale and uvi_scale_upper based on the UVI value
-    #  where 2 corresponse uvi_scale and 10 corresponds to uvi_scale_upper
-    def scale_uvi(u, uvi_scale, uvi_scale_upper):
-        if u < 2:
-            return u * uvi_scale
-        else:
-            # Linear interpolation between uvi_scale and uvi_scale_upper
-            # 2 -> uvi_scale, 10 -> uvi_scale_upper
-            interp = uvi_scale + uvi_scale_upper * (u - 2) / (10 - 2)
-            return u * interp
-
-    uvi_5min_uvis = [scale_uvi(u, uvi_scale, uvi_scale_upper) for u in uvi_5min_uvis]
-
     # Re-create a new plot
-    fig, ax = plt.subplots(figsize=(8, 3))
-    ax.plot(niwa_clear_sky_times, niwa_clear_sky_uvis, label='Niwa Clear Sky', marker='o', linestyle='-')
-    ax.plot(niwa_cloudy_sky_times, niwa_cloudy_sky_uvis, label='Niwa Cloudy Sky', marker='x', linestyle='--')
-    ax.plot(uvi_5min_times, uvi_5min_uvis, label='UVI 5-minute', marker='.', linestyle='')
+    fig, ax, lines = create_figure()
+    draw_date(
+        ax, lines, selected_date, niwa_clear_sky_hourly, niwa_cloudy_sky_hourly, uvi_5min,
+        TwoFactorCurve(uvi_scale, uvi_scale_upper)
+    )
 
-    ax.set_xlabel('Time (NZ Local Time)')
+    fig.tight_layout()
+    # display(fig)
+    return fig
+
+def update_range_graph(
+    start_date: date,
+    end_date: date,
+    niwa_clear_sky_hourly: NiwaDataset,
+    niwa_cloudy_sky_hourly: NiwaDataset,
+    uvi_5min: UviDataset,
+    curves: DeviceCurveHistory,
+    uvi_pyramid: DecimationPyramid,
+    max_points: int = DEFAULT_MAX_POINTS,
+    method: str = "minmax"
+) -> Figure:
+    """
+    Plots a run of dates with the device series decimated to screen resolution.
+
+    The device readings come from ``uvi_pyramid`` (min/max buckets or LTTB), so a
+    month is a couple of thousand points rather than ~9k. Points are picked on the
+    raw readings and then scaled, each with the curve version in force on its date.
+
+    Args:
+        start_date (date): First date shown.
+        end_date (date): Last date shown.
+        curves (DeviceCurveHistory): Calibration versions (``DeviceCurveHistory.single``
+            for one curve throughout).
+        uvi_pyramid (DecimationPyramid): Precomputed levels of uvi_5min.
+        max_points (int): Device point budget.
+        method (str): 'minmax' or 'lttb'.
+    """
+    clear_sl = niwa_clear_sky_hourly.date_range_slice(start_date, end_date)
+    cloudy_sl = niwa_cloudy_sky_hourly.date_range_slice(start_date, end_date)
+    idx = uvi_pyramid.indices(uvi_5min.date_range_slice(start_date, end_date), max_points, method)
+
+    uvi_times = uvi_5min.local_epoch[idx].astype("datetime64[s]")
+    with stage("scaling", rows=len(idx)):
+        uvi_values = curves.apply(uvi_5min.local_epoch[idx] // SECONDS_PER_DAY, uvi_5min.uvi[idx])
+
+    fig = Figure(figsize=(12, 4))
+    ax = fig.add_subplot()
+    ax.plot(niwa_clear_sky_hourly.local_epoch[clear_sl].astype("datetime64[s]"),
+            niwa_clear_sky_hourly.uvi[clear_sl], label='Niwa Clear Sky', linestyle='-', linewidth=1)
+    ax.plot(niwa_cloudy_sky_hourly.local_epoch[cloudy_sl].astype("datetime64[s]"),
+            niwa_cloudy_sky_hourly.uvi[cloudy_sl], label='Niwa Cloudy Sky', linestyle='--', linewidth=1)
+    ax.plot(uvi_times, uvi_values, label=f'UVI 5-minute ({len(idx)} pts, {method})',
+            marker='.', markersize=2, linestyle='')
+
+    ax.set_xlabel('Date (NZ Local Time)')
     ax.set_ylabel('UVI Value')
-    ax.set_title(f'UVI Data for {selected_date}')
-    ax.legend()
+    ax.set_title(f'UVI Data for {start_date} to {end_date}')
+    ax.legend(loc='upper right')
     ax.grid(True)
 
-    ax.xaxis.set_major_locator(mdates.HourLocator(interval=1))
-    ax.xaxis.set_major_formatter(mdates.DateFormatter('%H:%M'))
-    plt.xticks(rotation=45)
+    locator = mdates.AutoDateLocator()
+    ax.xaxis.set_major_locator(locator)
+    ax.xaxis.set_major_formatter(mdates.ConciseDateFormatter(locator))
 
-    plt.tight_layout()
-    # display(fig)
-    # # plt.show()
-    # plt.close(fig)  # Close the figure to free memory
+    fig.tight_layout()
     return fig
@@ -0,0 +1,213 @@
+import io
+import threading
+from collections import OrderedDict
+from concurrent.futures import CancelledError, Future, ThreadPoolExecutor
+from datetime import date
+from typing import Callable, Dict, Iterable, Optional, Tuple
+
+from calibration_curves import Curve, DeviceCurveHistory, TwoFactorCurve
+from datasets import NiwaDataset, UviDataset
+from instrumentation import stage
+from UI.plotter import FIXED_LAYOUT, create_figure, draw_date
+
+DEFAULT_MAX_ENTRIES = 64
+DEFAULT_DPI = 150
+# Dates either side of the current one rendered ahead in the background
+PREFETCH_RADIUS = 2
+# Render caches kept for recently used datasets (sessions may still be on older ones)
+MAX_CACHES = 4
+
+RenderKey = Tuple[date, Optional[Curve]]
+# date -> (niwa_clear, niwa_cloudy, uvi_5min) holding that date
+DatasetsFor = Callable[[date], Tuple[NiwaDataset, NiwaDataset, UviDataset]]
+
+
+class RenderCache:
+    """
+    Bounded LRU cache of rendered comparison plots (PNG bytes).
+
+    Entries are keyed by (date, calibration curve). Renders reuse one figure
+    (only the line data changes) under a lock. ``prefetch`` queues renders on a single
+    background thread, so paging to a neighbouring date is a cache hit.
+
+    Args:
+        datasets_for (Callable): Returns (niwa_clear, niwa_cloudy, uvi_5min) holding a
+            date, so a source split into date windows renders each date from its own.
+        max_entries (int): PNGs kept.
+        dpi (int): Render resolution.
+    """
+
+    def __init__(
+        self,
+        datasets_for: DatasetsFor,
+        max_entries: int = DEFAULT_MAX_ENTRIES,
+        dpi: int = DEFAULT_DPI
+    ):
+        self.datasets_for = datasets_for
+        self.max_entries = max_entries
+        self.dpi = dpi
+
+        self._entries: "OrderedDict[RenderKey, bytes]" = OrderedDict()
+        self._pending: Dict[RenderKey, Future] = {}
+        self._lock = threading.Lock()
+        self._render_lock = threading.Lock()
+        self._prefetcher = ThreadPoolExecutor(max_workers=1, thread_name_prefix="plot-prefetch")
+        self._closed = False
+
+        self._fig, self._ax, self._lines = create_figure()
+        self._fig.subplots_adjust(**FIXED_LAYOUT)
+
+    @staticmethod
+    def key(selected_date: date, curve: Optional[Curve]) -> RenderKey:
+        if isinstance(curve, TwoFactorCurve):
+            # Slider values arrive as floats; rounding keeps 0.1 + 0.05 style noise out of the key
+            curve = TwoFactorCurve(round(float(curve.uvi_scale), 6), round(float(curve.uvi_scale_upper), 6))
+        return selected_date, curve
+
+    def _render(self, key: RenderKey) -> bytes:
+        selected_date, curve = key
+        niwa_clear, niwa_cloudy, uvi_5min = self.datasets_for(selected_date)
+        with self._render_lock:
+            with stage("figure build"):
+                draw_date(self._ax, self._lines, selected_date, niwa_clear, niwa_cloudy, uvi_5min, curve)
+            with stage("png render"):
+                buffer = io.BytesIO()
+                self._fig.savefig(buffer, format="png", dpi=self.dpi)
+        return buffer.getvalue()
+
+    def _store(self, key: RenderKey, png: bytes) -> None:
+        with self._lock:
+            self._entries[key] = png
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def _lookup(self, key: RenderKey) -> Tuple[Optional[bytes], Optional[Future]]:
+        with self._lock:
+            png = self._entries.get(key)
+            if png is not None:
+                self._entries.move_to_end(key)
+            return png, self._pending.get(key)
+
+    def get(self, selected_date: date, curve: Optional[Curve]) -> bytes:
+        """
+        Returns the PNG for a date and calibration curve, rendering it now on a miss.
+
+        A render already queued by ``prefetch`` is waited on rather than repeated (or
+        done here if it was cancelled).
+        """
+        key = self.key(selected_date, curve)
+        png, pending = self._lookup(key)
+        if png is not None:
+            return png
+        if pending is not None:
+            try:
+                return pending.result()
+            except CancelledError:
+                pass
+
+        png = self._render(key)
+        self._store(key, png)
+        return png
+
+    def _prefetch_one(self, key: RenderKey) -> bytes:
+        png, _ = self._lookup(key)
+        if png is None:
+            png = self._render(key)
+            self._store(key, png)
+        return png
+
+    def _forget(self, key: RenderKey, future: Future) -> None:
+        # Runs when the render finishes, fails or is cancelled
+        with self._lock:
+            if self._pending.get(key) is future:
+                del self._pending[key]
+
+    def prefetch(self, dates: Iterable[date], curves: DeviceCurveHistory) -> None:
+        """
+        Queues background renders for any of ``dates`` not already cached or queued.
+
+        Each date is drawn with the curve version in force on it. Queued renders for
+        anything else (dates or curves the viewer has moved away from) are cancelled
+        first, so they don't hold up the prefetch thread and the render lock.
+        """
+        wanted = [self.key(selected_date, curves.curve_for(selected_date)) for selected_date in dates]
+        with self._lock:
+            stale = [future for key, future in self._pending.items() if key not in wanted]
+        # Not under the lock: cancelling runs the _forget callbacks. A render already
+        # running can't be cancelled and is simply cached when it finishes
+        for future in stale:
+            future.cancel()
+
+        for key in wanted:
+            with self._lock:
+                if self._closed or key in self._entries or key in self._pending:
+                    continue
+                future = self._prefetcher.submit(self._prefetch_one, key)
+                self._pending[key] = future
+            # Outside the lock: the callback runs at once if the render already finished
+            future.add_done_callback(lambda done, key=key: self._forget(key, done))
+
+    def close(self) -> None:
+        """Stops the prefetch thread (queued renders are dropped, later prefetches ignored)."""
+        with self._lock:
+            self._closed = True
+        # Not under the lock: cancelling runs the _forget callbacks
+        self._prefetcher.shutdown(wait=False, cancel_futures=True)
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._entries)
+
+
+# id(source) -> (source, cache), most recently used last. Evicted caches are not closed:
+# a session may still hold one, and its prefetch thread exits once it is collected
+_caches: "OrderedDict[int, Tuple[object, RenderCache]]" = OrderedDict()
+_cache_lock = threading.Lock()
+
+
+def _cache_for(source, datasets_for: DatasetsFor) -> RenderCache:
+    with _cache_lock:
+        entry = _caches.get(id(source))
+        if entry is None or entry[0] is not source:
+            entry = (source, RenderCache(datasets_for))
+            _caches[id(source)] = entry
+            while len(_caches) > MAX_CACHES:
+                _caches.popitem(last=False)
+        _caches.move_to_end(id(source))
+        return entry[1]
+
+
+def get_render_cache(shared) -> RenderCache:
+    """
+    Returns the process-wide render cache for a ``dataset_registry.SharedData``.
+
+    Every session shares it, so a date one user has looked at is instant for the next.
+    Sessions still on datasets that were since reloaded keep a working cache of their own.
+    """
+    datasets = (shared.niwa_clear, shared.niwa_cloudy, shared.uvi_5min)
+    return _cache_for(shared, lambda selected_date: datasets)
+
+
+def get_window_render_cache(sql_source) -> RenderCache:
+    """
+    Returns the process-wide render cache for a ``sql_source.SqlSource``.
+
+    One cache covers every window; each date (prefetched ones included) is drawn from the
+    window holding it, which is fetched on the prefetch thread if it isn't cached yet.
+    """
+    def datasets_for(selected_date: date):
+        shared = sql_source.window(selected_date)
+        return shared.niwa_clear, shared.niwa_cloudy, shared.uvi_5min
+
+    return _cache_for(sql_source, datasets_for)
+
+
+def neighbouring_dates(unique_dates, date_index: int, radius: int = PREFETCH_RADIUS):
+    """Dates within ``radius`` of ``date_index``, nearest first (the current date excluded)."""
+    neighbours = []
+    for step in range(1, radius + 1):
+        for i in (date_index + step, date_index - step):
+            if 0 <= i < len(unique_dates):
+                neighbours.append(unique_dates[i])
+    return neighbours
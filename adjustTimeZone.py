@@ -1,12 +1,23 @@
-from datetime import datetime, timezone, timedelta
-from typing import List, Dict
+from datetime import datetime, timezone
+from functools import lru_cache
+from typing import Tuple
+from zoneinfo import ZoneInfo
 
-# Define the New Zealand Timezone (NZT as UTC+12)
-nz_timezone = timezone(timedelta(hours=12))
+import numpy as np
+
+from datasets import SECONDS_PER_DAY, SeriesDataset
+from instrumentation import stage
+
+# New Zealand local time, including daylight saving (NZST UTC+12 / NZDT UTC+13)
+NZ_ZONE_NAME = "Pacific/Auckland"
+nz_timezone = ZoneInfo(NZ_ZONE_NAME)
+
+# Offsets are probed at this spacing, then transitions are bisected to the second
+_PROBE_STEP_SECONDS = SECONDS_PER_DAY
 
 def to_nz_local_time(utc_dt_object: datetime) -> datetime:
     """
-    Converts a UTC datetime object to New Zealand local time (UTC+12).
+    Converts a UTC datetime object to New Zealand local time (NZST/NZDT).
 
     Args:
         utc_dt_object (datetime): A datetime object in UTC or naive.
@@ -21,32 +32,95 @@ def to_nz_local_time(utc_dt_object: datetime) -> datetime:
 
     return utc_dt_object.astimezone(nz_timezone)
 
+def _utc_offset_seconds(zone: ZoneInfo, epoch: int) -> int:
+    return int(datetime.fromtimestamp(epoch, tz=zone).utcoffset().total_seconds())
+
+@lru_cache(maxsize=32)
+def transition_table(zone_name: str, start_year: int, end_year: int) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Builds the UTC offset transition table for a zone over whole years.
+
+    Args:
+        zone_name (str): IANA zone name, e.g. 'Pacific/Auckland'.
+        start_year (int): First year covered.
+        end_year (int): Last year covered (inclusive).
+
+    Returns:
+        tuple: (starts, offsets)
+            - starts: int64 epoch seconds at which each offset takes effect
+              (the first entry is the start of ``start_year``)
+            - offsets: int64 UTC offset in seconds from that instant on
+    """
+    zone = ZoneInfo(zone_name)
+    begin = int(datetime(start_year, 1, 1, tzinfo=timezone.utc).timestamp())
+    end = int(datetime(end_year + 1, 1, 1, tzinfo=timezone.utc).timestamp())
+
+    starts = [begin]
+    offsets = [_utc_offset_seconds(zone, begin)]
+    t = begin
+    while t < end:
+        nxt = min(t + _PROBE_STEP_SECONDS, end)
+        next_offset = _utc_offset_seconds(zone, nxt)
+        if next_offset != offsets[-1]:
+            # Bisect to the first second with the new offset
+            lo, hi = t, nxt
+            while hi - lo > 1:
+                mid = (lo + hi) // 2
+                if _utc_offset_seconds(zone, mid) == offsets[-1]:
+                    lo = mid
+                else:
+                    hi = mid
+            starts.append(hi)
+            offsets.append(next_offset)
+        t = nxt
+    return np.array(starts, dtype=np.int64), np.array(offsets, dtype=np.int64)
+
+def to_local_epoch(epoch: np.ndarray, zone_name: str = NZ_ZONE_NAME) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Converts UTC epoch seconds to local wall-clock seconds and local day numbers in bulk.
+
+    Offsets are looked up in the cached DST transition table with one searchsorted,
+    so the cost is a couple of passes over the array regardless of how many
+    daylight-saving changes it spans.
+
+    Args:
+        epoch (np.ndarray): int64 UTC epoch seconds.
+        zone_name (str): IANA zone name.
+
+    Returns:
+        tuple: (local_epoch, local_days) as int64 arrays.
+    """
+    epoch = np.asarray(epoch, dtype=np.int64)
+    if len(epoch) == 0:
+        return epoch.copy(), epoch.copy()
+
+    first_year = datetime.fromtimestamp(int(epoch.min()), tz=timezone.utc).year
+    last_year = datetime.fromtimestamp(int(epoch.max()), tz=timezone.utc).year
+    starts, offsets = transition_table(zone_name, first_year, last_year)
+
+    idx = np.searchsorted(starts, epoch, side="right") - 1
+    local_epoch = epoch + offsets[np.clip(idx, 0, None)]
+    return local_epoch, local_epoch // SECONDS_PER_DAY
+
 def apply_nz_time_conversion(
-    niwa_clear_sky_hourly: List[Dict],
-    niwa_cloudy_sky_hourly: List[Dict],
-    uvi_5min: List[Dict]
+    niwa_clear_sky_hourly: SeriesDataset,
+    niwa_cloudy_sky_hourly: SeriesDataset,
+    uvi_5min: SeriesDataset,
+    zone_name: str = NZ_ZONE_NAME
 ) -> None:
     """
-    Applies NZ timezone conversion to datetime entries in the UVI and NIWA datasets.
+    Applies NZ timezone conversion to the UVI and NIWA datasets.
 
-    Adds a new 'datetime_nz' field to each entry with the converted time.
+    Sets each dataset's 'local_epoch' column in one vectorized, DST-aware pass.
 
     Args:
-        niwa_clear_sky_hourly (List[Dict]): Clear sky forecast data.
-        niwa_cloudy_sky_hourly (List[Dict]): Cloudy sky forecast data.
-        uvi_5min (List[Dict]): Actual UVI 5-minute data.
-    """
-    for entry in niwa_clear_sky_hourly:
-        if 'datetime' in entry and isinstance(entry['datetime'], datetime):
-            entry['datetime_nz'] = to_nz_local_time(entry['datetime'])
-            entry['datetime_nz_date'] = entry['datetime_nz'].date()  # Add date for easier filtering
-
-    for entry in niwa_cloudy_sky_hourly:
-        if 'datetime' in entry and isinstance(entry['datetime'], datetime):
-            entry['datetime_nz'] = to_nz_local_time(entry['datetime'])
-            entry['datetime_nz_date'] = entry['datetime_nz'].date()  # Add date for easier filtering
-
-    for entry in uvi_5min:
-        if 'datetime' in entry and isinstance(entry['datetime'], datetime):
-            entry['datetime_nz'] = to_nz_local_time(entry['datetime'])
-            entry['datetime_nz_date'] = entry['datetime_nz'].date()  # Add date for easier filtering
+        niwa_clear_sky_hourly (SeriesDataset): Clear sky forecast data.
+        niwa_cloudy_sky_hourly (SeriesDataset): Cloudy sky forecast data.
+        uvi_5min (SeriesDataset): Actual UVI 5-minute data.
+        zone_name (str): IANA zone to convert to (defaults to Pacific/Auckland).
+    """
+    datasets = (niwa_clear_sky_hourly, niwa_cloudy_sky_hourly, uvi_5min)
+    with stage("tz conversion", rows=sum(len(d) for d in datasets)):
+        for dataset in datasets:
+            local_epoch, _ = to_local_epoch(dataset.epoch, zone_name)
+            dataset.set_local_time(local_epoch)
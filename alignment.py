@@ -0,0 +1,165 @@
+from datetime import date
+from typing import Iterable, Optional, Tuple
+
+import numpy as np
+
+from datasets import NiwaDataset, SeriesDataset, UviDataset, date_to_day
+
+ALIGN_METHODS = ("nearest", "mean", "interp")
+
+# Defaults: a reading within 5 minutes of the hour, a one hour averaging window
+# centred on the hour, and interpolation only across gaps of up to 15 minutes
+DEFAULT_TOLERANCE_SECONDS = 5 * 60
+DEFAULT_WINDOW_SECONDS = 60 * 60
+DEFAULT_MAX_GAP_SECONDS = 15 * 60
+
+
+class AlignedPairs(SeriesDataset):
+    """
+    NIWA values paired with the device readings at the same times.
+
+    Rows follow the NIWA series, so ``epoch``/``uvi`` are the NIWA time and value and
+    ``device_uvi`` is the (uncalibrated) device value aligned to it. When the NIWA
+    dataset had local time applied, the pairs are date-indexed the same way.
+
+    Attributes:
+        device_uvi (np.ndarray): float64 device value (NaN where no reading matched).
+        device_count (np.ndarray): int32 number of device readings that contributed.
+    """
+
+    columns = ("epoch", "uvi", "device_uvi", "device_count")
+    dtypes = {"epoch": np.int64, "uvi": np.float32, "device_uvi": np.float64, "device_count": np.int32}
+
+    def __init__(self, epoch, uvi, device_uvi, device_count):
+        super().__init__(epoch, uvi, device_uvi=device_uvi, device_count=device_count)
+
+    @property
+    def reference_uvi(self) -> np.ndarray:
+        return self.uvi.astype(np.float64)
+
+    @property
+    def matched(self) -> np.ndarray:
+        return ~np.isnan(self.device_uvi)
+
+
+def _nearest(device_epoch, device_uvi, t, tolerance_seconds):
+    n = len(device_epoch)
+    right = np.searchsorted(device_epoch, t, side="left")
+    left = np.clip(right - 1, 0, n - 1)
+    right = np.clip(right, 0, n - 1)
+    take_right = np.abs(device_epoch[right] - t) < np.abs(device_epoch[left] - t)
+    nearest = np.where(take_right, right, left)
+    ok = np.abs(device_epoch[nearest] - t) <= tolerance_seconds
+    values = np.where(ok, device_uvi[nearest], np.nan)
+    return values, ok.astype(np.int32)
+
+
+def _window_mean(device_epoch, device_uvi, t, window_seconds, min_readings):
+    half = window_seconds // 2
+    lo = np.searchsorted(device_epoch, t - half, side="left")
+    hi = np.searchsorted(device_epoch, t + half, side="right")
+    cumulative = np.concatenate([[0.0], np.cumsum(device_uvi)])
+    counts = hi - lo
+    ok = counts >= max(min_readings, 1)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        values = np.where(ok, (cumulative[hi] - cumulative[lo]) / counts, np.nan)
+    return values, counts.astype(np.int32)
+
+
+def _interpolate(device_epoch, device_uvi, t, max_gap_seconds):
+    n = len(device_epoch)
+    right = np.clip(np.searchsorted(device_epoch, t, side="left"), 0, n - 1)
+    exact = device_epoch[right] == t
+    left = np.where(exact, right, np.clip(right - 1, 0, n - 1))
+    t0, t1 = device_epoch[left], device_epoch[right]
+    bracketed = (t0 <= t) & (t <= t1)
+    ok = bracketed & (t1 - t0 <= max_gap_seconds)
+
+    span = np.where(t1 > t0, t1 - t0, 1)
+    weight = np.where(exact, 0.0, (t - t0) / span)
+    values = device_uvi[left] + weight * (device_uvi[right] - device_uvi[left])
+    values = np.where(ok, values, np.nan)
+    return values, np.where(ok, np.where(exact, 1, 2), 0).astype(np.int32)
+
+
+def align_niwa_with_device(
+    niwa: NiwaDataset,
+    uvi_5min: UviDataset,
+    method: str = "nearest",
+    tolerance_seconds: int = DEFAULT_TOLERANCE_SECONDS,
+    window_seconds: int = DEFAULT_WINDOW_SECONDS,
+    max_gap_seconds: int = DEFAULT_MAX_GAP_SECONDS,
+    min_readings: int = 1,
+    drop_gaps: bool = True
+) -> AlignedPairs:
+    """
+    Pairs every NIWA value with the device readings at that time, for all dates at once.
+
+    Both series are sorted, so each method is a couple of searchsorted calls over the
+    whole arrays (O(N log N)) rather than a scan per date.
+
+    Args:
+        niwa (NiwaDataset): NIWA clear or cloudy sky values.
+        uvi_5min (UviDataset): Device readings.
+        method (str): 'nearest' (closest reading within ``tolerance_seconds``),
+            'mean' (mean of readings in a ``window_seconds`` window centred on the hour) or
+            'interp' (linear interpolation between the readings either side, when they
+            are at most ``max_gap_seconds`` apart).
+        tolerance_seconds (int): Max distance for 'nearest'.
+        window_seconds (int): Window width for 'mean'.
+        max_gap_seconds (int): Largest gap 'interp' will bridge.
+        min_readings (int): Fewest readings a 'mean' window needs.
+        drop_gaps (bool): Drop NIWA rows with no device match (otherwise they are kept
+            with a NaN ``device_uvi``).
+
+    Returns:
+        AlignedPairs: The paired values, date-indexed if ``niwa`` has local time applied.
+    """
+    if method not in ALIGN_METHODS:
+        raise ValueError(f"Unknown alignment method: {method}")
+
+    t = niwa.epoch
+    if len(uvi_5min) == 0:
+        device_values = np.full(len(t), np.nan)
+        counts = np.zeros(len(t), dtype=np.int32)
+    else:
+        device_epoch = uvi_5min.epoch
+        device_uvi = uvi_5min.uvi.astype(np.float64)
+        if method == "nearest":
+            device_values, counts = _nearest(device_epoch, device_uvi, t, tolerance_seconds)
+        elif method == "mean":
+            device_values, counts = _window_mean(device_epoch, device_uvi, t, window_seconds, min_readings)
+        else:
+            device_values, counts = _interpolate(device_epoch, device_uvi, t, max_gap_seconds)
+
+    keep = ~np.isnan(device_values) if drop_gaps else np.ones(len(t), dtype=bool)
+    pairs = AlignedPairs(t[keep], niwa.uvi[keep], device_values[keep], counts[keep])
+    if niwa.local_epoch is not None:
+        pairs.set_local_time(niwa.local_epoch[keep])
+        pairs.build_date_index()
+    return pairs
+
+
+def paired_arrays(
+    pairs: AlignedPairs,
+    start_date: Optional[date] = None,
+    end_date: Optional[date] = None,
+    dates: Optional[Iterable[date]] = None
+) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Returns (device_uvi, reference_uvi) for the matched pairs in a date range.
+
+    Args:
+        pairs (AlignedPairs): Date-indexed aligned pairs.
+        start_date (date, optional): First date (default: all).
+        end_date (date, optional): Last date (default: all).
+        dates (Iterable[date], optional): Only keep pairs on these dates (e.g. clear days).
+    """
+    sl = pairs.date_range_slice(start_date, end_date) if pairs.local_epoch is not None else slice(None)
+    device = pairs.device_uvi[sl]
+    reference = pairs.uvi[sl].astype(np.float64)
+    ok = ~np.isnan(device)
+    if dates is not None:
+        wanted_days = np.array([date_to_day(d) for d in dates], dtype=np.int64)
+        ok &= np.isin(pairs.local_days[sl], wanted_days)
+    return device[ok], reference[ok]
@@ -0,0 +1,160 @@
+import argparse
+import os
+from concurrent.futures import ProcessPoolExecutor
+from datetime import date
+from typing import List, Optional
+
+import matplotlib
+# Headless: rendering goes straight to files through Agg, no GUI backend
+matplotlib.use("Agg")
+# Fixed salt so SVG element ids are the same from run to run
+matplotlib.rcParams["svg.hashsalt"] = "uvi-batch-render"
+
+from calibration_curves import CURVES_FILE, DeviceCurveHistory, TwoFactorCurve, load_curve_histories
+from data_cache import load_processed_uvi_and_niwa
+from data_functions import find_unique_dates
+from UI.plotter import FIXED_LAYOUT, create_figure, draw_date
+
+RENDER_FORMATS = ("png", "svg")
+DEFAULT_OUTPUT_DIR = "plots"
+DEFAULT_DPI = 100
+
+# Per-process state: datasets and one reusable figure (set by _init_worker)
+_worker = {}
+
+
+def plot_file_name(selected_date: date, fmt: str) -> str:
+    return f"uvi_{selected_date.isoformat()}.{fmt}"
+
+
+def _init_worker(
+    uvi_file_path: str,
+    niwa_file_path: str,
+    curves: DeviceCurveHistory,
+    output_dir: str,
+    fmt: str,
+    dpi: int
+) -> None:
+    # Workers read the datasets from the disk cache (memory-mapped), not through pickling
+    uvi_5min, niwa_clear, niwa_cloudy = load_processed_uvi_and_niwa(uvi_file_path, niwa_file_path)
+    fig, ax, lines = create_figure()
+    fig.subplots_adjust(**FIXED_LAYOUT)
+    _worker.update(
+        uvi_5min=uvi_5min, niwa_clear=niwa_clear, niwa_cloudy=niwa_cloudy,
+        curves=curves,
+        fig=fig, ax=ax, lines=lines,
+        output_dir=output_dir, fmt=fmt, dpi=dpi,
+    )
+
+
+def _render_date(selected_date: date) -> str:
+    w = _worker
+    draw_date(
+        w["ax"], w["lines"], selected_date, w["niwa_clear"], w["niwa_cloudy"], w["uvi_5min"],
+        w["curves"].curve_for(selected_date)
+    )
+
+    path = os.path.join(w["output_dir"], plot_file_name(selected_date, w["fmt"]))
+    # No timestamps/version in the file, so identical plots are byte-identical
+    metadata = {"Software": None} if w["fmt"] == "png" else {"Date": None, "Creator": None}
+    w["fig"].savefig(path, format=w["fmt"], dpi=w["dpi"], metadata=metadata)
+    return path
+
+
+def render_dates(
+    uvi_file_path: str,
+    niwa_file_path: str,
+    dates: List[date],
+    curves: DeviceCurveHistory,
+    output_dir: str = DEFAULT_OUTPUT_DIR,
+    fmt: str = "png",
+    dpi: int = DEFAULT_DPI,
+    workers: Optional[int] = None
+) -> List[str]:
+    """
+    Renders the daily comparison plot for each date to a file.
+
+    Dates are spread over a process pool; each worker keeps one figure and only
+    swaps the line data between dates.
+
+    Args:
+        uvi_file_path (str): Device export (processed through the disk cache).
+        niwa_file_path (str): NIWA export.
+        dates (list): Dates to render.
+        curves (DeviceCurveHistory): Calibration for the device readings; each date is
+            drawn with the version in force on it (``DeviceCurveHistory.single`` for one
+            fixed curve).
+        output_dir (str): Folder for the plots (created if missing).
+        fmt (str): 'png' or 'svg'.
+        dpi (int): Resolution for PNG output.
+        workers (int, optional): Process pool size (default: all cores, 1 = in-process).
+
+    Returns:
+        list: Paths of the written files, in date order.
+    """
+    if fmt not in RENDER_FORMATS:
+        raise ValueError(f"Unknown format: {fmt}")
+    os.makedirs(output_dir, exist_ok=True)
+
+    init_args = (uvi_file_path, niwa_file_path, curves, output_dir, fmt, dpi)
+    n_workers = min(workers if workers is not None else (os.cpu_count() or 1), len(dates))
+    if n_workers <= 1:
+        _init_worker(*init_args)
+        return [_render_date(d) for d in dates]
+
+    with ProcessPoolExecutor(max_workers=n_workers, initializer=_init_worker, initargs=init_args) as pool:
+        # Contiguous chunks keep each worker's dates together
+        chunksize = max(1, len(dates) // (n_workers * 4))
+        return list(pool.map(_render_date, dates, chunksize=chunksize))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Render the daily UVI comparison plots to PNG/SVG")
+    parser.add_argument("--uvi", default="data/studio_results_20250722_2108_uvi.json")
+    parser.add_argument("--niwa", default="data/studio_results_20250722_2109_niwa.json")
+    parser.add_argument("--start", type=date.fromisoformat, default=None, help="First date (YYYY-MM-DD)")
+    parser.add_argument("--end", type=date.fromisoformat, default=None, help="Last date (YYYY-MM-DD)")
+    parser.add_argument("--scale", type=float, default=None, help="uvi_scale (default: the device's curves, else uvi_settings.json)")
+    parser.add_argument("--upper", type=float, default=None, help="uvi_scale_upper (default: the device's curves, else uvi_settings.json)")
+    parser.add_argument("--device", default=None, help="Device id whose fitted curve versions to apply (see fleet.py)")
+    parser.add_argument("--curves", default=CURVES_FILE, help="Per-device curve history")
+    parser.add_argument("--out", default=DEFAULT_OUTPUT_DIR, help="Output folder")
+    parser.add_argument("--format", choices=list(RENDER_FORMATS), default="png")
+    parser.add_argument("--dpi", type=int, default=DEFAULT_DPI)
+    parser.add_argument("--workers", type=int, default=None, help="Processes (default: all cores)")
+    args = parser.parse_args()
+
+    # Explicit factors win, then the device's fitted versions, then the viewer's saved settings
+    history = None
+    if args.device is not None and args.scale is None and args.upper is None:
+        history = load_curve_histories(args.curves).get(str(args.device))
+        if history is None or not history.versions:
+            print(f"No curve versions for device {args.device} in {args.curves}; using the saved settings")
+            history = None
+    if history is not None:
+        curves, description = history, f"device {args.device}, {len(history.versions)} curve versions"
+    else:
+        uvi_scale, uvi_scale_upper = args.scale, args.upper
+        if uvi_scale is None or uvi_scale_upper is None:
+            from persist_settings import read_uvi_settings
+
+            saved_scale, saved_upper = read_uvi_settings()
+            uvi_scale = saved_scale if uvi_scale is None else uvi_scale
+            uvi_scale_upper = saved_upper if uvi_scale_upper is None else uvi_scale_upper
+        curves = DeviceCurveHistory.single(TwoFactorCurve(uvi_scale, uvi_scale_upper))
+        description = f"uvi_scale={uvi_scale}, uvi_scale_upper={uvi_scale_upper}"
+
+    # Loading here also warms the disk cache the workers read from
+    uvi_5min, niwa_clear, _ = load_processed_uvi_and_niwa(args.uvi, args.niwa)
+    dates = [
+        d for d in find_unique_dates(niwa_clear, uvi_5min)
+        if (args.start is None or d >= args.start) and (args.end is None or d <= args.end)
+    ]
+    paths = render_dates(
+        args.uvi, args.niwa, dates, curves, args.out, args.format, args.dpi, args.workers
+    )
+    print(f"Rendered {len(paths)} plots to {args.out} ({description})")
+
+
+if __name__ == "__main__":
+    main()
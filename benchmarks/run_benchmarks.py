@@ -0,0 +1,191 @@
+import argparse
+import io
+import json
+import os
+import platform
+import sys
+import time
+from datetime import date
+from typing import Callable, Dict, List, Optional, Tuple
+
+# Run from the repository root: python benchmarks/run_benchmarks.py
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import matplotlib
+matplotlib.use("Agg")
+
+from adjustTimeZone import apply_nz_time_conversion
+from benchmarks.synthetic_data import write_synthetic_exports
+from calibration import fit_calibration, scale_uvi
+from calibration_curves import SplineCurve, TwoFactorCurve
+from clear_sky import classify_days
+from data_functions import build_date_stats, create_data_by_date, find_date_counts, find_unique_dates
+from datasets import NiwaDataset, UviDataset
+from decimation import DecimationPyramid
+from drift_tracker import DriftTracker
+from jsonImporting import load_uvi_and_niwa
+from UI.plotter import FIXED_LAYOUT, create_figure, draw_date
+
+BENCHMARK_DIR = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_DATA_DIR = os.path.join(BENCHMARK_DIR, ".data")
+BASELINES_FILE = os.path.join(BENCHMARK_DIR, "baselines.json")
+# A benchmark fails when it is this many times slower than its baseline
+DEFAULT_THRESHOLD = 1.5
+DEFAULT_REPEAT = 3
+# Dates drawn by the render benchmark
+RENDER_DATES = 10
+
+
+def _copy(dataset):
+    # Timezone conversion and grouping modify their inputs, so each run gets fresh copies
+    return type(dataset).from_arrays({k: v.copy() for k, v in dataset.to_arrays().items()})
+
+
+class Context:
+    """Synthetic exports plus the datasets every stage after loading starts from."""
+
+    def __init__(self, paths: Dict[str, Tuple[str, str]]):
+        self.paths = paths
+        uvi_path, niwa_path = paths["json"]
+        self.raw = load_uvi_and_niwa(uvi_path, niwa_path, device_id=1, location_id=1)
+        uvi_5min, niwa_clear, niwa_cloudy = (_copy(d) for d in self.raw)
+        apply_nz_time_conversion(niwa_clear, niwa_cloudy, uvi_5min)
+        self.local = (uvi_5min, niwa_clear, niwa_cloudy)
+        niwa_clear, niwa_cloudy, uvi_5min = create_data_by_date(*(_copy(d) for d in (niwa_clear, niwa_cloudy, uvi_5min)))
+        self.indexed = (uvi_5min, niwa_clear, niwa_cloudy)
+        self.dates = find_unique_dates(niwa_clear, uvi_5min)
+
+
+def _drift_tracker(ctx: Context) -> DriftTracker:
+    uvi_5min, niwa_clear, niwa_cloudy = ctx.indexed
+    tracker = DriftTracker()
+    tracker.update(uvi_5min, niwa_clear, classify_days(niwa_clear, niwa_cloudy, uvi_5min))
+    return tracker
+
+
+def _bench_drift_queries(tracker: DriftTracker) -> None:
+    tracker.rolling(30)
+    tracker.ewma(14)
+
+
+def _bench_render(ctx: Context) -> None:
+    uvi_5min, niwa_clear, niwa_cloudy = ctx.indexed
+    fig, ax, lines = create_figure()
+    fig.subplots_adjust(**FIXED_LAYOUT)
+    step = max(1, len(ctx.dates) // RENDER_DATES)
+    for selected_date in ctx.dates[::step][:RENDER_DATES]:
+        draw_date(ax, lines, selected_date, niwa_clear, niwa_cloudy, uvi_5min, TwoFactorCurve(1.2, 0.1))
+        fig.savefig(io.BytesIO(), format="png")
+
+
+# name -> (setup(ctx) -> args, benchmark(*args)); only the benchmark call is timed
+BENCHMARKS: Dict[str, Tuple[Callable, Callable]] = {
+    "load_json": (lambda ctx: ctx.paths["json"], lambda u, n: load_uvi_and_niwa(u, n, device_id=1, location_id=1)),
+    "load_csv": (lambda ctx: ctx.paths["csv"], lambda u, n: load_uvi_and_niwa(u, n, device_id=1, location_id=1)),
+    "timezone_conversion": (
+        lambda ctx: tuple(_copy(d) for d in ctx.raw),
+        lambda u, c, cl: apply_nz_time_conversion(c, cl, u),
+    ),
+    "group_by_date": (
+        lambda ctx: tuple(_copy(d) for d in ctx.local),
+        lambda u, c, cl: create_data_by_date(c, cl, u),
+    ),
+    "date_stats": (lambda ctx: ctx.indexed, lambda u, c, cl: build_date_stats(c, cl, u)),
+    "find_date_counts": (lambda ctx: ctx.indexed, lambda u, c, cl: find_date_counts(c, cl, u)),
+    "clear_day_screening": (lambda ctx: ctx.indexed, lambda u, c, cl: classify_days(c, cl, u)),
+    "scale_two_factor": (lambda ctx: (ctx.indexed[0].uvi,), lambda v: scale_uvi(v, 1.2, 0.1)),
+    "scale_spline": (
+        lambda ctx: (ctx.indexed[0].uvi, SplineCurve((0, 2, 5, 10), (1.2, 1.25, 1.3, 1.4))),
+        lambda v, curve: curve.apply(v),
+    ),
+    "fit_calibration": (lambda ctx: ctx.indexed[:2], lambda u, c: fit_calibration(u, c)),
+    "decimation_pyramid": (
+        lambda ctx: (ctx.indexed[0].epoch, ctx.indexed[0].uvi),
+        lambda epoch, uvi: DecimationPyramid(epoch, uvi, 300),
+    ),
+    # Full history from an empty tracker; the app only realigns new or changed days
+    "drift_update": (
+        lambda ctx: ctx.indexed[:2] + (classify_days(ctx.indexed[1], ctx.indexed[2], ctx.indexed[0]),),
+        lambda u, c, clear: DriftTracker().update(u, c, clear),
+    ),
+    "drift_queries": (lambda ctx: (_drift_tracker(ctx),), _bench_drift_queries),
+    "render_plots": (lambda ctx: (ctx,), _bench_render),
+}
+
+
+def run_benchmark(ctx: Context, name: str, repeat: int = DEFAULT_REPEAT) -> float:
+    """Best wall time in seconds over ``repeat`` runs (setup excluded)."""
+    setup, benchmark = BENCHMARKS[name]
+    best = float("inf")
+    for _ in range(repeat):
+        args = setup(ctx)
+        start = time.perf_counter()
+        benchmark(*args)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def compare(results: Dict[str, float], baselines: Dict[str, float], threshold: float) -> List[str]:
+    """Names of benchmarks slower than ``threshold`` x their baseline."""
+    return [
+        name for name, seconds in results.items()
+        if name in baselines and seconds > baselines[name] * threshold
+    ]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the pipeline on synthetic exports")
+    parser.add_argument("--years", type=float, default=1.0)
+    parser.add_argument("--devices", type=int, default=1)
+    parser.add_argument("--cadence", type=int, default=300, help="Seconds between readings")
+    parser.add_argument("--data-dir", default=DEFAULT_DATA_DIR, help="Where the synthetic exports are written")
+    parser.add_argument("--only", nargs="+", choices=list(BENCHMARKS), default=None)
+    parser.add_argument("--repeat", type=int, default=DEFAULT_REPEAT)
+    parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD,
+                        help="Fail when a benchmark is this many times slower than its baseline")
+    parser.add_argument("--baselines", default=BASELINES_FILE)
+    parser.add_argument("--update-baselines", action="store_true", help="Store these results as the baselines")
+    args = parser.parse_args()
+
+    config = {"years": args.years, "devices": args.devices, "cadence": args.cadence}
+    print(f"Generating synthetic exports: {config}")
+    paths = write_synthetic_exports(
+        args.data_dir, date(2023, 1, 1), args.years, args.devices, args.cadence, ("json", "csv")
+    )
+    ctx = Context(paths)
+    print(f"{len(ctx.raw[0])} readings for device 1, {len(ctx.dates)} dates\n")
+
+    stored: Dict = {}
+    if os.path.exists(args.baselines):
+        with open(args.baselines, "r") as f:
+            stored = json.load(f)
+    baselines: Optional[Dict[str, float]] = None
+    if stored.get("config") == config:
+        baselines = stored.get("results", {})
+    elif stored:
+        print(f"Baselines were recorded for {stored.get('config')}; not comparing\n")
+
+    results: Dict[str, float] = {}
+    for name in args.only or BENCHMARKS:
+        results[name] = run_benchmark(ctx, name, args.repeat)
+        line = f"{name:<22} {results[name] * 1000:10.1f} ms"
+        if baselines and name in baselines:
+            line += f"   baseline {baselines[name] * 1000:10.1f} ms   x{results[name] / baselines[name]:.2f}"
+        print(line)
+
+    if args.update_baselines:
+        merged = {**(baselines or {}), **results}
+        with open(args.baselines, "w") as f:
+            json.dump({"config": config, "machine": platform.platform(), "python": platform.python_version(),
+                       "results": merged}, f, indent=2, sort_keys=True)
+        print(f"\nBaselines saved to {args.baselines}")
+        return
+
+    regressions = compare(results, baselines or {}, args.threshold)
+    if regressions:
+        print(f"\nSlower than {args.threshold}x baseline: {', '.join(regressions)}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,205 @@
+import argparse
+import csv
+import json
+import os
+from datetime import date, datetime, timezone
+from typing import List, Tuple
+
+import numpy as np
+
+# Doctors Point, where the sample device sits
+DEFAULT_LATITUDE = -45.744
+DEFAULT_LONGITUDE = 170.594
+# NIWA publishes one forecast per location a day at about 17:05 UTC, starting at 06:00 UTC
+# that day and running 73 hourly values ahead
+FORECAST_UPDATE_SECONDS = 17 * 3600 + 5 * 60
+FORECAST_START_SECONDS = 6 * 3600
+FORECAST_HOURS = 73
+# Noon UVI of a clear summer's day at the default latitude is about 10
+CLEAR_SKY_UVI_PEAK = 12.5
+
+UVI_FIELDS = ["DataId", "Timestamp", "Value", "DataTypeId", "DeviceId"]
+NIWA_FIELDS = ["ForecastId", "ForecastData", "GenerationDate", "GeoLocationId", "Error", "UpdatedAt"]
+
+
+def clear_sky_uvi(epoch: np.ndarray, latitude: float = DEFAULT_LATITUDE, longitude: float = DEFAULT_LONGITUDE) -> np.ndarray:
+    """
+    Approximate clear sky UVI from the solar elevation (declination + hour angle).
+
+    Not a radiative model, but it has the right daily shape and seasonal peak, which is
+    all the benchmarks need.
+    """
+    day_of_year = (epoch // 86400) % 365.25 + 1  # drifts by under a day; close enough
+    declination = np.radians(23.44) * np.sin(2 * np.pi * (284 + day_of_year) / 365.0)
+    solar_hours = (epoch % 86400) / 3600.0 + longitude / 15.0
+    hour_angle = np.radians(15.0 * (solar_hours - 12.0))
+    lat = np.radians(latitude)
+    sin_elevation = np.sin(lat) * np.sin(declination) + np.cos(lat) * np.cos(declination) * np.cos(hour_angle)
+    return CLEAR_SKY_UVI_PEAK * np.clip(sin_elevation, 0.0, None) ** 2.3
+
+
+def _day_cloudiness(rng: np.random.Generator, n_days: int) -> np.ndarray:
+    # Fraction of clear sky UVI reaching the ground, one value per day
+    return np.clip(rng.beta(4.0, 1.5, n_days), 0.15, 1.0)
+
+
+def _timestamp_strings(epoch: np.ndarray) -> np.ndarray:
+    return np.char.replace(np.datetime_as_string(epoch.astype("datetime64[s]"), unit="s"), "T", " ")
+
+
+def generate_uvi_rows(
+    start: date,
+    years: float,
+    devices: int,
+    cadence_seconds: int = 300,
+    seed: int = 0
+) -> Tuple[np.ndarray, ...]:
+    """
+    Synthesises device readings for every device, interleaved by time like the Data table.
+
+    Each device reads the clear sky UVI through the day's cloud cover, divided by its
+    own gain (0.6 - 0.9, so calibration has something to find), plus noise.
+
+    Returns:
+        tuple: (data_id, epoch, value, device_id) arrays, in DataId order.
+    """
+    rng = np.random.default_rng(seed)
+    t0 = int(datetime(start.year, start.month, start.day, tzinfo=timezone.utc).timestamp())
+    n_steps = int(years * 365.25 * 86400 // cadence_seconds)
+    base = t0 + np.arange(n_steps, dtype=np.int64) * cadence_seconds
+
+    epochs, values, device_ids = [], [], []
+    cloudiness = _day_cloudiness(rng, n_steps * cadence_seconds // 86400 + 2)
+    for device in range(1, devices + 1):
+        # Readings land a second or so after the tick, like the real logger
+        epoch = base + rng.integers(0, 2, n_steps)
+        day = (epoch - t0) // 86400
+        short_term = np.clip(1.0 + 0.15 * rng.standard_normal(n_steps), 0.3, 1.2)
+        gain = rng.uniform(0.6, 0.9)
+        reading = clear_sky_uvi(epoch) * cloudiness[day] * short_term / gain
+        reading = np.round(np.clip(reading + 0.02 * rng.standard_normal(n_steps), 0.0, None), 3)
+        epochs.append(epoch)
+        values.append(reading)
+        device_ids.append(np.full(n_steps, device, dtype=np.int64))
+
+    epoch = np.concatenate(epochs)
+    order = np.argsort(epoch, kind="stable")
+    data_id = np.arange(1, len(epoch) + 1, dtype=np.int64)
+    return data_id, epoch[order], np.concatenate(values)[order], np.concatenate(device_ids)[order]
+
+
+def generate_niwa_records(start: date, years: float, locations: int, seed: int = 0) -> List[dict]:
+    """
+    Synthesises one NIWA forecast per location per day, in ForecastId order.
+
+    ForecastData has the same JSON layout as the real exports (clear and cloudy sky
+    products of 73 hourly values from 06:00 UTC).
+    """
+    rng = np.random.default_rng(seed + 1)
+    t0 = int(datetime(start.year, start.month, start.day, tzinfo=timezone.utc).timestamp())
+    n_days = int(years * 365.25)
+    cloudiness = _day_cloudiness(rng, n_days + 4)
+    hours = np.arange(FORECAST_HOURS, dtype=np.int64) * 3600
+
+    records = []
+    forecast_id = 1
+    for day in range(n_days):
+        times = t0 + day * 86400 + FORECAST_START_SECONDS + hours
+        time_strings = np.datetime_as_string(times.astype("datetime64[s]"), unit="s")
+        clear = np.round(clear_sky_uvi(times), 3)
+        cloudy = np.round(clear * cloudiness[day + (hours // 86400)], 3)
+        updated = datetime.fromtimestamp(t0 + day * 86400 + FORECAST_UPDATE_SECONDS, tz=timezone.utc)
+        for location in range(1, locations + 1):
+            forecast = {
+                "coord": f"EPSG:4326,{DEFAULT_LATITUDE},{DEFAULT_LONGITUDE}",
+                "products": [
+                    {"name": "cloudy_sky_uv_index",
+                     "values": [{"time": f"{t}.000Z", "value": float(v)} for t, v in zip(time_strings, cloudy)]},
+                    {"name": "clear_sky_uv_index",
+                     "values": [{"time": f"{t}.000Z", "value": float(v)} for t, v in zip(time_strings, clear)]},
+                ],
+            }
+            records.append({
+                "ForecastId": str(forecast_id),
+                "ForecastData": json.dumps(forecast),
+                "GenerationDate": "",
+                "GeoLocationId": str(location),
+                "Error": "",
+                "UpdatedAt": updated.strftime("%Y-%m-%d %H:%M:%S"),
+            })
+            forecast_id += 1
+    return records
+
+
+def _write_json_records(path: str, fields: List[str], rows) -> None:
+    # Same layout as the exports (json.dump(indent=2) of all-string fields), written row by row
+    with open(path, "w") as f:
+        f.write("[")
+        for i, row in enumerate(rows):
+            body = ",\n".join(f"    {json.dumps(k)}: {json.dumps(v)}" for k, v in zip(fields, row))
+            f.write(("\n  {\n" if i == 0 else ",\n  {\n") + body + "\n  }")
+        f.write("\n]")
+
+
+def _write_csv_records(path: str, fields: List[str], rows) -> None:
+    with open(path, "w", newline="") as f:
+        writer = csv.writer(f, quoting=csv.QUOTE_ALL)
+        writer.writerow(fields)
+        writer.writerows(rows)
+
+
+def write_synthetic_exports(
+    out_dir: str,
+    start: date = date(2023, 1, 1),
+    years: float = 1.0,
+    devices: int = 1,
+    cadence_seconds: int = 300,
+    formats: Tuple[str, ...] = ("json",),
+    seed: int = 0
+) -> dict:
+    """
+    Writes a UVI and a NIWA export (one location per device) in each format.
+
+    Returns:
+        dict: {format: (uvi_path, niwa_path)}
+    """
+    os.makedirs(out_dir, exist_ok=True)
+    data_id, epoch, value, device_id = generate_uvi_rows(start, years, devices, cadence_seconds, seed)
+    uvi_rows = list(zip(
+        data_id.astype(str), _timestamp_strings(epoch), np.char.mod("%.3f", value), ["1"] * len(data_id),
+        device_id.astype(str),
+    ))
+    niwa = generate_niwa_records(start, years, devices, seed)
+    niwa_rows = [[r[k] for k in NIWA_FIELDS] for r in niwa]
+
+    paths = {}
+    for fmt in formats:
+        writer = _write_json_records if fmt == "json" else _write_csv_records
+        uvi_path = os.path.join(out_dir, f"synthetic_uvi.{fmt}")
+        niwa_path = os.path.join(out_dir, f"synthetic_niwa.{fmt}")
+        writer(uvi_path, UVI_FIELDS, uvi_rows)
+        writer(niwa_path, NIWA_FIELDS, niwa_rows)
+        paths[fmt] = (uvi_path, niwa_path)
+    return paths
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Write synthetic UVI / NIWA exports for benchmarking")
+    parser.add_argument("--out", default=os.path.join("benchmarks", ".data"))
+    parser.add_argument("--start", type=date.fromisoformat, default=date(2023, 1, 1))
+    parser.add_argument("--years", type=float, default=1.0)
+    parser.add_argument("--devices", type=int, default=1)
+    parser.add_argument("--cadence", type=int, default=300, help="Seconds between readings")
+    parser.add_argument("--formats", nargs="+", choices=["json", "csv"], default=["json", "csv"])
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    paths = write_synthetic_exports(
+        args.out, args.start, args.years, args.devices, args.cadence, tuple(args.formats), args.seed
+    )
+    for fmt, (uvi_path, niwa_path) in paths.items():
+        print(f"{fmt}: {uvi_path} ({os.path.getsize(uvi_path) >> 20} MB), {niwa_path} ({os.path.getsize(niwa_path) >> 20} MB)")
+
+
+if __name__ == "__main__":
+    main()
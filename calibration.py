@@ -0,0 +1,301 @@
+import argparse
+import os
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+from datetime import date
+from typing import Iterable, Optional, Tuple
+
+import numpy as np
+
+from alignment import ALIGN_METHODS, DEFAULT_TOLERANCE_SECONDS, align_niwa_with_device, paired_arrays
+from calibration_curves import UVI_HIGH, UVI_LOW, TwoFactorCurve
+from data_cache import load_processed_uvi_and_niwa
+from datasets import NiwaDataset, UviDataset
+
+# Same ranges as the sliders in main.py
+SCALE_RANGE = (0.1, 2.0)
+SCALE_UPPER_RANGE = (-1.0, 1.0)
+
+# Readings further than this from a NIWA hour are not paired with it
+DEFAULT_PAIR_TOLERANCE_SECONDS = DEFAULT_TOLERANCE_SECONDS
+
+# Largest (candidates x pairs) block evaluated at once by the objective
+_MAX_BLOCK_ELEMENTS = 4_000_000
+
+
+def scale_uvi(u: np.ndarray, uvi_scale: float, uvi_scale_upper: float) -> np.ndarray:
+    """
+    Applies the two-factor calibration to an array of raw device UVI values.
+
+    if below 2 then scale by uvi_scale
+    if above 2 then the factor is interpolated linearly from uvi_scale (at 2)
+    to uvi_scale + uvi_scale_upper (at 10)
+
+    See calibration_curves for the curve engine (lookup tables, versions per device).
+    """
+    return TwoFactorCurve(uvi_scale, uvi_scale_upper).apply(u)
+
+
+def model_basis(u: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Splits the model into its two basis terms so that
+    ``scale_uvi(u, s, su) == s * a + su * b``.
+    """
+    u = np.asarray(u, dtype=np.float64)
+    a = u
+    b = np.where(u < UVI_LOW, 0.0, u * (u - UVI_LOW) / (UVI_HIGH - UVI_LOW))
+    return a, b
+
+
+@dataclass
+class CalibrationResult:
+    """Outcome of a calibration fit."""
+    uvi_scale: float
+    uvi_scale_upper: float
+    rmse: float
+    n_pairs: int
+    start_date: Optional[date] = None
+    end_date: Optional[date] = None
+
+
+def pair_with_niwa(
+    uvi_5min: UviDataset,
+    niwa_clear: NiwaDataset,
+    start_date: Optional[date] = None,
+    end_date: Optional[date] = None,
+    tolerance_seconds: int = DEFAULT_PAIR_TOLERANCE_SECONDS,
+    align_method: str = "nearest",
+    dates: Optional[Iterable[date]] = None
+) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Pairs every NIWA clear sky value in the date range with the device readings at that time.
+
+    Returns:
+        tuple: (device_uvi, niwa_uvi) float64 arrays of equal length.
+    """
+    pairs = align_niwa_with_device(niwa_clear, uvi_5min, method=align_method, tolerance_seconds=tolerance_seconds)
+    return paired_arrays(pairs, start_date, end_date, dates)
+
+
+def calibration_objective(
+    device_uvi: np.ndarray,
+    reference_uvi: np.ndarray,
+    scales: np.ndarray,
+    uppers: np.ndarray,
+    loss: str = "rmse"
+) -> np.ndarray:
+    """
+    Evaluates the error for many (uvi_scale, uvi_scale_upper) candidates at once.
+
+    Args:
+        device_uvi (np.ndarray): Raw device readings paired with ``reference_uvi``.
+        reference_uvi (np.ndarray): NIWA clear sky values.
+        scales (np.ndarray): Candidate uvi_scale values.
+        uppers (np.ndarray): Candidate uvi_scale_upper values (same length as scales).
+        loss (str): 'rmse' or 'mae'.
+
+    Returns:
+        np.ndarray: One error per candidate.
+    """
+    a, b = model_basis(device_uvi)
+    y = np.asarray(reference_uvi, dtype=np.float64)
+    scales = np.atleast_1d(np.asarray(scales, dtype=np.float64))
+    uppers = np.atleast_1d(np.asarray(uppers, dtype=np.float64))
+    if len(y) == 0:
+        return np.full(len(scales), np.nan)
+
+    errors = np.empty(len(scales))
+    block = max(1, _MAX_BLOCK_ELEMENTS // len(y))
+    for start in range(0, len(scales), block):
+        s = scales[start:start + block, None]
+        su = uppers[start:start + block, None]
+        residual = s * a[None, :] + su * b[None, :] - y[None, :]
+        if loss == "mae":
+            errors[start:start + block] = np.mean(np.abs(residual), axis=1)
+        elif loss == "rmse":
+            errors[start:start + block] = np.sqrt(np.mean(residual * residual, axis=1))
+        else:
+            raise ValueError(f"Unknown loss: {loss}")
+    return errors
+
+
+# Pairs shared with pool workers through the initializer, so they are pickled once per worker
+_worker_pairs: Tuple[np.ndarray, np.ndarray, str] = (np.empty(0), np.empty(0), "rmse")
+
+
+def _init_worker(device_uvi: np.ndarray, reference_uvi: np.ndarray, loss: str) -> None:
+    global _worker_pairs
+    _worker_pairs = (device_uvi, reference_uvi, loss)
+
+
+def _objective_chunk(candidates: Tuple[np.ndarray, np.ndarray]) -> np.ndarray:
+    device_uvi, reference_uvi, loss = _worker_pairs
+    return calibration_objective(device_uvi, reference_uvi, candidates[0], candidates[1], loss)
+
+
+def grid_search(
+    device_uvi: np.ndarray,
+    reference_uvi: np.ndarray,
+    loss: str = "rmse",
+    grid_points: int = 41,
+    refine_steps: int = 4,
+    workers: Optional[int] = 1
+) -> Tuple[float, float, float]:
+    """
+    Coarse grid over the slider ranges, then repeatedly zooms in around the best point.
+
+    Args:
+        workers (int, optional): Process pool size for evaluating grid blocks;
+            None uses every core, 1 runs in-process.
+
+    Returns:
+        tuple: (uvi_scale, uvi_scale_upper, error)
+    """
+    (s_lo, s_hi), (u_lo, u_hi) = SCALE_RANGE, SCALE_UPPER_RANGE
+    n_workers = workers if workers is not None else (os.cpu_count() or 1)
+    pool = None
+    if n_workers > 1:
+        pool = ProcessPoolExecutor(
+            max_workers=n_workers, initializer=_init_worker, initargs=(device_uvi, reference_uvi, loss)
+        )
+
+    try:
+        best = (np.nan, np.nan, np.inf)
+        for _ in range(refine_steps + 1):
+            s_grid, u_grid = np.meshgrid(
+                np.linspace(s_lo, s_hi, grid_points), np.linspace(u_lo, u_hi, grid_points), indexing="ij"
+            )
+            scales, uppers = s_grid.ravel(), u_grid.ravel()
+            if pool is None:
+                errors = calibration_objective(device_uvi, reference_uvi, scales, uppers, loss)
+            else:
+                chunks = [(s, u) for s, u in zip(np.array_split(scales, n_workers), np.array_split(uppers, n_workers))]
+                errors = np.concatenate(list(pool.map(_objective_chunk, chunks)))
+
+            i = int(np.nanargmin(errors))
+            if errors[i] < best[2]:
+                best = (float(scales[i]), float(uppers[i]), float(errors[i]))
+
+            # Zoom to two grid cells either side of the current best, staying in range
+            s_step = (s_hi - s_lo) / (grid_points - 1)
+            u_step = (u_hi - u_lo) / (grid_points - 1)
+            s_lo, s_hi = max(best[0] - 2 * s_step, SCALE_RANGE[0]), min(best[0] + 2 * s_step, SCALE_RANGE[1])
+            u_lo, u_hi = (max(best[1] - 2 * u_step, SCALE_UPPER_RANGE[0]),
+                          min(best[1] + 2 * u_step, SCALE_UPPER_RANGE[1]))
+    finally:
+        if pool is not None:
+            pool.shutdown()
+    return best
+
+
+def least_squares_fit(device_uvi: np.ndarray, reference_uvi: np.ndarray) -> Tuple[float, float]:
+    """
+    Exact RMSE minimum: the model is linear in both factors, so this is a 2x2 solve.
+    """
+    a, b = model_basis(device_uvi)
+    y = np.asarray(reference_uvi, dtype=np.float64)
+    basis = np.column_stack([a, b])
+    if not np.any(b):
+        # No readings above UVI 2 to pin down the upper factor
+        return float(np.dot(a, y) / np.dot(a, a)), 0.0
+    (uvi_scale, uvi_scale_upper), *_ = np.linalg.lstsq(basis, y, rcond=None)
+    return float(uvi_scale), float(uvi_scale_upper)
+
+
+def fit_calibration(
+    uvi_5min: UviDataset,
+    niwa_clear: NiwaDataset,
+    start_date: Optional[date] = None,
+    end_date: Optional[date] = None,
+    method: str = "lstsq",
+    loss: str = "rmse",
+    workers: Optional[int] = 1,
+    tolerance_seconds: int = DEFAULT_PAIR_TOLERANCE_SECONDS,
+    align_method: str = "nearest",
+    dates: Optional[Iterable[date]] = None
+) -> CalibrationResult:
+    """
+    Fits uvi_scale and uvi_scale_upper against NIWA clear sky values.
+
+    Args:
+        uvi_5min (UviDataset): Date-indexed device readings.
+        niwa_clear (NiwaDataset): Date-indexed NIWA clear sky values.
+        start_date (date, optional): First date to include (default: all).
+        end_date (date, optional): Last date to include (default: all).
+        method (str): 'lstsq' (closed form, RMSE only) or 'grid' (grid/refine search).
+        loss (str): 'rmse' or 'mae' (grid search only).
+        workers (int, optional): Process pool size for the grid search.
+        tolerance_seconds (int): Max gap between a NIWA hour and its paired reading.
+        align_method (str): How readings are matched to NIWA hours ('nearest', 'mean' or 'interp').
+        dates (Iterable[date], optional): Only fit on these dates, e.g. ``ClearDayScores.clear_dates()``.
+
+    Returns:
+        CalibrationResult: The fitted factors and their RMSE.
+
+    Raises:
+        ValueError: If no readings could be paired in the date range.
+    """
+    device_uvi, reference_uvi = pair_with_niwa(
+        uvi_5min, niwa_clear, start_date, end_date, tolerance_seconds, align_method, dates
+    )
+    if len(device_uvi) == 0 or not np.any(device_uvi):
+        raise ValueError("No paired device/NIWA readings in the selected date range")
+
+    if method == "lstsq":
+        uvi_scale, uvi_scale_upper = least_squares_fit(device_uvi, reference_uvi)
+        in_range = (SCALE_RANGE[0] <= uvi_scale <= SCALE_RANGE[1]
+                    and SCALE_UPPER_RANGE[0] <= uvi_scale_upper <= SCALE_UPPER_RANGE[1])
+        if not in_range:
+            # The sliders can't show it; fall back to the bounded search
+            method = "grid"
+    if method == "grid":
+        uvi_scale, uvi_scale_upper, _ = grid_search(device_uvi, reference_uvi, loss=loss, workers=workers)
+    elif method != "lstsq":
+        raise ValueError(f"Unknown method: {method}")
+
+    rmse = float(calibration_objective(device_uvi, reference_uvi, [uvi_scale], [uvi_scale_upper])[0])
+    return CalibrationResult(uvi_scale, uvi_scale_upper, rmse, len(device_uvi), start_date, end_date)
+
+
+def save_calibration(result: CalibrationResult) -> None:
+    """Writes a fitted result to uvi_settings.json."""
+    # Imported here so pool workers and the CLI don't pull in streamlit
+    from persist_settings import save_uvi_settings
+
+    save_uvi_settings(result.uvi_scale, result.uvi_scale_upper)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Fit uvi_scale / uvi_scale_upper against NIWA clear sky values")
+    parser.add_argument("--uvi", default="data/studio_results_20250722_2108_uvi.json")
+    parser.add_argument("--niwa", default="data/studio_results_20250722_2109_niwa.json")
+    parser.add_argument("--start", type=date.fromisoformat, default=None, help="First date (YYYY-MM-DD)")
+    parser.add_argument("--end", type=date.fromisoformat, default=None, help="Last date (YYYY-MM-DD)")
+    parser.add_argument("--method", choices=["lstsq", "grid"], default="lstsq")
+    parser.add_argument("--loss", choices=["rmse", "mae"], default="rmse")
+    parser.add_argument("--align", choices=list(ALIGN_METHODS), default="nearest", help="How readings are matched to NIWA hours")
+    parser.add_argument("--workers", type=int, default=None, help="Processes for the grid search (default: all cores)")
+    parser.add_argument("--clear-days", action="store_true", help="Only fit on days screened as clear sky")
+    parser.add_argument("--save", action="store_true", help="Write the result to uvi_settings.json")
+    args = parser.parse_args()
+
+    uvi_5min, niwa_clear, niwa_cloudy = load_processed_uvi_and_niwa(args.uvi, args.niwa)
+    dates = None
+    if args.clear_days:
+        from clear_sky import classify_days
+
+        dates = classify_days(niwa_clear, niwa_cloudy, uvi_5min).clear_dates()
+        print(f"Fitting on {len(dates)} clear days")
+    result = fit_calibration(
+        uvi_5min, niwa_clear, args.start, args.end, method=args.method, loss=args.loss, workers=args.workers,
+        align_method=args.align, dates=dates
+    )
+    print(f"uvi_scale={result.uvi_scale:.4f} uvi_scale_upper={result.uvi_scale_upper:.4f} "
+          f"rmse={result.rmse:.4f} pairs={result.n_pairs}")
+    if args.save:
+        save_calibration(result)
+        print("Settings saved!")
+
+
+if __name__ == "__main__":
+    main()
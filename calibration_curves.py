@@ -0,0 +1,238 @@
+import json
+import os
+from dataclasses import dataclass, field
+from datetime import date
+from typing import Dict, List, Optional, Sequence, Union
+
+import numpy as np
+
+from datasets import SeriesDataset, date_to_day
+
+# The two-factor model: below UVI_LOW the reading is scaled by uvi_scale; from UVI_LOW
+# upwards the factor rises linearly by uvi_scale_upper per (UVI_HIGH - UVI_LOW)
+UVI_LOW = 2.0
+UVI_HIGH = 10.0
+
+CURVES_FILE = "calibration_curves.json"
+
+
+@dataclass(frozen=True)
+class TwoFactorCurve:
+    """The original slider model (uvi_scale, uvi_scale_upper) as a curve."""
+    uvi_scale: float
+    uvi_scale_upper: float
+    kind = "two_factor"
+
+    def apply(self, u: np.ndarray) -> np.ndarray:
+        u = np.asarray(u, dtype=np.float64)
+        factor = self.uvi_scale + self.uvi_scale_upper * (u - UVI_LOW) / (UVI_HIGH - UVI_LOW)
+        return np.where(u < UVI_LOW, u * self.uvi_scale, u * factor)
+
+    def to_dict(self) -> Dict:
+        return {"kind": self.kind, "uvi_scale": self.uvi_scale, "uvi_scale_upper": self.uvi_scale_upper}
+
+
+def _check_knots(knots: Sequence[float], gains: Sequence[float], minimum: int) -> None:
+    if len(knots) != len(gains) or len(knots) < minimum:
+        raise ValueError(f"Need at least {minimum} knots with one gain each")
+    if np.any(np.diff(knots) <= 0):
+        raise ValueError("Knots must be strictly increasing")
+
+
+@dataclass(frozen=True)
+class PiecewiseLinearCurve:
+    """
+    Lookup table of gains: calibrated = raw * gain(raw).
+
+    The gain is interpolated linearly between knots (raw UVI values) and held at the
+    end values outside them.
+    """
+    knots: tuple
+    gains: tuple
+    kind = "piecewise_linear"
+
+    def __post_init__(self):
+        _check_knots(self.knots, self.gains, 1)
+
+    def apply(self, u: np.ndarray) -> np.ndarray:
+        u = np.asarray(u, dtype=np.float64)
+        return u * np.interp(u, self.knots, self.gains)
+
+    def to_dict(self) -> Dict:
+        return {"kind": self.kind, "knots": list(self.knots), "gains": list(self.gains)}
+
+
+def _pchip_edge_slope(h0: float, h1: float, d0: float, d1: float) -> float:
+    slope = ((2 * h0 + h1) * d0 - h0 * d1) / (h0 + h1)
+    if np.sign(slope) != np.sign(d0):
+        return 0.0
+    if np.sign(d0) != np.sign(d1) and abs(slope) > abs(3 * d0):
+        return 3 * d0
+    return slope
+
+
+@dataclass(frozen=True)
+class SplineCurve:
+    """
+    Gain table interpolated with a monotone cubic (PCHIP) spline.
+
+    Smooth between knots without overshooting them; the gain is held at the end
+    values outside the knots.
+    """
+    knots: tuple
+    gains: tuple
+    kind = "spline"
+    _slopes: np.ndarray = field(init=False, repr=False, compare=False)
+
+    def __post_init__(self):
+        _check_knots(self.knots, self.gains, 2)
+        x = np.asarray(self.knots, dtype=np.float64)
+        y = np.asarray(self.gains, dtype=np.float64)
+        h = np.diff(x)
+        delta = np.diff(y) / h
+
+        # Fritsch-Carlson slopes: weighted harmonic mean where the secants agree in sign
+        slopes = np.zeros(len(x))
+        if len(x) == 2:
+            slopes[:] = delta[0]
+        else:
+            w1 = 2 * h[1:] + h[:-1]
+            w2 = h[1:] + 2 * h[:-1]
+            same_sign = delta[:-1] * delta[1:] > 0
+            with np.errstate(divide="ignore", invalid="ignore"):
+                harmonic = (w1 + w2) / (w1 / delta[:-1] + w2 / delta[1:])
+            slopes[1:-1] = np.where(same_sign, harmonic, 0.0)
+            slopes[0] = _pchip_edge_slope(h[0], h[1], delta[0], delta[1])
+            slopes[-1] = _pchip_edge_slope(h[-1], h[-2], delta[-1], delta[-2])
+        object.__setattr__(self, "_slopes", slopes)
+
+    def gain(self, u: np.ndarray) -> np.ndarray:
+        x = np.asarray(self.knots, dtype=np.float64)
+        y = np.asarray(self.gains, dtype=np.float64)
+        u = np.clip(np.asarray(u, dtype=np.float64), x[0], x[-1])
+        i = np.clip(np.searchsorted(x, u, side="right") - 1, 0, len(x) - 2)
+        h = x[i + 1] - x[i]
+        t = (u - x[i]) / h
+        t2, t3 = t * t, t * t * t
+        return ((2 * t3 - 3 * t2 + 1) * y[i] + (t3 - 2 * t2 + t) * h * self._slopes[i]
+                + (-2 * t3 + 3 * t2) * y[i + 1] + (t3 - t2) * h * self._slopes[i + 1])
+
+    def apply(self, u: np.ndarray) -> np.ndarray:
+        u = np.asarray(u, dtype=np.float64)
+        return u * self.gain(u)
+
+    def to_dict(self) -> Dict:
+        return {"kind": self.kind, "knots": list(self.knots), "gains": list(self.gains)}
+
+
+Curve = Union[TwoFactorCurve, PiecewiseLinearCurve, SplineCurve]
+
+
+def curve_from_dict(data: Dict) -> Curve:
+    """Rebuilds a curve from its ``to_dict`` form."""
+    kind = data.get("kind")
+    if kind == TwoFactorCurve.kind:
+        return TwoFactorCurve(float(data["uvi_scale"]), float(data["uvi_scale_upper"]))
+    if kind == PiecewiseLinearCurve.kind:
+        return PiecewiseLinearCurve(tuple(data["knots"]), tuple(data["gains"]))
+    if kind == SplineCurve.kind:
+        return SplineCurve(tuple(data["knots"]), tuple(data["gains"]))
+    raise ValueError(f"Unknown curve kind: {kind}")
+
+
+@dataclass(frozen=True)
+class CurveVersion:
+    """A curve and the local date from which it applies."""
+    effective_from: date
+    curve: Curve
+    note: str = ""
+
+
+class DeviceCurveHistory:
+    """
+    Every calibration curve a device has had, in effective_from order.
+
+    A reading is calibrated with the latest version effective on its local date;
+    readings before the first version are left unscaled.
+    """
+
+    def __init__(self, versions: Optional[List[CurveVersion]] = None):
+        self.versions: List[CurveVersion] = sorted(versions or [], key=lambda v: v.effective_from)
+
+    @classmethod
+    def single(cls, curve: Curve) -> "DeviceCurveHistory":
+        """A history with one curve in force on every date (e.g. the sliders' settings)."""
+        return cls([CurveVersion(date.min, curve)])
+
+    def add(self, effective_from: date, curve: Curve, note: str = "") -> None:
+        """Adds a version, replacing any existing one with the same effective_from."""
+        self.versions = [v for v in self.versions if v.effective_from != effective_from]
+        self.versions.append(CurveVersion(effective_from, curve, note))
+        self.versions.sort(key=lambda v: v.effective_from)
+
+    def curve_for(self, selected_date: date) -> Optional[Curve]:
+        """The curve in force on a local date (None before the first version)."""
+        current = None
+        for version in self.versions:
+            if version.effective_from > selected_date:
+                break
+            current = version.curve
+        return current
+
+    def apply(self, local_days: np.ndarray, u: np.ndarray) -> np.ndarray:
+        """
+        Calibrates readings with the version in force on each one's local day.
+
+        One searchsorted assigns every reading a version, then each curve is evaluated
+        once over all of its readings.
+        """
+        u = np.asarray(u, dtype=np.float64)
+        out = u.copy()
+        if not self.versions:
+            return out
+        starts = np.array([date_to_day(v.effective_from) for v in self.versions], dtype=np.int64)
+        version_idx = np.searchsorted(starts, local_days, side="right") - 1
+        for i, version in enumerate(self.versions):
+            rows = version_idx == i
+            if rows.any():
+                out[rows] = version.curve.apply(u[rows])
+        return out
+
+    def apply_to(self, dataset: SeriesDataset) -> np.ndarray:
+        """Calibrated values of a dataset with local time applied."""
+        return self.apply(dataset.local_days, dataset.uvi)
+
+    def to_list(self) -> List[Dict]:
+        return [
+            {"effective_from": v.effective_from.isoformat(), "curve": v.curve.to_dict(), "note": v.note}
+            for v in self.versions
+        ]
+
+    @classmethod
+    def from_list(cls, entries: List[Dict]) -> "DeviceCurveHistory":
+        return cls([
+            CurveVersion(date.fromisoformat(e["effective_from"]), curve_from_dict(e["curve"]), e.get("note", ""))
+            for e in entries
+        ])
+
+
+def compare_curves(u: np.ndarray, curves: Dict[str, Curve]) -> Dict[str, np.ndarray]:
+    """Applies several curves to the same readings, e.g. to plot them side by side."""
+    return {name: curve.apply(u) for name, curve in curves.items()}
+
+
+def load_curve_histories(path: str = CURVES_FILE) -> Dict[str, DeviceCurveHistory]:
+    """Reads every device's curve history (empty if the file doesn't exist)."""
+    if not os.path.exists(path):
+        return {}
+    with open(path, "r") as f:
+        data = json.load(f)
+    return {device_id: DeviceCurveHistory.from_list(entries) for device_id, entries in data.items()}
+
+
+def save_curve_histories(histories: Dict[str, DeviceCurveHistory], path: str = CURVES_FILE) -> None:
+    data = {str(device_id): history.to_list() for device_id, history in histories.items()}
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(data, f, indent=2, sort_keys=True)
+    os.replace(tmp_path, path)
@@ -0,0 +1,174 @@
+from dataclasses import dataclass
+from datetime import date
+from typing import List
+
+import numpy as np
+
+from data_functions import NIWA_MAX_DOSE_GAP_SECONDS, UVI_MAX_DOSE_GAP_SECONDS, per_day_dose
+from datasets import NiwaDataset, UviDataset, day_to_date
+
+# Readings either side of each point in the rolling mean (25 minutes at the 5-minute cadence)
+ROLLING_HALF_WINDOW = 2
+# Readings under this fraction of the day's device peak are dawn/dusk and are not scored
+DAYLIGHT_FRACTION = 0.1
+# A day needs this many scored readings (4 hours at the 5-minute cadence) to be judged
+MIN_DAYLIGHT_READINGS = 48
+# The dose ratio of the clearest days is taken as this percentile over all judged days
+REFERENCE_DOSE_PERCENTILE = 90
+
+# Default thresholds for a clear day
+MAX_VARIABILITY = 0.02
+MIN_RELATIVE_DOSE = 0.85
+# Far above the clearest days means the day's forecast is incomplete, not that it was clear
+MAX_RELATIVE_DOSE = 1.25
+MIN_FORECAST_RATIO = 0.85
+
+
+@dataclass
+class ClearDayScores:
+    """
+    Clear-sky screening of every date, one array element per date.
+
+    variability: RMS of the device readings about their rolling mean, over the day's
+        peak (0 for a smooth curve; cloud makes it jump).
+    relative_dose: Device dose / NIWA clear sky dose, over the same ratio of the
+        clearest days (so the device's calibration cancels out).
+    forecast_ratio: NIWA cloudy sky dose / clear sky dose (1 when NIWA expects no cloud).
+    score: Product of the three terms mapped to 0-1; higher is clearer. Only for ranking.
+    """
+    dates: List[date]
+    variability: np.ndarray
+    relative_dose: np.ndarray
+    forecast_ratio: np.ndarray
+    daylight_readings: np.ndarray
+    score: np.ndarray
+    is_clear: np.ndarray
+
+    def clear_dates(self) -> List[date]:
+        """The dates classified as clear, in date order."""
+        return [d for d, clear in zip(self.dates, self.is_clear) if clear]
+
+    def to_dataframe(self):
+        """Returns the scores as a pandas DataFrame, one row per date."""
+        import pandas as pd
+
+        return pd.DataFrame({
+            "date": self.dates,
+            "clear": self.is_clear,
+            "score": self.score,
+            "variability": self.variability,
+            "relative_dose": self.relative_dose,
+            "forecast_ratio": self.forecast_ratio,
+            "daylight_readings": self.daylight_readings,
+        })
+
+
+def _segments(day_idx: np.ndarray):
+    # (start, end) row of each run of equal day indices, plus the run each row belongs to
+    starts = np.flatnonzero(np.concatenate([[True], day_idx[1:] != day_idx[:-1]]))
+    ends = np.append(starts[1:], len(day_idx))
+    run = np.cumsum(np.concatenate([[0], (day_idx[1:] != day_idx[:-1]).astype(np.int64)]))
+    return starts, ends, run
+
+
+def rolling_mean_within_days(values: np.ndarray, day_idx: np.ndarray, half_window: int) -> np.ndarray:
+    """
+    Centred rolling mean that never mixes days (windows are cut at day boundaries).
+
+    ``day_idx`` must be sorted, as it is for date-indexed datasets.
+    """
+    if len(values) == 0:
+        return np.zeros(0)
+    starts, ends, run = _segments(day_idx)
+    i = np.arange(len(values))
+    lo = np.maximum(i - half_window, starts[run])
+    hi = np.minimum(i + half_window + 1, ends[run])
+    cumulative = np.concatenate([[0.0], np.cumsum(values, dtype=np.float64)])
+    return (cumulative[hi] - cumulative[lo]) / (hi - lo)
+
+
+def classify_days(
+    niwa_clear_sky_hourly: NiwaDataset,
+    niwa_cloudy_sky_hourly: NiwaDataset,
+    uvi_5min: UviDataset,
+    max_variability: float = MAX_VARIABILITY,
+    min_relative_dose: float = MIN_RELATIVE_DOSE,
+    max_relative_dose: float = MAX_RELATIVE_DOSE,
+    min_forecast_ratio: float = MIN_FORECAST_RATIO,
+    half_window: int = ROLLING_HALF_WINDOW
+) -> ClearDayScores:
+    """
+    Scores every date for clear sky in one vectorized pass over each dataset.
+
+    A day is clear when the device curve is smooth (low variability about its rolling
+    mean), its dose is close to that of the clearest days relative to NIWA clear sky,
+    and NIWA's cloudy sky forecast agrees with its clear sky one. Days with fewer than
+    ``MIN_DAYLIGHT_READINGS`` daylight readings are never clear.
+
+    Args:
+        niwa_clear_sky_hourly (NiwaDataset): Date-indexed clear sky data.
+        niwa_cloudy_sky_hourly (NiwaDataset): Date-indexed cloudy sky data.
+        uvi_5min (UviDataset): Date-indexed device readings (raw, not calibrated).
+        max_variability (float): Largest variability of a clear day.
+        min_relative_dose (float): Smallest relative dose of a clear day.
+        max_relative_dose (float): Largest relative dose of a clear day.
+        min_forecast_ratio (float): Smallest NIWA cloudy / clear dose ratio of a clear day.
+        half_window (int): Readings either side of a point in the rolling mean.
+
+    Returns:
+        ClearDayScores: Scores for every date in any of the datasets (as in ``build_date_stats``).
+    """
+    datasets = (niwa_clear_sky_hourly, niwa_cloudy_sky_hourly, uvi_5min)
+    all_days = np.unique(np.concatenate([d.local_days for d in datasets]))
+    n_days = len(all_days)
+    clear_idx, cloudy_idx, uvi_idx = (np.searchsorted(all_days, d.local_days) for d in datasets)
+
+    u = uvi_5min.uvi.astype(np.float64)
+    peak = np.zeros(n_days)
+    np.maximum.at(peak, uvi_idx, u)
+
+    # Roughness: spread of the readings about their rolling mean, over daylight only
+    residual = u - rolling_mean_within_days(u, uvi_idx, half_window)
+    daylight = (u >= DAYLIGHT_FRACTION * peak[uvi_idx]) & (peak[uvi_idx] > 0)
+    daylight_readings = np.bincount(uvi_idx[daylight], minlength=n_days)
+    square_sum = np.bincount(uvi_idx[daylight], weights=residual[daylight] ** 2, minlength=n_days)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        variability = np.sqrt(square_sum / daylight_readings) / peak
+
+    device_dose = per_day_dose(uvi_5min, uvi_idx, n_days, UVI_MAX_DOSE_GAP_SECONDS)
+    clear_dose = per_day_dose(niwa_clear_sky_hourly, clear_idx, n_days, NIWA_MAX_DOSE_GAP_SECONDS)
+    cloudy_dose = per_day_dose(niwa_cloudy_sky_hourly, cloudy_idx, n_days, NIWA_MAX_DOSE_GAP_SECONDS)
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        dose_ratio = np.where(clear_dose > 0, device_dose / clear_dose, np.nan)
+        forecast_ratio = np.where(clear_dose > 0, cloudy_dose / clear_dose, np.nan)
+
+    judged = (daylight_readings >= MIN_DAYLIGHT_READINGS) & np.isfinite(dose_ratio) & (dose_ratio > 0)
+    relative_dose = np.full(n_days, np.nan)
+    if judged.any():
+        reference = np.percentile(dose_ratio[judged], REFERENCE_DOSE_PERCENTILE)
+        relative_dose = dose_ratio / reference
+
+    is_clear = (
+        judged
+        & (variability <= max_variability)
+        & (relative_dose >= min_relative_dose)
+        & (relative_dose <= max_relative_dose)
+        & (forecast_ratio >= min_forecast_ratio)
+    )
+    score = (
+        np.clip(np.nan_to_num(relative_dose), 0.0, 1.0)
+        * np.clip(np.nan_to_num(forecast_ratio), 0.0, 1.0)
+        * np.clip(1.0 - np.nan_to_num(variability, nan=np.inf) / (2 * max_variability), 0.0, 1.0)
+    )
+    score[~judged] = 0.0
+
+    return ClearDayScores(
+        dates=[day_to_date(d) for d in all_days],
+        variability=variability,
+        relative_dose=relative_dose,
+        forecast_ratio=forecast_ratio,
+        daylight_readings=daylight_readings,
+        score=score,
+        is_clear=is_clear,
+    )
@@ -0,0 +1,94 @@
+from typing import Iterator, List, Optional, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+
+from datasets import UviDataset
+from jsonImporting import uvi_columns_from_strings, uvi_dataset_from_batches
+
+# Rows per pandas chunk; each chunk's columns are parsed in bulk
+CSV_CHUNK_ROWS = 200_000
+
+UVI_CSV_COLUMNS = ["DataId", "Timestamp", "Value", "DeviceId"]
+NIWA_CSV_COLUMNS = ["ForecastId", "ForecastData", "GeoLocationId", "UpdatedAt"]
+
+
+def iter_csv_columns(
+    file_path: str,
+    columns: Sequence[str],
+    chunk_rows: int = CSV_CHUNK_ROWS
+) -> Iterator[pd.DataFrame]:
+    """
+    Reads a CSV export in chunks with pandas' C parser, every column as raw strings.
+
+    Columns missing from the header come back as empty strings, so exports without
+    e.g. DeviceId still load. Empty fields are '' rather than NaN.
+    """
+    header = pd.read_csv(file_path, nrows=0).columns
+    present = [c for c in columns if c in header]
+    for chunk in pd.read_csv(
+        file_path, usecols=present, dtype=str, keep_default_na=False, chunksize=chunk_rows, engine="c"
+    ):
+        for column in columns:
+            if column not in chunk:
+                chunk[column] = ""
+        yield chunk
+
+
+def iter_uvi_csv_rows(
+    file_path: str,
+    chunk_rows: int = CSV_CHUNK_ROWS,
+    device_id: Optional[int] = None
+) -> Iterator[pd.DataFrame]:
+    """Yields chunks of UVI rows with a timestamp and value, optionally for one DeviceId."""
+    for chunk in iter_csv_columns(file_path, UVI_CSV_COLUMNS, chunk_rows):
+        keep = (chunk["Timestamp"] != "") & (chunk["Value"] != "")
+        if device_id is not None:
+            keep &= chunk["DeviceId"] == str(device_id)
+        yield chunk[keep]
+
+
+def load_uvi_csv(
+    file_path: str,
+    chunk_rows: int = CSV_CHUNK_ROWS,
+    device_id: Optional[int] = None
+) -> UviDataset:
+    """
+    Loads a UVI CSV export into the same UviDataset the JSON loader builds.
+
+    Args:
+        file_path (str): Path to the CSV export.
+        chunk_rows (int): Rows per chunk.
+        device_id (int, optional): Only keep rows with this DeviceId.
+    """
+    return uvi_dataset_from_batches(
+        uvi_columns_from_strings(chunk["Timestamp"].to_numpy(), chunk["Value"].to_numpy())
+        for chunk in iter_uvi_csv_rows(file_path, chunk_rows, device_id)
+    )
+
+
+def read_niwa_csv(
+    file_path: str,
+    location_id: Optional[int] = None,
+    chunk_rows: int = CSV_CHUNK_ROWS
+) -> Tuple[List[str], List[Optional[str]], List[Optional[str]]]:
+    """
+    Reads the forecast records of a NIWA CSV export, in file order.
+
+    The ForecastData column is handed on as raw strings and decoded in bulk by
+    niwa_decoder, exactly as for the JSON exports.
+
+    Returns:
+        tuple: (forecast_ids, forecast_blobs, updated_at)
+    """
+    forecast_ids: List[str] = []
+    forecast_blobs: List[Optional[str]] = []
+    updated_at: List[Optional[str]] = []
+    for chunk in iter_csv_columns(file_path, NIWA_CSV_COLUMNS, chunk_rows):
+        if location_id is not None:
+            chunk = chunk[chunk["GeoLocationId"] == str(location_id)]
+        forecast_ids.extend(chunk["ForecastId"].tolist())
+        # '' means missing, like an absent key in the JSON export
+        forecast_blobs.extend(np.where(chunk["ForecastData"] == "", None, chunk["ForecastData"]).tolist())
+        updated_at.extend(np.where(chunk["UpdatedAt"] == "", None, chunk["UpdatedAt"]).tolist())
+    return forecast_ids, forecast_blobs, updated_at
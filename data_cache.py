@@ -0,0 +1,226 @@
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+import time
+from typing import Dict, Optional, Tuple
+
+import numpy as np
+
+from adjustTimeZone import apply_nz_time_conversion
+from data_functions import create_data_by_date
+from datasets import NiwaDataset, UviDataset
+from jsonImporting import load_uvi_and_niwa
+
+# Bump whenever the loader/timezone/grouping output changes so old entries are ignored
+CACHE_FORMAT_VERSION = 2
+CACHE_DIR_NAME = ".uvi_cache"
+DEFAULT_MAX_CACHE_BYTES = 512 * 1024 * 1024
+META_FILE = "meta.json"
+# Content hashes of source files by path, size and mtime, so warm starts don't re-read them
+HASH_INDEX_FILE = "content_hashes.json"
+# A file modified this recently could change again within the same mtime tick, so its
+# hash isn't remembered yet
+RACY_MTIME_SECONDS = 2.0
+
+_DATASET_TYPES = {
+    "uvi_5min": UviDataset,
+    "niwa_clear": NiwaDataset,
+    "niwa_cloudy": NiwaDataset,
+}
+
+
+def file_fingerprint(path: str, known_hashes: Optional[Dict] = None) -> Dict:
+    """
+    Identifies a source file by absolute path, size, mtime and a BLAKE2 hash of its content.
+
+    Args:
+        path (str): Source file.
+        known_hashes (dict, optional): Hash index (see ``HASH_INDEX_FILE``). The content
+            hash is taken from it when path, size and mtime all still match, and stored in
+            it after hashing otherwise.
+    """
+    stat = os.stat(path)
+    abspath = os.path.abspath(path)
+    known = known_hashes.get(abspath) if known_hashes is not None else None
+    if known and known["size"] == stat.st_size and known["mtime_ns"] == stat.st_mtime_ns:
+        content = known["content"]
+    else:
+        digest = hashlib.blake2b(digest_size=16)
+        with open(path, 'rb') as f:
+            for block in iter(lambda: f.read(1 << 20), b''):
+                digest.update(block)
+        content = digest.hexdigest()
+        if known_hashes is not None and time.time() - stat.st_mtime > RACY_MTIME_SECONDS:
+            known_hashes[abspath] = {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns, "content": content}
+    return {
+        "path": abspath,
+        "size": stat.st_size,
+        "mtime_ns": stat.st_mtime_ns,
+        "content": content,
+    }
+
+
+def _load_hash_index(cache_dir: str) -> Dict:
+    try:
+        with open(os.path.join(cache_dir, HASH_INDEX_FILE), 'r') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def _save_hash_index(cache_dir: str, index: Dict) -> None:
+    try:
+        os.makedirs(cache_dir, exist_ok=True)
+        tmp = os.path.join(cache_dir, f".{HASH_INDEX_FILE}.{os.getpid()}.tmp")
+        with open(tmp, 'w') as f:
+            json.dump(index, f)
+        os.replace(tmp, os.path.join(cache_dir, HASH_INDEX_FILE))
+    except OSError as e:
+        print(f"Could not save source hash index: {e}")
+
+
+def cache_key(uvi_file_path: str, niwa_file_path: str, cache_dir: Optional[str] = None) -> str:
+    """
+    Builds the cache key for a UVI/NIWA source pair.
+
+    With ``cache_dir``, content hashes are remembered there, so an unchanged source
+    costs a stat instead of a full read.
+    """
+    index = _load_hash_index(cache_dir) if cache_dir else None
+    before = dict(index) if index is not None else None
+    parts = {
+        "version": CACHE_FORMAT_VERSION,
+        "uvi": file_fingerprint(uvi_file_path, index),
+        "niwa": file_fingerprint(niwa_file_path, index),
+    }
+    if index is not None and index != before:
+        _save_hash_index(cache_dir, index)
+    return hashlib.blake2b(json.dumps(parts, sort_keys=True).encode(), digest_size=16).hexdigest()
+
+
+def _entry_size(entry_dir: str) -> int:
+    return sum(
+        os.path.getsize(os.path.join(entry_dir, name))
+        for name in os.listdir(entry_dir)
+    )
+
+
+def evict_cache(cache_dir: str, max_cache_bytes: int = DEFAULT_MAX_CACHE_BYTES) -> None:
+    """
+    Deletes least recently used cache entries until the directory fits in ``max_cache_bytes``.
+
+    Recency is the mtime of each entry's meta file, which is touched on every hit.
+    """
+    if not os.path.isdir(cache_dir):
+        return
+    entries = []
+    for name in os.listdir(cache_dir):
+        entry_dir = os.path.join(cache_dir, name)
+        meta_path = os.path.join(entry_dir, META_FILE)
+        if os.path.isfile(meta_path):
+            entries.append((os.path.getmtime(meta_path), _entry_size(entry_dir), entry_dir))
+
+    total = sum(size for _, size, _ in entries)
+    for _, size, entry_dir in sorted(entries):
+        if total <= max_cache_bytes:
+            break
+        shutil.rmtree(entry_dir, ignore_errors=True)
+        total -= size
+
+
+def _write_entry(entry_dir: str, datasets: Dict[str, object]) -> None:
+    parent = os.path.dirname(entry_dir)
+    os.makedirs(parent, exist_ok=True)
+    # Write into a temp dir and rename so readers never see a half-written entry
+    tmp_dir = tempfile.mkdtemp(dir=parent, prefix=".tmp-")
+    try:
+        for name, dataset in datasets.items():
+            for column, array in dataset.to_arrays().items():
+                np.save(os.path.join(tmp_dir, f"{name}.{column}.npy"), np.ascontiguousarray(array))
+        with open(os.path.join(tmp_dir, META_FILE), 'w') as f:
+            json.dump({"version": CACHE_FORMAT_VERSION, "datasets": list(datasets)}, f)
+        os.replace(tmp_dir, entry_dir)
+    except OSError:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        if not os.path.isdir(entry_dir):
+            raise
+
+
+def _read_entry(entry_dir: str) -> Optional[Tuple[UviDataset, NiwaDataset, NiwaDataset]]:
+    meta_path = os.path.join(entry_dir, META_FILE)
+    if not os.path.isfile(meta_path):
+        return None
+    try:
+        loaded = {}
+        for name, dataset_type in _DATASET_TYPES.items():
+            arrays = {}
+            prefix = f"{name}."
+            for file_name in os.listdir(entry_dir):
+                if file_name.startswith(prefix) and file_name.endswith(".npy"):
+                    column = file_name[len(prefix):-len(".npy")]
+                    arrays[column] = np.load(os.path.join(entry_dir, file_name), mmap_mode='r')
+            loaded[name] = dataset_type.from_arrays(arrays)
+    except (OSError, ValueError, KeyError) as e:
+        print(f"Ignoring unreadable cache entry {entry_dir}: {e}")
+        return None
+
+    # Mark as recently used for LRU eviction
+    os.utime(meta_path)
+    return loaded["uvi_5min"], loaded["niwa_clear"], loaded["niwa_cloudy"]
+
+
+def load_processed_uvi_and_niwa(
+    uvi_file_path: str,
+    niwa_file_path: str,
+    cache_dir: Optional[str] = None,
+    max_cache_bytes: int = DEFAULT_MAX_CACHE_BYTES
+) -> Tuple[UviDataset, NiwaDataset, NiwaDataset]:
+    """
+    Loads, timezone-converts and date-indexes the UVI and NIWA data, using an on-disk cache.
+
+    The processed columns are stored as .npy files in ``cache_dir`` (by default a
+    ``.uvi_cache`` folder next to the UVI file) and memory-mapped on later calls, so a
+    warm start skips JSON parsing entirely. Entries are keyed on both files' path, size,
+    mtime and content hash (only recomputed when the path, size or mtime changed); old
+    entries are evicted LRU once the cache exceeds ``max_cache_bytes``.
+
+    Args:
+        uvi_file_path (str): Path to the UVI JSON data file.
+        niwa_file_path (str): Path to the NIWA JSON forecast file.
+        cache_dir (str, optional): Where to keep cache entries.
+        max_cache_bytes (int): Size cap for the cache directory.
+
+    Returns:
+        tuple: (uvi_5min, niwa_clear_sky_hourly, niwa_cloudy_sky_hourly), date-indexed and
+            possibly backed by read-only memory maps.
+    """
+    if cache_dir is None:
+        cache_dir = os.path.join(os.path.dirname(os.path.abspath(uvi_file_path)), CACHE_DIR_NAME)
+
+    try:
+        key = cache_key(uvi_file_path, niwa_file_path, cache_dir)
+    except OSError as e:
+        print(f"Cannot fingerprint source files, skipping cache: {e}")
+        key = None
+
+    entry_dir = os.path.join(cache_dir, key) if key else None
+    if entry_dir:
+        cached = _read_entry(entry_dir)
+        if cached is not None:
+            return cached
+
+    uvi_5min, niwa_clear, niwa_cloudy = load_uvi_and_niwa(uvi_file_path, niwa_file_path)
+    apply_nz_time_conversion(niwa_clear, niwa_cloudy, uvi_5min)
+    niwa_clear, niwa_cloudy, uvi_5min = create_data_by_date(niwa_clear, niwa_cloudy, uvi_5min)
+
+    # Failed loads come back empty; don't cache them
+    if entry_dir and len(uvi_5min) and len(niwa_clear):
+        try:
+            _write_entry(entry_dir, {"uvi_5min": uvi_5min, "niwa_clear": niwa_clear, "niwa_cloudy": niwa_cloudy})
+            evict_cache(cache_dir, max_cache_bytes)
+        except OSError as e:
+            print(f"Could not write data cache: {e}")
+
+    return uvi_5min, niwa_clear, niwa_cloudy
@@ -1,91 +1,209 @@
-from collections import defaultdict
-from datetime import date
-from typing import List, Dict, Tuple
+from dataclasses import dataclass
+from datetime import date, datetime, timezone
+from typing import List, Optional, Tuple
+
+import numpy as np
+
+from datasets import MISSING_EPOCH, SECONDS_PER_DAY, NiwaDataset, SeriesDataset, UviDataset, day_to_date
+from instrumentation import stage
+
+# Nominal device cadence, used for the coverage figure
+UVI_CADENCE_SECONDS = 5 * 60
+# Dose integration does not bridge gaps longer than these
+UVI_MAX_DOSE_GAP_SECONDS = 30 * 60
+NIWA_MAX_DOSE_GAP_SECONDS = 2 * 60 * 60
 
 def create_data_by_date(
-    niwa_clear_sky_hourly: List[Dict],
-    niwa_cloudy_sky_hourly: List[Dict],
-    uvi_5min: List[Dict]
-) -> Tuple[Dict[date, List[Dict]], Dict[date, List[Dict]], Dict[date, List[Dict]]]:
+    niwa_clear_sky_hourly: NiwaDataset,
+    niwa_cloudy_sky_hourly: NiwaDataset,
+    uvi_5min: UviDataset
+) -> Tuple[NiwaDataset, NiwaDataset, UviDataset]:
     """   
     To Make the data more efficient to work with, we group the data by date.  
-    """
-
-    niwa_clear_by_date = defaultdict(list)
-    niwa_cloudy_by_date = defaultdict(list)
-    uvi_5min_by_date = defaultdict(list)
-
-    for entry in niwa_clear_sky_hourly:
-        if 'datetime_nz_date' in entry:
-            niwa_clear_by_date[entry['datetime_nz_date']].append(entry)
 
-    for entry in niwa_cloudy_sky_hourly:
-        if 'datetime_nz_date' in entry:
-            niwa_cloudy_by_date[entry['datetime_nz_date']].append(entry)
+    Each dataset gets a per-date offset index so the rows for a date are an O(1) slice.
+    The same (now indexed) datasets are returned.
+    """
 
-    for entry in uvi_5min:
-        if 'datetime_nz_date' in entry:
-            uvi_5min_by_date[entry['datetime_nz_date']].append(entry)
+    datasets = (niwa_clear_sky_hourly, niwa_cloudy_sky_hourly, uvi_5min)
+    with stage("grouping", rows=sum(len(d) for d in datasets)):
+        for dataset in datasets:
+            dataset.build_date_index()
 
-    return niwa_clear_by_date, niwa_cloudy_by_date, uvi_5min_by_date
+    return niwa_clear_sky_hourly, niwa_cloudy_sky_hourly, uvi_5min
 
 
 
 
 def find_unique_dates(
-    niwa_clear_sky_hourly: List[Dict],
-    uvi_5min: List[Dict]
+    niwa_clear_sky_hourly: NiwaDataset,
+    uvi_5min: UviDataset
 ) -> List[date]:
    """
    Extracts unique dates from the provided Niwa clear sky hourly data and UVI 5-minute data.
 
    Args:
-      niwa_clear_sky_hourly (list): List of dicts with 'datetime_nz' keys.
-      uvi_5min (list): List of dicts with 'datetime_nz' keys.
+      niwa_clear_sky_hourly (NiwaDataset): Clear sky data with local time applied.
+      uvi_5min (UviDataset): UVI 5-minute data with local time applied.
 
    Returns:
       list: Sorted list of unique dates (as datetime.date objects).
    """
-   # Extract unique dates from the processed data
-   unique_dates = set()
+   # Extract unique local day numbers from both datasets
+   unique_days = np.union1d(niwa_clear_sky_hourly.local_days, uvi_5min.local_days)
 
-   # Add dates from Niwa clear sky data
-   for item in niwa_clear_sky_hourly:
-      unique_dates.add(item['datetime_nz'].date())
+   # Convert the sorted unique days to dates
+   sorted_unique_dates = [day_to_date(d) for d in unique_days]
 
-   # Add dates from Niwa cloudy sky data (if needed, assuming same dates as clear sky)
-   # for item in niwa_cloudy_sky_hourly:
-   #     unique_dates.add(item['datetime'].date())
+   return sorted_unique_dates
 
-   # Add dates from UVI 5-minute data
-   for item in uvi_5min:
-      unique_dates.add(item['datetime_nz'].date())
 
-   # Convert the set of unique dates to a sorted list
-   sorted_unique_dates = sorted(list(unique_dates))
 
-   print("List of unique dates:")
-   for date in sorted_unique_dates:
-    print(f"- {date}")
+@dataclass
+class DateStats:
+    """
+    Per-date summary of all three series, one array element per date.
 
-   return sorted_unique_dates
+    Dose is the time-integrated UVI (UVI x hours) over the day.
+    """
+    dates: List[date]
+    uvi_counts: np.ndarray
+    niwa_clear_counts: np.ndarray
+    niwa_cloudy_counts: np.ndarray
+    coverage: np.ndarray
+    max_gap_minutes: np.ndarray
+    device_peak_uvi: np.ndarray
+    clear_peak_uvi: np.ndarray
+    device_dose: np.ndarray
+    clear_dose: np.ndarray
+    cloudy_dose: np.ndarray
+    forecast_updated_at: np.ndarray
+
+    def to_dataframe(self):
+        """Returns the summary as a pandas DataFrame, one row per date."""
+        import pandas as pd
+
+        updated = [
+            datetime.fromtimestamp(int(t), tz=timezone.utc).replace(tzinfo=None) if t != MISSING_EPOCH else None
+            for t in self.forecast_updated_at
+        ]
+        return pd.DataFrame({
+            "date": self.dates,
+            "uvi_readings": self.uvi_counts,
+            "clear_readings": self.niwa_clear_counts,
+            "cloudy_readings": self.niwa_cloudy_counts,
+            "coverage": self.coverage,
+            "max_gap_minutes": self.max_gap_minutes,
+            "device_peak_uvi": self.device_peak_uvi,
+            "clear_peak_uvi": self.clear_peak_uvi,
+            "device_dose": self.device_dose,
+            "clear_dose": self.clear_dose,
+            "cloudy_dose": self.cloudy_dose,
+            "forecast_updated_at": updated,
+        })
+
+
+def per_day_dose(dataset: SeriesDataset, day_idx: np.ndarray, n_days: int, max_gap_seconds: int) -> np.ndarray:
+    """
+    Trapezoid integral of UVI over each day (UVI x hours), skipping long gaps.
+
+    Args:
+        dataset (SeriesDataset): Dataset with local time applied.
+        day_idx (np.ndarray): Index of each row's day (0..n_days-1), non-decreasing.
+        n_days (int): Number of days in the output.
+        max_gap_seconds (int): Consecutive rows further apart than this are not integrated.
+    """
+    if len(dataset) < 2:
+        return np.zeros(n_days)
+    u = dataset.uvi.astype(np.float64)
+    # Elapsed time comes from UTC: local time runs backwards at the end of daylight saving
+    dt = np.diff(dataset.epoch)
+    same_day = (day_idx[1:] == day_idx[:-1]) & (dt <= max_gap_seconds)
+    area = 0.5 * (u[1:] + u[:-1]) * dt / 3600.0
+    return np.bincount(day_idx[1:][same_day], weights=area[same_day], minlength=n_days)
+
+
+def build_date_stats(
+    niwa_clear_sky_hourly: NiwaDataset,
+    niwa_cloudy_sky_hourly: NiwaDataset,
+    uvi_5min: UviDataset
+) -> DateStats:
+    """
+    Builds the per-date summary in a single vectorized pass over each dataset.
 
+    Args:
+        niwa_clear_sky_hourly (NiwaDataset): Clear sky data with local time applied.
+        niwa_cloudy_sky_hourly (NiwaDataset): Cloudy sky data with local time applied.
+        uvi_5min (UviDataset): UVI 5-minute data with local time applied.
+
+    Returns:
+        DateStats: Counts, coverage, peaks, doses and forecast updatedAt for every date
+            that appears in any of the datasets.
+    """
+    datasets = (niwa_clear_sky_hourly, niwa_cloudy_sky_hourly, uvi_5min)
+    all_days = np.unique(np.concatenate([d.local_days for d in datasets]))
+    n_days = len(all_days)
+    clear_idx, cloudy_idx, uvi_idx = (np.searchsorted(all_days, d.local_days) for d in datasets)
+
+    uvi_counts = np.bincount(uvi_idx, minlength=n_days)
+    clear_counts = np.bincount(clear_idx, minlength=n_days)
+    cloudy_counts = np.bincount(cloudy_idx, minlength=n_days)
+
+    device_peak = np.zeros(n_days)
+    np.maximum.at(device_peak, uvi_idx, uvi_5min.uvi.astype(np.float64))
+    clear_peak = np.zeros(n_days)
+    np.maximum.at(clear_peak, clear_idx, niwa_clear_sky_hourly.uvi.astype(np.float64))
+
+    # Largest gap between readings within a day, counting from midnight and to the next midnight
+    max_gap = np.full(n_days, float(SECONDS_PER_DAY))
+    if len(uvi_5min):
+        t = uvi_5min.local_epoch
+        day_start = all_days[uvi_idx] * SECONDS_PER_DAY
+        # Gaps between readings in UTC, which (unlike local time) doesn't jump at DST changes
+        gaps = np.concatenate([t[:1] - day_start[:1], np.diff(uvi_5min.epoch)])
+        new_day = np.concatenate([[True], uvi_idx[1:] != uvi_idx[:-1]])
+        gaps[new_day] = t[new_day] - day_start[new_day]
+        max_gap = np.zeros(n_days)
+        np.maximum.at(max_gap, uvi_idx, gaps.astype(np.float64))
+        last = np.concatenate([uvi_idx[1:] != uvi_idx[:-1], [True]])
+        np.maximum.at(max_gap, uvi_idx[last], (day_start[last] + SECONDS_PER_DAY - t[last]).astype(np.float64))
+        max_gap[uvi_counts == 0] = SECONDS_PER_DAY
+
+    updated_at = np.full(n_days, MISSING_EPOCH, dtype=np.int64)
+    np.maximum.at(updated_at, clear_idx, niwa_clear_sky_hourly.updated_at)
+
+    return DateStats(
+        dates=[day_to_date(d) for d in all_days],
+        uvi_counts=uvi_counts,
+        niwa_clear_counts=clear_counts,
+        niwa_cloudy_counts=cloudy_counts,
+        coverage=np.minimum(uvi_counts * UVI_CADENCE_SECONDS / SECONDS_PER_DAY, 1.0),
+        max_gap_minutes=max_gap / 60.0,
+        device_peak_uvi=device_peak,
+        clear_peak_uvi=clear_peak,
+        device_dose=per_day_dose(uvi_5min, uvi_idx, n_days, UVI_MAX_DOSE_GAP_SECONDS),
+        clear_dose=per_day_dose(niwa_clear_sky_hourly, clear_idx, n_days, NIWA_MAX_DOSE_GAP_SECONDS),
+        cloudy_dose=per_day_dose(niwa_cloudy_sky_hourly, cloudy_idx, n_days, NIWA_MAX_DOSE_GAP_SECONDS),
+        forecast_updated_at=updated_at,
+    )
 
 
 def find_date_counts(
-    niwa_clear_sky_hourly: List[Dict],
-    niwa_cloudy_sky_hourly: List[Dict],
-    uvi_5min: List[Dict],
-    sorted_unique_dates: List[date]
+    niwa_clear_sky_hourly: NiwaDataset,
+    niwa_cloudy_sky_hourly: NiwaDataset,
+    uvi_5min: UviDataset,
+    sorted_unique_dates: Optional[List[date]] = None
 ) -> Tuple[List[date], List[int], List[int], List[int]]:
     """
     Counts the number of UVI data points for each unique date from the given datasets.
 
+    Thin wrapper over ``build_date_stats``, kept for existing callers.
+
     Args:
-        niwa_clear_sky_hourly (list): List of clear sky data dicts with 'datetime_nz' keys.
-        niwa_cloudy_sky_hourly (list): List of cloudy sky data dicts with 'datetime_nz' keys.
-        uvi_5min (list): List of 5-minute UVI data dicts with 'datetime_nz' keys.
-        sorted_unique_dates (list): List of unique datetime.date objects.
+        niwa_clear_sky_hourly (NiwaDataset): Clear sky data with local time applied.
+        niwa_cloudy_sky_hourly (NiwaDataset): Cloudy sky data with local time applied.
+        uvi_5min (UviDataset): 5-minute UVI data with local time applied.
+        sorted_unique_dates (list, optional): Restrict the output to these dates.
 
     Returns:
         tuple: (dates, niwa_clear_counts, niwa_cloudy_counts, uvi_5min_counts)
@@ -94,25 +212,15 @@ def find_date_counts(
             - niwa_cloudy_counts: list of int
             - uvi_5min_counts: list of int
     """
-    date_counts = defaultdict(lambda: {'niwa_clear': 0, 'niwa_cloudy': 0, 'uvi_5min': 0})
-
-    for date in sorted_unique_dates:
-        for item in niwa_clear_sky_hourly:
-            if item['datetime_nz'].date() == date:
-                date_counts[date]['niwa_clear'] += 1
-
-        for item in niwa_cloudy_sky_hourly:
-            if item['datetime_nz'].date() == date:
-                date_counts[date]['niwa_cloudy'] += 1
-
-        for item in uvi_5min:
-            if item['datetime_nz'].date() == date:
-                date_counts[date]['uvi_5min'] += 1
-
-    # Prepare output
-    dates = sorted(date_counts.keys())
-    niwa_clear_counts = [date_counts[d]['niwa_clear'] for d in dates]
-    niwa_cloudy_counts = [date_counts[d]['niwa_cloudy'] for d in dates]
-    uvi_5min_counts = [date_counts[d]['uvi_5min'] for d in dates]
+    stats = build_date_stats(niwa_clear_sky_hourly, niwa_cloudy_sky_hourly, uvi_5min)
+    rows = range(len(stats.dates))
+    if sorted_unique_dates is not None:
+        wanted = set(sorted_unique_dates)
+        rows = [i for i in rows if stats.dates[i] in wanted]
+
+    dates = [stats.dates[i] for i in rows]
+    niwa_clear_counts = [int(stats.niwa_clear_counts[i]) for i in rows]
+    niwa_cloudy_counts = [int(stats.niwa_cloudy_counts[i]) for i in rows]
+    uvi_5min_counts = [int(stats.uvi_counts[i]) for i in rows]
 
     return dates, niwa_clear_counts, niwa_cloudy_counts, uvi_5min_counts
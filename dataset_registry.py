@@ -0,0 +1,178 @@
+import os
+import threading
+from dataclasses import dataclass
+from datetime import date
+from typing import Callable, Dict, Optional, Tuple
+
+from clear_sky import ClearDayScores, classify_days
+from data_cache import load_processed_uvi_and_niwa
+from data_functions import UVI_CADENCE_SECONDS, DateStats, build_date_stats, find_unique_dates
+from datasets import NiwaDataset, UviDataset
+from decimation import DecimationPyramid
+from drift_tracker import DRIFT_FILE, DriftTracker, load_and_update
+from ingest_store import DEFAULT_DEVICE_ID, DEFAULT_LOCATION_ID, DEFAULT_STORE_DIR, IngestStore, refresh_store
+from instrumentation import stage
+from sql_source import SqlSource, mysql_pool, sqlite_pool
+
+
+@dataclass(frozen=True)
+class SharedData:
+    """Read-only, date-indexed datasets shared by every Streamlit session."""
+    uvi_5min: UviDataset
+    niwa_clear: NiwaDataset
+    niwa_cloudy: NiwaDataset
+    unique_dates: Tuple[date, ...]
+    date_stats: DateStats
+    uvi_pyramid: DecimationPyramid
+    clear_days: ClearDayScores
+    # Only for the ingest store, which holds the full history
+    drift: Optional[DriftTracker] = None
+
+
+# source key (file pair or store dir) -> (source signature, SharedData)
+_registry: Dict[Tuple, Tuple[Tuple, SharedData]] = {}
+_registry_lock = threading.Lock()
+_load_locks: Dict[Tuple, threading.Lock] = {}
+
+
+def _source_signature(paths: Tuple[str, ...]) -> Tuple:
+    signature = []
+    for path in paths:
+        stat = os.stat(path)
+        signature.append((stat.st_size, stat.st_mtime_ns))
+    return tuple(signature)
+
+
+def _build_shared_data(
+    uvi_5min: UviDataset,
+    niwa_clear: NiwaDataset,
+    niwa_cloudy: NiwaDataset,
+    drift_path: Optional[str] = None
+) -> SharedData:
+    # The row counts of what was loaded go to the stage records
+    for name, dataset in (("UVI", uvi_5min), ("NIWA clear sky", niwa_clear), ("NIWA cloudy sky", niwa_cloudy)):
+        with stage(f"freeze {name}", rows=len(dataset)):
+            dataset.freeze()
+
+    with stage("date stats", rows=len(uvi_5min)):
+        unique_dates = tuple(find_unique_dates(niwa_clear, uvi_5min))
+        date_stats = build_date_stats(niwa_clear, niwa_cloudy, uvi_5min)
+    with stage("clear-day screening", rows=len(uvi_5min)):
+        clear_days = classify_days(niwa_clear, niwa_cloudy, uvi_5min)
+    with stage("decimation pyramid", rows=len(uvi_5min)):
+        uvi_pyramid = DecimationPyramid(uvi_5min.epoch, uvi_5min.uvi, UVI_CADENCE_SECONDS)
+    drift = None
+    if drift_path is not None:
+        with stage("drift update") as timing:
+            drift = load_and_update(drift_path, uvi_5min, niwa_clear, clear_days)
+            timing.rows = drift.n_days
+
+    return SharedData(
+        uvi_5min=uvi_5min,
+        niwa_clear=niwa_clear,
+        niwa_cloudy=niwa_cloudy,
+        unique_dates=unique_dates,
+        date_stats=date_stats,
+        uvi_pyramid=uvi_pyramid,
+        clear_days=clear_days,
+        drift=drift,
+    )
+
+
+def _get_or_load(
+    key: Tuple,
+    signature: Callable[[], Tuple],
+    loader: Callable[[], Tuple],
+    drift_path: Optional[str] = None
+) -> SharedData:
+    """
+    Returns the registered data for ``key``, calling ``loader`` when it is missing or stale.
+
+    Only one session loads a given key; the others wait and reuse its result.
+    """
+    with _registry_lock:
+        load_lock = _load_locks.setdefault(key, threading.Lock())
+
+    with load_lock:
+        current = signature()
+        with _registry_lock:
+            entry = _registry.get(key)
+            if entry is not None and entry[0] == current:
+                return entry[1]
+
+        shared = _build_shared_data(*loader(), drift_path=drift_path)
+        with _registry_lock:
+            _registry[key] = (current, shared)
+        return shared
+
+
+def get_shared_data(uvi_file_path: str, niwa_file_path: str) -> SharedData:
+    """
+    Returns the process-wide datasets for a UVI/NIWA source pair, loading them at most once.
+
+    Streamlit reruns and concurrent sessions all get the same frozen objects. A cheap stat
+    of both files on each call detects a replaced export, in which case the pair is
+    reloaded (through the on-disk cache) and the new objects replace the old ones.
+    """
+    key = (os.path.abspath(uvi_file_path), os.path.abspath(niwa_file_path))
+    return _get_or_load(key, lambda: _source_signature(key), lambda: load_processed_uvi_and_niwa(*key))
+
+
+def get_shared_store_data(
+    data_dir: str = "data",
+    store_dir: str = DEFAULT_STORE_DIR,
+    device_id: int = DEFAULT_DEVICE_ID,
+    location_id: int = DEFAULT_LOCATION_ID
+) -> SharedData:
+    """
+    Returns the process-wide datasets for the consolidated ingest store.
+
+    Each call ingests any new exports dropped into ``data_dir`` (only their new tails
+    are parsed, and only rows for ``device_id`` / ``location_id`` are kept); the shared
+    datasets are rebuilt only when the store changed.
+    """
+    key = ("store", os.path.abspath(store_dir), device_id, location_id)
+
+    def signature() -> Tuple:
+        store = refresh_store(data_dir, store_dir, device_id=device_id, location_id=location_id)
+        return _source_signature((store.manifest_path,)) if os.path.exists(store.manifest_path) else ()
+
+    # The drift statistics live with the store, so only days the store adds are realigned
+    return _get_or_load(
+        key, signature, lambda: IngestStore(store_dir, device_id, location_id).datasets(),
+        drift_path=os.path.join(store_dir, DRIFT_FILE)
+    )
+
+
+_sql_sources: Dict[str, SqlSource] = {}
+
+
+def get_shared_sql_source(settings: Dict) -> SqlSource:
+    """
+    Returns the process-wide database source for a settings dict (see persist_settings).
+
+    Sessions share its connection pool and its cache of fetched date windows; each
+    window is built into a SharedData the first time any session views it.
+    """
+    key = repr(sorted(settings.items()))
+    with _registry_lock:
+        source = _sql_sources.get(key)
+        if source is None:
+            connect_args = {k: v for k, v in settings.items() if k not in ("driver", "device_id", "location_id")}
+            if settings.get("driver", "sqlite") == "sqlite":
+                pool = sqlite_pool(connect_args["database"])
+            else:
+                pool = mysql_pool(**connect_args)
+            source = SqlSource(
+                pool, settings.get("device_id", DEFAULT_DEVICE_ID), settings.get("location_id", DEFAULT_LOCATION_ID),
+                build_window=_build_shared_data
+            )
+            _sql_sources[key] = source
+        return source
+
+
+def clear_shared_data() -> None:
+    """Drops every registered dataset (they are reloaded on next use)."""
+    with _registry_lock:
+        _registry.clear()
+        _sql_sources.clear()
@@ -0,0 +1,207 @@
+from datetime import date
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+SECONDS_PER_DAY = 86400
+EPOCH_ORDINAL = date(1970, 1, 1).toordinal()
+# Used for updatedAt values that were missing or could not be parsed
+MISSING_EPOCH = np.iinfo(np.int64).min
+
+
+def date_to_day(d: date) -> int:
+    """Converts a date to a day number (days since 1970-01-01)."""
+    return d.toordinal() - EPOCH_ORDINAL
+
+
+def day_to_date(day: int) -> date:
+    """Converts a day number (days since 1970-01-01) back to a date."""
+    return date.fromordinal(int(day) + EPOCH_ORDINAL)
+
+
+class SeriesDataset:
+    """
+    Columnar time series of UVI readings.
+
+    All columns are NumPy arrays of equal length, sorted by ``epoch`` (UTC seconds).
+    After ``set_local_time`` and ``build_date_index`` the rows for any local date
+    can be fetched as an O(1) slice through a dense per-day offset table.
+
+    Attributes:
+        epoch (np.ndarray): int64 UTC epoch seconds.
+        uvi (np.ndarray): float32 UVI values.
+        local_epoch (np.ndarray | None): int64 local wall-clock seconds, set by the timezone step.
+    """
+
+    columns: Tuple[str, ...] = ("epoch", "uvi")
+    dtypes: Dict[str, type] = {"epoch": np.int64, "uvi": np.float32}
+
+    def __init__(self, epoch, uvi, **extra_columns):
+        arrays = {"epoch": epoch, "uvi": uvi, **extra_columns}
+        for name in self.columns:
+            setattr(self, name, np.asarray(arrays[name], dtype=self.dtypes[name]))
+
+        # Keep everything sorted by time so slices and searchsorted work
+        if len(self.epoch) > 1 and np.any(np.diff(self.epoch) < 0):
+            self._reorder(np.argsort(self.epoch, kind="stable"))
+
+        self.local_epoch: Optional[np.ndarray] = None
+        self._first_day = 0
+        self._day_offsets = np.zeros(1, dtype=np.int64)
+
+    @classmethod
+    def empty(cls) -> "SeriesDataset":
+        return cls(**{name: np.empty(0, dtype=cls.dtypes[name]) for name in cls.columns})
+
+    def __len__(self) -> int:
+        return len(self.epoch)
+
+    def _reorder(self, order: np.ndarray) -> None:
+        for name in self.columns:
+            setattr(self, name, getattr(self, name)[order])
+        if getattr(self, "local_epoch", None) is not None:
+            self.local_epoch = self.local_epoch[order]
+
+    def set_local_time(self, local_epoch: np.ndarray) -> None:
+        """Attaches local wall-clock epoch seconds (one per row)."""
+        local_epoch = np.asarray(local_epoch, dtype=np.int64)
+        if local_epoch.shape != self.epoch.shape:
+            raise ValueError("local_epoch must have one entry per row")
+        self.local_epoch = local_epoch
+
+    @property
+    def local_days(self) -> np.ndarray:
+        """Local date of each row as a day number (days since 1970-01-01)."""
+        if self.local_epoch is None:
+            raise ValueError("Local time has not been applied to this dataset")
+        return self.local_epoch // SECONDS_PER_DAY
+
+    def build_date_index(self) -> None:
+        """
+        Builds the dense per-day offset table used by ``date_slice``.
+
+        ``_day_offsets[k]`` is the first row of day ``_first_day + k``, so the rows for
+        a day are ``_day_offsets[k]:_day_offsets[k + 1]``.
+        """
+        days = self.local_days
+        if len(days) == 0:
+            self._first_day = 0
+            self._day_offsets = np.zeros(1, dtype=np.int64)
+            return
+
+        # Local dates follow UTC order unless a zone shifts across midnight
+        if np.any(np.diff(days) < 0):
+            self._reorder(np.argsort(days, kind="stable"))
+            days = self.local_days
+
+        self._first_day = int(days[0])
+        all_days = np.arange(self._first_day, int(days[-1]) + 2)
+        self._day_offsets = np.searchsorted(days, all_days, side="left").astype(np.int64)
+
+    def date_slice(self, selected_date: date) -> slice:
+        """Returns the row slice for a local date (empty if there is no data)."""
+        k = date_to_day(selected_date) - self._first_day
+        if k < 0 or k >= len(self._day_offsets) - 1:
+            return slice(0, 0)
+        return slice(int(self._day_offsets[k]), int(self._day_offsets[k + 1]))
+
+    def date_range_slice(self, start_date: Optional[date] = None, end_date: Optional[date] = None) -> slice:
+        """Returns the row slice covering start_date..end_date inclusive (None = open ended)."""
+        n_days = len(self._day_offsets) - 1
+        k_start = 0 if start_date is None else date_to_day(start_date) - self._first_day
+        k_end = n_days if end_date is None else date_to_day(end_date) - self._first_day + 1
+        k_start = min(max(k_start, 0), n_days)
+        k_end = min(max(k_end, k_start), n_days)
+        return slice(int(self._day_offsets[k_start]), int(self._day_offsets[k_end]))
+
+    def day_row_offsets(self, first_day: int, n_days: int) -> np.ndarray:
+        """
+        Row offsets for ``n_days`` days from ``first_day``, like the date index but over any range.
+
+        Day ``first_day + k`` has rows ``offsets[k]:offsets[k + 1]`` (empty outside the data).
+        """
+        k = np.arange(first_day, first_day + n_days + 1) - self._first_day
+        return self._day_offsets[np.clip(k, 0, len(self._day_offsets) - 1)]
+
+    @property
+    def day_numbers(self) -> np.ndarray:
+        """Day numbers of every local date that has at least one row."""
+        counts = np.diff(self._day_offsets)
+        return self._first_day + np.flatnonzero(counts)
+
+    @property
+    def dates(self) -> List[date]:
+        """Sorted list of local dates that have at least one row."""
+        return [day_to_date(d) for d in self.day_numbers]
+
+    def count_for_date(self, selected_date: date) -> int:
+        sl = self.date_slice(selected_date)
+        return sl.stop - sl.start
+
+    def for_date(self, selected_date: date) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Returns (local times as datetime64[s], uvi values) for a local date.
+
+        Both arrays are views into the underlying columns.
+        """
+        sl = self.date_slice(selected_date)
+        return self.local_epoch[sl].astype("datetime64[s]"), self.uvi[sl]
+
+    def to_arrays(self) -> Dict[str, np.ndarray]:
+        """Returns every column plus the date index as plain arrays (for caching)."""
+        arrays = {name: getattr(self, name) for name in self.columns}
+        if self.local_epoch is not None:
+            arrays["local_epoch"] = self.local_epoch
+        arrays["day_offsets"] = self._day_offsets
+        arrays["first_day"] = np.array([self._first_day], dtype=np.int64)
+        return arrays
+
+    @classmethod
+    def from_arrays(cls, arrays: Dict[str, np.ndarray]) -> "SeriesDataset":
+        """
+        Rebuilds a dataset from ``to_arrays`` output without copying or re-sorting.
+
+        The arrays may be read-only memory maps.
+        """
+        dataset = cls.__new__(cls)
+        for name in cls.columns:
+            setattr(dataset, name, arrays[name])
+        dataset.local_epoch = arrays.get("local_epoch")
+        dataset._day_offsets = arrays["day_offsets"]
+        dataset._first_day = int(arrays["first_day"][0])
+        return dataset
+
+    def freeze(self) -> None:
+        """Marks every array read-only so the dataset can be shared safely."""
+        for array in self.to_arrays().values():
+            if array.flags.writeable:
+                array.flags.writeable = False
+
+    @property
+    def nbytes(self) -> int:
+        total = sum(getattr(self, name).nbytes for name in self.columns)
+        if self.local_epoch is not None:
+            total += self.local_epoch.nbytes
+        return total + self._day_offsets.nbytes
+
+
+class UviDataset(SeriesDataset):
+    """5-minute device readings."""
+
+
+class NiwaDataset(SeriesDataset):
+    """
+    Hourly NIWA forecast values for one product (clear or cloudy sky).
+
+    Attributes:
+        updated_at (np.ndarray): int64 epoch seconds of the forecast's UpdatedAt
+            (``MISSING_EPOCH`` when unknown).
+    """
+
+    columns = ("epoch", "uvi", "updated_at")
+    dtypes = {"epoch": np.int64, "uvi": np.float32, "updated_at": np.int64}
+
+    def __init__(self, epoch, uvi, updated_at=None):
+        if updated_at is None:
+            updated_at = np.full(len(epoch), MISSING_EPOCH, dtype=np.int64)
+        super().__init__(epoch, uvi, updated_at=updated_at)
@@ -0,0 +1,134 @@
+from typing import List
+
+import numpy as np
+
+# Screen resolution target: about two points per horizontal pixel of the plot
+DEFAULT_MAX_POINTS = 2000
+# Each pyramid level's buckets are this many times wider than the level below
+LEVEL_FACTOR = 4
+# The coarsest level keeps at least this many points
+MIN_LEVEL_POINTS = 256
+# LTTB starts from a pyramid level with up to this many times the target points
+LTTB_OVERSAMPLE = 4
+DECIMATION_METHODS = ("minmax", "lttb")
+
+
+def minmax_indices(epoch: np.ndarray, values: np.ndarray, bucket_seconds: int) -> np.ndarray:
+    """
+    Indices of the min and max value in each fixed-width time bucket.
+
+    Buckets are aligned to multiples of ``bucket_seconds``, so decimating a slice gives
+    the same points as slicing the decimated series. Peaks and troughs always survive.
+
+    Args:
+        epoch (np.ndarray): Sorted int64 epoch seconds.
+        values (np.ndarray): Values at each epoch.
+        bucket_seconds (int): Bucket width.
+
+    Returns:
+        np.ndarray: Sorted, unique int64 indices (at most two per bucket).
+    """
+    if len(epoch) == 0:
+        return np.empty(0, dtype=np.int64)
+    bucket = epoch // bucket_seconds
+    # Sorted by (bucket, value): the first row of each bucket is its min, the last its max
+    order = np.lexsort((values, bucket))
+    starts = np.flatnonzero(np.r_[True, bucket[order][1:] != bucket[order][:-1]])
+    ends = np.r_[starts[1:], len(order)] - 1
+    return np.union1d(order[starts], order[ends]).astype(np.int64)
+
+
+def lttb_indices(x: np.ndarray, y: np.ndarray, n_out: int) -> np.ndarray:
+    """
+    Largest-Triangle-Three-Buckets downsampling to ``n_out`` points.
+
+    Keeps the first and last points, and from each bucket in between the point forming
+    the largest triangle with the previously kept point and the next bucket's mean.
+
+    Returns:
+        np.ndarray: Sorted int64 indices into x / y.
+    """
+    n = len(x)
+    if n_out >= n or n_out < 3:
+        return np.arange(n, dtype=np.int64)
+
+    x = x.astype(np.float64)
+    y = y.astype(np.float64)
+    # n_out - 2 buckets over the interior points 1 .. n-2
+    edges = np.linspace(1, n - 1, n_out - 1).astype(np.int64)
+    selected = np.empty(n_out, dtype=np.int64)
+    selected[0], selected[-1] = 0, n - 1
+
+    a = 0
+    for i in range(n_out - 2):
+        lo, hi = edges[i], edges[i + 1]
+        next_lo = hi
+        next_hi = edges[i + 2] if i + 2 < len(edges) else n
+        avg_x = x[next_lo:next_hi].mean()
+        avg_y = y[next_lo:next_hi].mean()
+        area = np.abs((x[a] - avg_x) * (y[lo:hi] - y[a]) - (x[a] - x[lo:hi]) * (avg_y - y[a]))
+        a = lo + int(np.argmax(area))
+        selected[i + 1] = a
+    return selected
+
+
+class DecimationPyramid:
+    """
+    Min/max decimated index sets of a series, one per zoom level, built once.
+
+    Level 0 is every point; level k keeps the min and max of each
+    ``base_seconds * LEVEL_FACTOR**k`` bucket (built from level k-1, which gives the
+    same result as from the full series). A range view takes the finest level that
+    fits its point budget, so zooming or panning is a pair of searchsorted calls.
+
+    Attributes:
+        levels (list): Sorted int64 index arrays, finest first.
+        bucket_seconds (list): Bucket width of each level (0 for level 0).
+    """
+
+    def __init__(self, epoch: np.ndarray, values: np.ndarray, base_seconds: int,
+                 factor: int = LEVEL_FACTOR, min_points: int = MIN_LEVEL_POINTS):
+        self.epoch = epoch
+        self.values = values
+        self.levels: List[np.ndarray] = [np.arange(len(epoch), dtype=np.int64)]
+        self.bucket_seconds: List[int] = [0]
+
+        bucket = base_seconds * factor
+        while len(self.levels[-1]) > min_points:
+            previous = self.levels[-1]
+            level = previous[minmax_indices(epoch[previous], values[previous], bucket)]
+            if len(level) >= len(previous):
+                break
+            self.levels.append(level)
+            self.bucket_seconds.append(bucket)
+            bucket *= factor
+
+    def indices(
+        self,
+        row_slice: slice,
+        max_points: int = DEFAULT_MAX_POINTS,
+        method: str = "minmax"
+    ) -> np.ndarray:
+        """
+        Returns at most ``max_points`` indices covering a contiguous run of rows.
+
+        Args:
+            row_slice (slice): Rows to cover (e.g. from ``SeriesDataset.date_range_slice``).
+            max_points (int): Point budget.
+            method (str): 'minmax' (pyramid level as is) or 'lttb' (LTTB from a
+                finer level down to exactly the budget).
+        """
+        if method not in DECIMATION_METHODS:
+            raise ValueError(f"Unknown decimation method: {method}")
+        start, stop, _ = row_slice.indices(len(self.epoch))
+        budget = max_points * LTTB_OVERSAMPLE if method == "lttb" else max_points
+
+        for level in self.levels:
+            lo, hi = np.searchsorted(level, [start, stop])
+            if hi - lo <= budget:
+                break
+        chosen = level[lo:hi]
+
+        if method == "lttb" and len(chosen) > max_points:
+            chosen = chosen[lttb_indices(self.epoch[chosen], self.values[chosen], max_points)]
+        return chosen
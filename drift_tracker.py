@@ -0,0 +1,331 @@
+import argparse
+import os
+from dataclasses import dataclass
+from datetime import date
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from alignment import align_niwa_with_device
+from calibration import model_basis
+from clear_sky import ClearDayScores
+from datasets import NiwaDataset, UviDataset, date_to_day, day_to_date
+
+DRIFT_FILE = "drift_stats.npz"
+DRIFT_FORMAT_VERSION = 1
+# Per-day sums for the normal equations of reference = uvi_scale * a + uvi_scale_upper * b
+# (a, b from calibration.model_basis): pair count, then the cross products
+STAT_FIELDS = ("n", "aa", "ab", "bb", "ay", "by", "yy")
+_N, _AA, _AB, _BB, _AY, _BY, _YY = range(len(STAT_FIELDS))
+# Per-day inputs compared to find the days that need refitting: device rows, NIWA rows, NIWA sum
+_FINGERPRINT_FIELDS = 3
+
+DEFAULT_WINDOW_DAYS = 30
+DEFAULT_HALF_LIFE_DAYS = 14
+# Below this determinant (relative to aa * bb) a window has too few readings above UVI2
+# to separate the two factors, and only the overall scale is fitted
+MIN_RELATIVE_DETERMINANT = 1e-3
+
+
+@dataclass
+class DriftSeries:
+    """
+    Calibration estimates over time, one array element per day.
+
+    gain: Single factor fit (reference ~ gain * device), the clearest drift signal.
+    uvi_scale, uvi_scale_upper: Unbounded two-factor least squares fit, as the 'lstsq'
+        method of calibration.fit_calibration (uvi_scale_upper is 0 where the window
+        can't separate the factors).
+    n_pairs: Paired readings behind each estimate (fractional for EWMA).
+    """
+    dates: List[date]
+    gain: np.ndarray
+    uvi_scale: np.ndarray
+    uvi_scale_upper: np.ndarray
+    n_pairs: np.ndarray
+
+    def to_dataframe(self):
+        """Returns the series as a pandas DataFrame indexed by date."""
+        import pandas as pd
+
+        return pd.DataFrame({
+            "gain": self.gain,
+            "uvi_scale": self.uvi_scale,
+            "uvi_scale_upper": self.uvi_scale_upper,
+            "n_pairs": self.n_pairs,
+        }, index=pd.Index(self.dates, name="date"))
+
+
+def solve_sums(sums: np.ndarray) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Solves the normal equations of each row of summed statistics.
+
+    Returns:
+        tuple: (gain, uvi_scale, uvi_scale_upper) arrays (NaN where there are no pairs).
+    """
+    sums = np.atleast_2d(sums)
+    aa, ab, bb, ay, by = sums[:, _AA], sums[:, _AB], sums[:, _BB], sums[:, _AY], sums[:, _BY]
+    with np.errstate(divide="ignore", invalid="ignore"):
+        gain = np.where(aa > 0, ay / aa, np.nan)
+        det = aa * bb - ab * ab
+        separable = (bb > 0) & (det > MIN_RELATIVE_DETERMINANT * aa * bb)
+        uvi_scale = np.where(separable, (ay * bb - by * ab) / det, gain)
+        uvi_scale_upper = np.where(separable, (aa * by - ab * ay) / det, np.where(aa > 0, 0.0, np.nan))
+    return gain, uvi_scale, uvi_scale_upper
+
+
+def _day_fingerprint(uvi_5min: UviDataset, niwa_clear: NiwaDataset, first_day: int, n_days: int) -> np.ndarray:
+    fingerprint = np.zeros((n_days, _FINGERPRINT_FIELDS))
+    fingerprint[:, 0] = np.diff(uvi_5min.day_row_offsets(first_day, n_days))
+    fingerprint[:, 1] = np.diff(niwa_clear.day_row_offsets(first_day, n_days))
+    # A replaced forecast keeps the row count, so its values are summed too (bincount per day
+    # so a day's sum doesn't depend on the rows before it)
+    k = niwa_clear.local_days - first_day
+    inside = (k >= 0) & (k < n_days)
+    fingerprint[:, 2] = np.bincount(k[inside], weights=niwa_clear.uvi[inside].astype(np.float64), minlength=n_days)
+    return fingerprint
+
+
+def day_statistics(
+    uvi_5min: UviDataset,
+    niwa_clear: NiwaDataset,
+    first_day: int,
+    n_days: int,
+    align_method: str = "nearest"
+) -> np.ndarray:
+    """
+    Aligns one run of days and sums their normal-equation statistics per day.
+
+    Only the rows of those days (plus a day either side for the alignment) are read.
+
+    Returns:
+        np.ndarray: (n_days, len(STAT_FIELDS)) float64 sums.
+    """
+    niwa_offsets = niwa_clear.day_row_offsets(first_day, n_days)
+    niwa_rows = slice(int(niwa_offsets[0]), int(niwa_offsets[-1]))
+    uvi_offsets = uvi_5min.day_row_offsets(first_day - 1, n_days + 2)
+    uvi_rows = slice(int(uvi_offsets[0]), int(uvi_offsets[-1]))
+
+    niwa = NiwaDataset(niwa_clear.epoch[niwa_rows], niwa_clear.uvi[niwa_rows], niwa_clear.updated_at[niwa_rows])
+    niwa.set_local_time(niwa_clear.local_epoch[niwa_rows])
+    device = UviDataset(uvi_5min.epoch[uvi_rows], uvi_5min.uvi[uvi_rows])
+    pairs = align_niwa_with_device(niwa, device, method=align_method)
+
+    a, b = model_basis(pairs.device_uvi)
+    y = pairs.uvi.astype(np.float64)
+    k = pairs.local_days - first_day
+    terms = (np.ones(len(y)), a * a, a * b, b * b, a * y, b * y, y * y)
+    return np.stack([np.bincount(k, weights=w, minlength=n_days) for w in terms], axis=1)
+
+
+class DriftTracker:
+    """
+    Per-day sufficient statistics of the device vs NIWA clear sky regression.
+
+    Days are stored densely from ``first_day``. ``update`` only realigns the days whose
+    inputs changed (new dates, late readings, replaced forecasts), so keeping the
+    tracker current costs time proportional to the new data. Windowed estimates come
+    from prefix sums (O(1) per window) and EWMA estimates from one pass over the days,
+    both without touching the readings.
+    """
+
+    def __init__(self, align_method: str = "nearest"):
+        self.align_method = align_method
+        self.first_day = 0
+        self.stats = np.zeros((0, len(STAT_FIELDS)))
+        self.fingerprint = np.zeros((0, _FINGERPRINT_FIELDS))
+        self.clear = np.zeros(0, dtype=bool)
+        self._prefix: Dict[bool, np.ndarray] = {}
+        self._ewma: Dict[Tuple[float, bool], np.ndarray] = {}
+
+    @property
+    def n_days(self) -> int:
+        return len(self.stats)
+
+    @property
+    def dates(self) -> List[date]:
+        return [day_to_date(self.first_day + k) for k in range(self.n_days)]
+
+    def _resize(self, first_day: int, n_days: int) -> None:
+        # Grows the dense day range; existing days keep their sums and fingerprints
+        shift = self.first_day - first_day
+        for name in ("stats", "fingerprint", "clear"):
+            old = getattr(self, name)
+            new = np.zeros((n_days,) + old.shape[1:], dtype=old.dtype)
+            new[shift:shift + len(old)] = old
+            setattr(self, name, new)
+        self.first_day = first_day
+
+    def update(
+        self,
+        uvi_5min: UviDataset,
+        niwa_clear: NiwaDataset,
+        clear_days: Optional[ClearDayScores] = None
+    ) -> int:
+        """
+        Brings the statistics up to date with date-indexed datasets.
+
+        Args:
+            uvi_5min (UviDataset): Every device reading so far.
+            niwa_clear (NiwaDataset): Every NIWA clear sky value so far.
+            clear_days (ClearDayScores, optional): Screening used for the clear-only estimates.
+
+        Returns:
+            int: Number of days that were realigned.
+        """
+        day_numbers = np.union1d(uvi_5min.day_numbers, niwa_clear.day_numbers)
+        if len(day_numbers) == 0:
+            return 0
+        first_day, last_day = int(day_numbers[0]), int(day_numbers[-1])
+        if self.n_days:
+            first_day = min(first_day, self.first_day)
+            last_day = max(last_day, self.first_day + self.n_days - 1)
+        self._resize(first_day, last_day - first_day + 1)
+
+        fingerprint = _day_fingerprint(uvi_5min, niwa_clear, self.first_day, self.n_days)
+        changed = np.flatnonzero(np.any(fingerprint != self.fingerprint, axis=1))
+        # Only the changed days are realigned, one run of consecutive days at a time, so a
+        # late reading months back doesn't drag every day since into the refit
+        runs = np.split(changed, np.flatnonzero(np.diff(changed) > 1) + 1) if len(changed) else []
+        for run in runs:
+            lo, hi = int(run[0]), int(run[-1]) + 1
+            self.stats[lo:hi] = day_statistics(
+                uvi_5min, niwa_clear, self.first_day + lo, hi - lo, self.align_method
+            )
+        if len(changed):
+            self.fingerprint = fingerprint
+
+        if clear_days is not None:
+            clear_numbers = np.array([date_to_day(d) for d in clear_days.clear_dates()], dtype=np.int64)
+            self.clear = np.isin(self.first_day + np.arange(self.n_days), clear_numbers)
+
+        # Prefix and EWMA sums are rebuilt from the day sums on next use
+        self._prefix.clear()
+        self._ewma.clear()
+        return len(changed)
+
+    def _day_sums(self, clear_only: bool) -> np.ndarray:
+        return self.stats * self.clear[:, None] if clear_only else self.stats
+
+    def _prefix_sums(self, clear_only: bool) -> np.ndarray:
+        prefix = self._prefix.get(clear_only)
+        if prefix is None:
+            prefix = np.zeros((self.n_days + 1, len(STAT_FIELDS)))
+            np.cumsum(self._day_sums(clear_only), axis=0, out=prefix[1:])
+            self._prefix[clear_only] = prefix
+        return prefix
+
+    def _series(self, sums: np.ndarray, dates: Optional[List[date]] = None) -> DriftSeries:
+        gain, uvi_scale, uvi_scale_upper = solve_sums(sums)
+        return DriftSeries(self.dates if dates is None else dates, gain, uvi_scale, uvi_scale_upper, sums[:, _N])
+
+    def window(self, start_date: date, end_date: date, clear_only: bool = True) -> DriftSeries:
+        """Single estimate over start_date..end_date inclusive (O(1))."""
+        prefix = self._prefix_sums(clear_only)
+        k_start = min(max(date_to_day(start_date) - self.first_day, 0), self.n_days)
+        k_end = min(max(date_to_day(end_date) - self.first_day + 1, k_start), self.n_days)
+        return self._series((prefix[k_end] - prefix[k_start])[None, :], [end_date])
+
+    def daily(self, clear_only: bool = True) -> DriftSeries:
+        """One estimate per day from that day's pairs alone."""
+        return self._series(self._day_sums(clear_only))
+
+    def rolling(self, window_days: int = DEFAULT_WINDOW_DAYS, clear_only: bool = True) -> DriftSeries:
+        """Estimates over the ``window_days`` days ending on each day."""
+        prefix = self._prefix_sums(clear_only)
+        ends = np.arange(1, self.n_days + 1)
+        return self._series(prefix[ends] - prefix[np.maximum(ends - window_days, 0)])
+
+    def ewma(self, half_life_days: float = DEFAULT_HALF_LIFE_DAYS, clear_only: bool = True) -> DriftSeries:
+        """Estimates from exponentially weighted sums (a day's weight halves every ``half_life_days``)."""
+        key = (float(half_life_days), clear_only)
+        sums = self._ewma.get(key)
+        if sums is None:
+            decay = 0.5 ** (1.0 / half_life_days)
+            day_sums = self._day_sums(clear_only)
+            sums = np.empty_like(day_sums)
+            running = np.zeros(len(STAT_FIELDS))
+            for k in range(self.n_days):
+                running = decay * running + day_sums[k]
+                sums[k] = running
+            self._ewma[key] = sums
+        return self._series(sums)
+
+    def chart_frame(
+        self,
+        window_days: int = DEFAULT_WINDOW_DAYS,
+        half_life_days: float = DEFAULT_HALF_LIFE_DAYS,
+        clear_only: bool = True
+    ):
+        """Rolling and EWMA gain as a date-indexed pandas DataFrame, ready for st.line_chart."""
+        import pandas as pd
+
+        return pd.DataFrame({
+            f"{window_days}-day gain": self.rolling(window_days, clear_only).gain,
+            f"EWMA gain ({half_life_days:g}-day half-life)": self.ewma(half_life_days, clear_only).gain,
+        }, index=pd.Index(self.dates, name="date"))
+
+    def save(self, path: str) -> None:
+        """Writes the statistics via a temp file and rename."""
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        tmp = path + ".tmp"
+        with open(tmp, "wb") as f:
+            np.savez(
+                f, version=np.array([DRIFT_FORMAT_VERSION]), align_method=np.array([self.align_method]),
+                first_day=np.array([self.first_day]), stats=self.stats, fingerprint=self.fingerprint, clear=self.clear,
+            )
+        os.replace(tmp, path)
+
+    @classmethod
+    def load(cls, path: str, align_method: str = "nearest") -> "DriftTracker":
+        """Reads saved statistics (a fresh tracker if there are none or they don't match)."""
+        tracker = cls(align_method)
+        if not os.path.isfile(path):
+            return tracker
+        with np.load(path) as saved:
+            if int(saved["version"][0]) != DRIFT_FORMAT_VERSION or str(saved["align_method"][0]) != align_method:
+                print(f"Ignoring drift statistics in {path} from another version or alignment")
+                return tracker
+            tracker.first_day = int(saved["first_day"][0])
+            tracker.stats = saved["stats"]
+            tracker.fingerprint = saved["fingerprint"]
+            tracker.clear = saved["clear"]
+        return tracker
+
+
+def load_and_update(
+    path: str,
+    uvi_5min: UviDataset,
+    niwa_clear: NiwaDataset,
+    clear_days: Optional[ClearDayScores] = None
+) -> DriftTracker:
+    """Loads the saved tracker, realigns any changed days and saves it again if needed."""
+    tracker = DriftTracker.load(path)
+    realigned = tracker.update(uvi_5min, niwa_clear, clear_days)
+    if realigned or not os.path.isfile(path):
+        tracker.save(path)
+    return tracker
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Show calibration drift from the ingest store")
+    parser.add_argument("--data-dir", default="data")
+    parser.add_argument("--window", type=int, default=DEFAULT_WINDOW_DAYS, help="Rolling window (days)")
+    parser.add_argument("--half-life", type=float, default=DEFAULT_HALF_LIFE_DAYS, help="EWMA half-life (days)")
+    parser.add_argument("--all-days", action="store_true", help="Use every day, not only clear ones")
+    parser.add_argument("--every", type=int, default=7, help="Print every Nth day")
+    args = parser.parse_args()
+
+    from dataset_registry import get_shared_store_data
+
+    shared = get_shared_store_data(args.data_dir)
+    clear_only = not args.all_days
+    rolling = shared.drift.rolling(args.window, clear_only)
+    ewma = shared.drift.ewma(args.half_life, clear_only)
+    print(f"{'date':<12}{'rolling gain':>14}{'ewma gain':>12}{'pairs':>8}")
+    for k in range(0, shared.drift.n_days, args.every):
+        print(f"{str(rolling.dates[k]):<12}{rolling.gain[k]:>14.4f}{ewma.gain[k]:>12.4f}{int(rolling.n_pairs[k]):>8}")
+
+
+if __name__ == "__main__":
+    main()
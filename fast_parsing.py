@@ -0,0 +1,332 @@
+import io
+import json
+import os
+import re
+from contextlib import nullcontext
+from typing import Iterator, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from instrumentation import StageSplits
+
+# Byte positions of the separators in 'YYYY-MM-DD HH:MM:SS' (a 'T' is accepted at 10)
+TIMESTAMP_WIDTH = 19
+_DASH_POSITIONS = (4, 7)
+_COLON_POSITIONS = (13, 16)
+_DIGIT_POSITIONS = [0, 1, 2, 3, 5, 6, 8, 9, 11, 12, 14, 15, 17, 18]
+
+
+def days_from_civil(year: np.ndarray, month: np.ndarray, day: np.ndarray) -> np.ndarray:
+    """
+    Vectorized days since 1970-01-01 for proleptic Gregorian dates.
+
+    Uses Howard Hinnant's days_from_civil algorithm, which needs only integer arithmetic.
+    """
+    year = year - (month <= 2)
+    era = year // 400
+    yoe = year - era * 400
+    doy = (153 * np.where(month > 2, month - 3, month + 9) + 2) // 5 + day - 1
+    doe = yoe * 365 + yoe // 4 - yoe // 100 + doy
+    return era * 146097 + doe - 719468
+
+
+def parse_fixed_width_timestamps(timestamps: Sequence[str]) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Parses 'YYYY-MM-DD HH:MM[:SS...]' strings (or ISO 'T' separated) into UTC epoch seconds.
+
+    The strings are packed into a fixed-width byte matrix so every field is decoded
+    with a handful of array operations instead of one strptime call per row.
+    Anything after the seconds (fractions, 'Z') is ignored and missing seconds count as 0.
+
+    Args:
+        timestamps (Sequence[str]): Timestamp strings, assumed to be UTC.
+
+    Returns:
+        tuple: (epoch, valid)
+            - epoch: int64 array of epoch seconds (0 where invalid)
+            - valid: bool array, False for rows that did not parse
+    """
+    n = len(timestamps)
+    if n == 0:
+        return np.empty(0, dtype=np.int64), np.empty(0, dtype=bool)
+
+    raw = np.array(timestamps, dtype=f"S{TIMESTAMP_WIDTH}")
+    chars = raw.view(np.uint8).reshape(n, TIMESTAMP_WIDTH)
+
+    # Short 'YYYY-MM-DD HH:MM' strings are padded with NUL; treat missing seconds as '00'
+    seconds_missing = chars[:, 16] == 0
+    chars = chars.copy()
+    chars[seconds_missing, 16] = ord(':')
+    chars[seconds_missing, 17:19] = ord('0')
+
+    digits = chars.astype(np.int64) - ord('0')
+    valid = np.all((digits[:, _DIGIT_POSITIONS] >= 0) & (digits[:, _DIGIT_POSITIONS] <= 9), axis=1)
+    for pos in _DASH_POSITIONS:
+        valid &= chars[:, pos] == ord('-')
+    for pos in _COLON_POSITIONS:
+        valid &= chars[:, pos] == ord(':')
+    valid &= (chars[:, 10] == ord(' ')) | (chars[:, 10] == ord('T'))
+
+    year = digits[:, 0] * 1000 + digits[:, 1] * 100 + digits[:, 2] * 10 + digits[:, 3]
+    month = digits[:, 5] * 10 + digits[:, 6]
+    day = digits[:, 8] * 10 + digits[:, 9]
+    hour = digits[:, 11] * 10 + digits[:, 12]
+    minute = digits[:, 14] * 10 + digits[:, 15]
+    second = digits[:, 17] * 10 + digits[:, 18]
+
+    valid &= (month >= 1) & (month <= 12) & (day >= 1) & (day <= 31)
+    valid &= (hour <= 23) & (minute <= 59) & (second <= 60)
+
+    epoch = days_from_civil(year, month, day) * 86400 + hour * 3600 + minute * 60 + second
+    epoch[~valid] = 0
+    return epoch, valid
+
+
+def parse_float_strings(values: Sequence) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Converts a batch of numeric strings (or numbers) to float64 in one call.
+
+    Falls back to a per-value conversion only when the batch contains bad entries.
+
+    Returns:
+        tuple: (values, valid) where invalid entries are NaN and flagged False.
+    """
+    try:
+        parsed = np.array(values, dtype=np.float64)
+    except (TypeError, ValueError):
+        parsed = np.empty(len(values), dtype=np.float64)
+        for i, value in enumerate(values):
+            try:
+                parsed[i] = float(value)
+            except (TypeError, ValueError):
+                parsed[i] = np.nan
+    return parsed, ~np.isnan(parsed)
+
+
+EXPORT_FORMATS = ("json", "csv")
+
+
+def detect_format(file_path: str, probe_bytes: int = 4096) -> str:
+    """
+    Tells a JSON export from a CSV one by its first non-blank character.
+
+    Returns:
+        str: 'json' (starts with '[' or '{') or 'csv' (a header line with commas).
+
+    Raises:
+        ValueError: If the file looks like neither.
+    """
+    with open(file_path, "rb") as f:
+        head = f.read(probe_bytes)
+    head = head.removeprefix(b"\xef\xbb\xbf").lstrip()
+    if head[:1] in (b"[", b"{"):
+        return "json"
+    if b"," in head.split(b"\n", 1)[0]:
+        return "csv"
+    raise ValueError(f"{file_path}: not a JSON or CSV export")
+
+
+def iter_json_array(
+    file_path: str,
+    chunk_size: int = 1 << 20,
+    start_offset: Optional[int] = None,
+    splits: Optional[StageSplits] = None
+) -> Iterator[dict]:
+    """
+    Yields the elements of a top-level JSON array one at a time.
+
+    Only ``chunk_size`` characters, and the elements decoded from them, are held in
+    memory, so large exports never have to be materialised as a full JSON tree.
+
+    Args:
+        file_path (str): Path to a file holding one JSON array.
+        chunk_size (int): Characters read per chunk.
+        start_offset (int, optional): Byte offset of an element inside the array to
+            resume from (e.g. from ``find_tail_offset``); the opening '[' is then skipped.
+        splits (StageSplits, optional): Receives the time spent in 'file read' and
+            'json decode' (and the decoded element count), see ``split_stages``.
+
+    Raises:
+        ValueError: If the file is not a JSON array or is malformed.
+    """
+    decoder = json.JSONDecoder()
+    timed = splits.time if splits is not None else (lambda name: nullcontext())
+    with open(file_path, 'rb') as raw:
+        if start_offset:
+            raw.seek(start_offset)
+        f = io.TextIOWrapper(raw, encoding='utf-8')
+        with timed("file read"):
+            buffer = f.read(chunk_size)
+        pos = 0
+        eof = not buffer
+
+        def skip(chars: str) -> None:
+            nonlocal pos
+            while pos < len(buffer) and buffer[pos] in chars:
+                pos += 1
+
+        skip(" \t\r\n")
+        if not start_offset:
+            if pos >= len(buffer) or buffer[pos] != '[':
+                raise ValueError(f"{file_path} does not contain a JSON array")
+            pos += 1
+
+        while True:
+            # Every element complete in the buffer is decoded in one go, so the timing
+            # (and its overhead) is per chunk rather than per element
+            items, closed = [], False
+            with timed("json decode"):
+                while True:
+                    skip(" \t\r\n,")
+                    if pos < len(buffer) and buffer[pos] == ']':
+                        closed = True
+                        break
+                    try:
+                        item, pos = decoder.raw_decode(buffer, pos)
+                    except json.JSONDecodeError:
+                        # The next element straddles the chunk boundary (or is malformed)
+                        break
+                    items.append(item)
+            if splits is not None:
+                splits.add_rows("json decode", len(items))
+            yield from items
+            if closed:
+                return
+            if eof:
+                raise ValueError(f"Malformed JSON array in {file_path}")
+            with timed("file read"):
+                more = f.read(chunk_size)
+            eof = not more
+            buffer = buffer[pos:] + more
+            pos = 0
+
+
+def _probe_id(f, offset: int, pattern: re.Pattern, probe_bytes: int = 1 << 16) -> Optional[Tuple[int, int]]:
+    """Finds the first '"<id_key>": "<n>"' at or after ``offset``; returns (byte position, n)."""
+    pos = max(offset, 0)
+    while True:
+        f.seek(pos)
+        block = f.read(probe_bytes)
+        if not block:
+            return None
+        match = pattern.search(block)
+        if match:
+            return pos + match.start(), int(match.group(1))
+        if len(block) < probe_bytes:
+            return None
+        # Overlap blocks a little so a match straddling the boundary is not split
+        pos += probe_bytes - 64
+
+
+def _object_start(f, key_pos: int) -> Optional[int]:
+    """Returns the position of the '{' that directly precedes a key, if only whitespace separates them."""
+    start = max(key_pos - 256, 0)
+    f.seek(start)
+    before = f.read(key_pos - start).rstrip()
+    if before.endswith(b'{'):
+        return start + len(before) - 1
+    return None
+
+
+def find_tail_offset(file_path: str, id_key: str, high_water: int, linear_bytes: int = 1 << 16) -> Optional[int]:
+    """
+    Byte offset of the first array element whose ``id_key`` exceeds ``high_water``.
+
+    Assumes the export is ordered by a numeric string id that is the first key of every
+    element (as the database exports are), so a byte-level binary search finds the new
+    tail without parsing the overlap. Quoted key patterns can't be confused with text
+    inside embedded JSON strings, where quotes are escaped.
+
+    Returns:
+        int | None: Offset to pass to ``iter_json_array(start_offset=...)``, ``None`` if
+            nothing is newer, or ``-1`` if the layout isn't as expected (caller should
+            fall back to a full scan).
+    """
+    pattern = re.compile(rb'"' + re.escape(id_key.encode()) + rb'"\s*:\s*"?(\d+)')
+    size = os.path.getsize(file_path)
+    with open(file_path, 'rb') as f:
+        lo, hi = 0, size
+        while hi - lo > linear_bytes:
+            mid = (lo + hi) // 2
+            probe = _probe_id(f, mid, pattern)
+            if probe is None or probe[1] > high_water:
+                hi = mid if probe is None else min(hi, probe[0] + 1)
+            else:
+                lo = mid
+
+        pos = lo
+        while True:
+            probe = _probe_id(f, pos, pattern)
+            if probe is None:
+                return None
+            key_pos, value = probe
+            if value > high_water:
+                start = _object_start(f, key_pos)
+                return start if start is not None else -1
+            pos = key_pos + 1
+
+
+def scan_id_fields(
+    file_path: str,
+    id_key: str,
+    field_keys: Sequence[str],
+    end_offset: Optional[int] = None,
+    chunk_size: int = 1 << 20
+) -> List[Tuple[int, int, Tuple[str, ...]]]:
+    """
+    Lists the id and some string fields (e.g. UpdatedAt) of every element before ``end_offset``.
+
+    A regex pass over the raw bytes, without decoding the elements, so the part of an
+    export that ``find_tail_offset`` skipped can still be checked for changed records.
+    Same layout assumptions as ``find_tail_offset``.
+
+    Returns:
+        list: (byte position of the id key, id, field values in ``field_keys`` order) per
+            element that has all the keys.
+    """
+    keys = [id_key, *field_keys]
+    pattern = re.compile(
+        rb'"(' + b'|'.join(re.escape(k.encode()) for k in keys) + rb')"\s*:\s*'
+        rb'(?:"([^"\\]*)"|(\d+))'
+    )
+    # Longest match that can straddle a chunk boundary
+    overlap = 256
+    found: List[Tuple[int, int, Tuple[str, ...]]] = []
+    current: Optional[Tuple[int, int]] = None
+    fields: dict = {}
+    with open(file_path, 'rb') as f:
+        base, buffer = 0, b""
+        while True:
+            want = chunk_size if end_offset is None else min(chunk_size, end_offset - base - len(buffer))
+            data = f.read(want) if want > 0 else b""
+            at_end = not data
+            buffer += data
+            limit = len(buffer) if at_end else max(len(buffer) - overlap, 0)
+            consumed = 0
+            for match in pattern.finditer(buffer):
+                if match.start() >= limit:
+                    break
+                consumed = match.end()
+                key, value = match.group(1).decode(), (match.group(2) or match.group(3) or b"").decode()
+                if key == id_key:
+                    current = (base + match.start(), int(value)) if value.isdigit() else None
+                    fields = {}
+                elif current is not None:
+                    fields[key] = value
+                    if len(fields) == len(field_keys):
+                        found.append((current[0], current[1], tuple(fields[k] for k in field_keys)))
+                        current = None
+            keep_from = max(consumed, limit)
+            base += keep_from
+            buffer = buffer[keep_from:]
+            if at_end:
+                return found
+
+
+def element_at(file_path: str, key_pos: int) -> Optional[dict]:
+    """Decodes the array element whose first key is at ``key_pos`` (None if the layout is unexpected)."""
+    with open(file_path, 'rb') as f:
+        start = _object_start(f, key_pos)
+    if start is None:
+        return None
+    return next(iter_json_array(file_path, chunk_size=1 << 16, start_offset=start), None)
@@ -0,0 +1,254 @@
+import argparse
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import date, datetime, timezone
+from typing import Dict, List, Optional
+
+from adjustTimeZone import apply_nz_time_conversion
+from calibration import fit_calibration
+from calibration_curves import CURVES_FILE, DeviceCurveHistory, TwoFactorCurve, load_curve_histories, save_curve_histories
+from clear_sky import classify_days
+from data_functions import create_data_by_date
+from datasets import UviDataset
+from jsonImporting import load_uvi_by_device, read_niwa_by_location
+from niwa_decoder import build_niwa_datasets
+
+DEFAULT_FLEET_FILE = "fleet.json"
+
+
+def load_fleet_mapping(path: str) -> List[Dict]:
+    """
+    Reads the device -> forecast location mapping.
+
+    The file is a JSON list (or ``{"devices": [...]}``) of entries like::
+
+        {"device_id": 4, "location_id": 4,
+         "uvi_path": "data/uvi_export.json", "niwa_path": "data/niwa_export.json"}
+
+    Exports may hold several devices/locations; rows are filtered by the ids.
+    Relative paths are resolved against the mapping file's folder.
+
+    Raises:
+        ValueError: If an entry is missing a required key, or a device is listed twice.
+    """
+    with open(path, "r") as f:
+        mapping = json.load(f)
+    entries = mapping.get("devices", []) if isinstance(mapping, dict) else mapping
+
+    base_dir = os.path.dirname(os.path.abspath(path))
+    devices = []
+    for entry in entries:
+        missing = {"device_id", "location_id", "uvi_path", "niwa_path"} - set(entry)
+        if missing:
+            raise ValueError(f"Fleet entry {entry} is missing {sorted(missing)}")
+        devices.append({
+            **entry,
+            "uvi_path": os.path.join(base_dir, entry["uvi_path"]),
+            "niwa_path": os.path.join(base_dir, entry["niwa_path"]),
+        })
+    check_unique_devices(devices)
+    return devices
+
+
+def check_unique_devices(devices: List[Dict]) -> None:
+    """
+    Rejects a fleet that lists a device more than once.
+
+    Results are keyed by device id, so a second entry would silently replace the first.
+
+    Raises:
+        ValueError: Naming each repeated device id.
+    """
+    seen, repeated = set(), []
+    for device in devices:
+        device_id = str(device["device_id"])
+        if device_id in seen and device_id not in repeated:
+            repeated.append(device_id)
+        seen.add(device_id)
+    if repeated:
+        raise ValueError(f"Fleet lists device(s) {', '.join(repeated)} more than once")
+
+
+def load_device_exports(devices: List[Dict]) -> List[Dict]:
+    """
+    Reads each distinct export once and splits it by DeviceId / GeoLocationId.
+
+    Many devices usually share one export, so this costs one pass per file rather than
+    one per device. Used for in-process runs; pool workers load their own device.
+
+    Returns:
+        list: Copies of the entries with ``uvi_5min`` and ``forecasts`` (blobs, UpdatedAt)
+            filled in, or with ``load_error`` set when one of their exports couldn't be read.
+    """
+    device_ids: Dict[str, set] = {}
+    location_ids: Dict[str, set] = {}
+    for device in devices:
+        device_ids.setdefault(device["uvi_path"], set()).add(str(device["device_id"]))
+        location_ids.setdefault(device["niwa_path"], set()).add(str(device["location_id"]))
+
+    uvi_by_path, niwa_by_path, errors = {}, {}, {}
+    for path, ids in device_ids.items():
+        try:
+            uvi_by_path[path] = load_uvi_by_device(path, ids)
+        except Exception as e:
+            errors[path] = f"Failed to load UVI file {path}: {e}"
+    for path, ids in location_ids.items():
+        try:
+            niwa_by_path[path] = read_niwa_by_location(path, ids)
+        except Exception as e:
+            errors[path] = f"Failed to load NIWA file {path}: {e}"
+
+    loaded = []
+    for device in devices:
+        entry = dict(device)
+        error = errors.get(device["uvi_path"]) or errors.get(device["niwa_path"])
+        if error:
+            entry["load_error"] = error
+        else:
+            entry["uvi_5min"] = uvi_by_path[device["uvi_path"]].get(str(device["device_id"]), UviDataset.empty())
+            entry["forecasts"] = niwa_by_path[device["niwa_path"]].get(str(device["location_id"]), ([], []))
+        loaded.append(entry)
+    return loaded
+
+
+def calibrate_device(
+    device: Dict,
+    start_date: Optional[date] = None,
+    end_date: Optional[date] = None,
+    method: str = "lstsq",
+    align_method: str = "nearest",
+    clear_days_only: bool = False
+) -> Dict:
+    """
+    Runs decode -> NZ time -> date index -> align -> fit for one device.
+
+    Takes an entry from ``load_device_exports``, or a plain mapping entry, whose rows are
+    then read from its export paths (as pool workers do, so only paths are pickled).
+    Runs inside a pool worker, so it returns a plain settings row and never raises;
+    failures are reported in the row's ``error`` field.
+    """
+    if "uvi_5min" not in device and "load_error" not in device:
+        device = load_device_exports([device])[0]
+    row = {"device_id": device["device_id"], "location_id": device["location_id"]}
+    if "load_error" in device:
+        row["error"] = device["load_error"]
+        return row
+    uvi_5min = device["uvi_5min"]
+    forecast_blobs, updated_at = device["forecasts"]
+    if len(uvi_5min) == 0:
+        row["error"] = f"No readings for device {device['device_id']} in {device['uvi_path']}"
+        return row
+    if not forecast_blobs:
+        row["error"] = f"No forecasts for location {device['location_id']} in {device['niwa_path']}"
+        return row
+    try:
+        niwa_clear, niwa_cloudy = build_niwa_datasets(forecast_blobs, updated_at, max_workers=1)
+        apply_nz_time_conversion(niwa_clear, niwa_cloudy, uvi_5min)
+        niwa_clear, niwa_cloudy, uvi_5min = create_data_by_date(niwa_clear, niwa_cloudy, uvi_5min)
+        dates = classify_days(niwa_clear, niwa_cloudy, uvi_5min).clear_dates() if clear_days_only else None
+        # Each device already has its own process, so the fit itself stays single-process
+        result = fit_calibration(
+            uvi_5min, niwa_clear, start_date, end_date, method=method, workers=1, align_method=align_method,
+            dates=dates
+        )
+    except Exception as e:
+        row["error"] = str(e)
+        return row
+
+    row.update({
+        # First date the fit covers, so the curve version applies to the data it was fitted on
+        "fitted_from": (start_date or uvi_5min.dates[0]).isoformat(),
+        "uvi_scale": result.uvi_scale,
+        "uvi_scale_upper": result.uvi_scale_upper,
+        "rmse": result.rmse,
+        "n_pairs": result.n_pairs,
+        "fitted_at": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+    })
+    return row
+
+
+def calibrate_fleet(
+    devices: List[Dict],
+    start_date: Optional[date] = None,
+    end_date: Optional[date] = None,
+    method: str = "lstsq",
+    align_method: str = "nearest",
+    workers: Optional[int] = None,
+    clear_days_only: bool = False
+) -> Dict[str, Dict]:
+    """
+    Calibrates every device in parallel, one device per pool task.
+
+    Each worker reads its own device's rows from the exports, so the parent neither
+    loads the exports nor pickles datasets to the pool. In-process runs read each
+    export once for every device (see ``load_device_exports``).
+
+    Args:
+        devices (list): Entries from ``load_fleet_mapping`` (each device once).
+        workers (int, optional): Process pool size (default: all cores, 1 = in-process).
+        clear_days_only (bool): Fit each device on its clear-sky days only (see clear_sky).
+
+    Returns:
+        dict: Settings rows keyed by device id (as a string).
+
+    Raises:
+        ValueError: If a device is listed more than once.
+    """
+    check_unique_devices(devices)
+    n_workers = workers if workers is not None else (os.cpu_count() or 1)
+    if n_workers <= 1 or len(devices) <= 1:
+        devices = load_device_exports(devices)
+        rows = [calibrate_device(d, start_date, end_date, method, align_method, clear_days_only) for d in devices]
+    else:
+        with ProcessPoolExecutor(max_workers=min(n_workers, len(devices))) as pool:
+            futures = [
+                pool.submit(calibrate_device, d, start_date, end_date, method, align_method, clear_days_only)
+                for d in devices
+            ]
+            rows = [future.result() for future in as_completed(futures)]
+    return {str(row["device_id"]): row for row in rows}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Calibrate every device in a fleet mapping in parallel")
+    parser.add_argument("mapping", nargs="?", default=DEFAULT_FLEET_FILE, help="Device -> location mapping (JSON)")
+    parser.add_argument("--out", default=None, help="Per-device settings table (default: fleet_settings.json)")
+    parser.add_argument("--curves", default=CURVES_FILE, help="Per-device curve history to add the fits to")
+    parser.add_argument("--start", type=date.fromisoformat, default=None, help="First date (YYYY-MM-DD)")
+    parser.add_argument("--end", type=date.fromisoformat, default=None, help="Last date (YYYY-MM-DD)")
+    parser.add_argument("--method", choices=["lstsq", "grid"], default="lstsq")
+    parser.add_argument("--align", choices=["nearest", "mean", "interp"], default="nearest")
+    parser.add_argument("--workers", type=int, default=None, help="Processes (default: all cores)")
+    parser.add_argument("--clear-days", action="store_true", help="Only fit on days screened as clear sky")
+    args = parser.parse_args()
+
+    from persist_settings import DEVICE_SETTINGS_FILE, save_device_settings
+
+    devices = load_fleet_mapping(args.mapping)
+    table = calibrate_fleet(devices, args.start, args.end, args.method, args.align, args.workers, args.clear_days)
+    for device_id in sorted(table, key=lambda d: (len(d), d)):
+        row = table[device_id]
+        if "error" in row:
+            print(f"device {device_id}: FAILED ({row['error']})")
+        else:
+            print(f"device {device_id}: uvi_scale={row['uvi_scale']:.4f} "
+                  f"uvi_scale_upper={row['uvi_scale_upper']:.4f} rmse={row['rmse']:.4f} pairs={row['n_pairs']}")
+
+    fitted = {d: row for d, row in table.items() if "error" not in row}
+    out_path = args.out or DEVICE_SETTINGS_FILE
+    save_device_settings(fitted, out_path)
+    print(f"Saved {out_path}")
+
+    # Each fit also becomes a curve version, effective from the start of the range it was
+    # fitted on, so rescaled history uses it for that data onwards
+    histories = load_curve_histories(args.curves)
+    for device_id, row in fitted.items():
+        histories.setdefault(device_id, DeviceCurveHistory()).add(
+            date.fromisoformat(row["fitted_from"]), TwoFactorCurve(row["uvi_scale"], row["uvi_scale_upper"]), note=f"fleet fit, rmse {row['rmse']:.4f}"
+        )
+    save_curve_histories(histories, args.curves)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,442 @@
+import argparse
+import glob
+import json
+import os
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from adjustTimeZone import apply_nz_time_conversion
+from data_functions import create_data_by_date
+from datasets import NiwaDataset, UviDataset
+from fast_parsing import (
+    detect_format, element_at, find_tail_offset, iter_json_array, parse_fixed_width_timestamps, parse_float_strings,
+    scan_id_fields
+)
+from instrumentation import split_stages, stage
+from niwa_decoder import DecodedForecasts, decode_forecasts, niwa_datasets_from_decoded, parse_updated_at
+
+DEFAULT_STORE_DIR = "data/.uvi_store"
+MANIFEST_FILE = "manifest.json"
+# Version 1 stores mixed every device and location together
+STORE_FORMAT_VERSION = 2
+INGEST_BATCH_ROWS = 100_000
+# Device and forecast location the store holds, as in the SQL statements in data/
+DEFAULT_DEVICE_ID = 4
+DEFAULT_LOCATION_ID = 4
+
+# Every array kept in the store, with its dtype
+_UVI_ARRAYS = {"uvi_data_id": np.int64, "uvi_epoch": np.int64, "uvi_value": np.float32}
+_NIWA_RECORD_ARRAYS = {"niwa_forecast_id": np.int64, "niwa_updated_at": np.int64, "niwa_first_clear": np.int64}
+_NIWA_VALUE_ARRAYS = {"niwa_value_forecast_id": np.int64, "niwa_product": np.int8,
+                      "niwa_epoch": np.int64, "niwa_uvi": np.float64}
+
+
+class IngestStore:
+    """
+    Consolidated local store of every UVI reading and NIWA forecast seen so far for one
+    device and forecast location.
+
+    Exports may hold several devices and locations; rows for others are dropped on ingest,
+    so the ``DataId`` / ``ForecastId`` high-water marks are this device's and location's own.
+    UVI rows are deduplicated by ``DataId`` and forecasts by ``ForecastId`` (a newer
+    ``UpdatedAt`` replaces an older copy). Each export that is ingested only has its new
+    tail parsed: a byte-level binary search skips past the ids already stored. For NIWA
+    exports the skipped part is still scanned (without decoding) for forecasts that were
+    re-exported with a newer UpdatedAt.
+    Forecasts are stored decoded, so the per-record cutoffs can be re-applied cheaply
+    whenever later forecasts arrive.
+    """
+
+    def __init__(
+        self,
+        store_dir: str = DEFAULT_STORE_DIR,
+        device_id: int = DEFAULT_DEVICE_ID,
+        location_id: int = DEFAULT_LOCATION_ID,
+        load_arrays: bool = True
+    ):
+        self.store_dir = store_dir
+        self.device_id = device_id
+        self.location_id = location_id
+        self.arrays: Dict[str, np.ndarray] = {
+            name: np.empty(0, dtype=dtype)
+            for name, dtype in {**_UVI_ARRAYS, **_NIWA_RECORD_ARRAYS, **_NIWA_VALUE_ARRAYS}.items()
+        }
+        self.manifest: Dict = {
+            "version": STORE_FORMAT_VERSION, "device_id": str(device_id), "location_id": str(location_id), "files": {}
+        }
+        self._load_manifest()
+        if load_arrays:
+            self.load_arrays()
+
+    @property
+    def manifest_path(self) -> str:
+        return os.path.join(self.store_dir, MANIFEST_FILE)
+
+    def _load_manifest(self) -> None:
+        if not os.path.isfile(self.manifest_path):
+            return
+        with open(self.manifest_path, 'r') as f:
+            manifest = json.load(f)
+        if manifest.get("version") != STORE_FORMAT_VERSION:
+            print(f"Ignoring store in {self.store_dir} with old format version")
+            return
+        if (manifest["device_id"], manifest["location_id"]) != (str(self.device_id), str(self.location_id)):
+            print(f"Ignoring store in {self.store_dir} for device {manifest['device_id']}, "
+                  f"location {manifest['location_id']}")
+            return
+        self.manifest = manifest
+
+    def load_arrays(self) -> None:
+        """Reads the stored arrays (skipped by ``load_arrays=False`` for manifest-only checks)."""
+        if not self.manifest["files"]:
+            return
+        for name in self.arrays:
+            path = os.path.join(self.store_dir, f"{name}.npy")
+            if os.path.isfile(path):
+                self.arrays[name] = np.load(path)
+
+    def save(self) -> None:
+        """Writes every array, then the manifest, each via a temp file and rename."""
+        os.makedirs(self.store_dir, exist_ok=True)
+        for name, array in self.arrays.items():
+            tmp = os.path.join(self.store_dir, f".{name}.tmp.npy")
+            np.save(tmp, array)
+            os.replace(tmp, os.path.join(self.store_dir, f"{name}.npy"))
+        tmp = self.manifest_path + ".tmp"
+        with open(tmp, 'w') as f:
+            json.dump(self.manifest, f, indent=1)
+        os.replace(tmp, self.manifest_path)
+
+    @property
+    def uvi_high_water(self) -> int:
+        ids = self.arrays["uvi_data_id"]
+        return int(ids[-1]) if len(ids) else -1
+
+    @property
+    def niwa_high_water(self) -> int:
+        ids = self.arrays["niwa_forecast_id"]
+        return int(ids[-1]) if len(ids) else -1
+
+    def already_ingested(self, path: str) -> bool:
+        stat = os.stat(path)
+        seen = self.manifest["files"].get(os.path.abspath(path))
+        return seen is not None and seen["size"] == stat.st_size and seen["mtime_ns"] == stat.st_mtime_ns
+
+    def _mark_ingested(self, path: str, kind: str, rows: int) -> None:
+        stat = os.stat(path)
+        self.manifest["files"][os.path.abspath(path)] = {
+            "kind": kind, "size": stat.st_size, "mtime_ns": stat.st_mtime_ns, "new_rows": rows,
+        }
+
+    def _tail(self, path: str, id_key: str, high_water: int, full_rescan: bool) -> Optional[int]:
+        """Offset to start parsing from: 0 for everything, None when nothing is new."""
+        if full_rescan or high_water < 0:
+            return 0
+        offset = find_tail_offset(path, id_key, high_water)
+        if offset == -1:
+            print(f"{path}: unexpected layout, scanning the whole file")
+            return 0
+        return offset
+
+    def ingest_uvi(self, path: str, full_rescan: bool = False) -> int:
+        """
+        Adds the readings in a UVI export that aren't in the store yet.
+
+        Returns:
+            int: Number of new rows.
+        """
+        if not full_rescan and self.already_ingested(path):
+            return 0
+        new_ids, new_epoch, new_value = [], [], []
+        if detect_format(path) == "csv":
+            from csvImporting import iter_uvi_csv_rows
+
+            for chunk in iter_uvi_csv_rows(path, INGEST_BATCH_ROWS, self.device_id):
+                self._append_uvi_columns(
+                    chunk["DataId"].to_numpy(), chunk["Timestamp"].to_numpy(), chunk["Value"].to_numpy(),
+                    new_ids, new_epoch, new_value, min_id=-1 if full_rescan else self.uvi_high_water
+                )
+            added = self._merge_uvi(new_ids, new_epoch, new_value)
+            self._mark_ingested(path, "uvi", added)
+            return added
+
+        offset = self._tail(path, "DataId", self.uvi_high_water, full_rescan)
+        if offset is not None:
+            device = str(self.device_id)
+            batch: List[Tuple[str, str, str]] = []
+            with split_stages("file read", "json decode") as splits:
+                for item in iter_json_array(path, start_offset=offset, splits=splits):
+                    if str(item.get("DeviceId")) != device:
+                        continue
+                    if item.get("DataId") is None or not item.get("Timestamp") or item.get("Value") is None:
+                        continue
+                    batch.append((item["DataId"], item["Timestamp"], item["Value"]))
+                    if len(batch) >= INGEST_BATCH_ROWS:
+                        self._append_uvi_batch(batch, new_ids, new_epoch, new_value)
+                        batch = []
+            self._append_uvi_batch(batch, new_ids, new_epoch, new_value)
+
+        added = self._merge_uvi(new_ids, new_epoch, new_value)
+        self._mark_ingested(path, "uvi", added)
+        return added
+
+    @classmethod
+    def _append_uvi_batch(cls, batch, new_ids, new_epoch, new_value) -> None:
+        if not batch:
+            return
+        ids, timestamps, values = zip(*batch)
+        cls._append_uvi_columns(ids, timestamps, values, new_ids, new_epoch, new_value)
+
+    @staticmethod
+    def _append_uvi_columns(ids, timestamps, values, new_ids, new_epoch, new_value, min_id: int = -1) -> None:
+        """Bulk parses raw DataId/Timestamp/Value columns, keeping ids above ``min_id``."""
+        ids_parsed, ids_valid = parse_float_strings(ids)
+        if min_id >= 0:
+            # CSV exports can't be binary searched, so the old rows are dropped here
+            tail = ids_valid & (ids_parsed > min_id)
+            ids_parsed, ids_valid = ids_parsed[tail], ids_valid[tail]
+            timestamps, values = np.asarray(timestamps)[tail], np.asarray(values)[tail]
+        if len(ids_parsed) == 0:
+            return
+        epoch, ts_valid = parse_fixed_width_timestamps(timestamps)
+        uvi, value_valid = parse_float_strings(values)
+        valid = ids_valid & ts_valid & value_valid
+        new_ids.append(ids_parsed[valid].astype(np.int64))
+        # Truncate to the minute like the JSON loader
+        new_epoch.append(epoch[valid] - epoch[valid] % 60)
+        new_value.append(uvi[valid].astype(np.float32))
+
+    def _merge_uvi(self, new_ids, new_epoch, new_value) -> int:
+        if not new_ids:
+            return 0
+        ids = np.concatenate(new_ids)
+        epoch = np.concatenate(new_epoch)
+        value = np.concatenate(new_value)
+        # Drop ids already stored and duplicates within the new rows
+        ids, first = np.unique(ids, return_index=True)
+        epoch, value = epoch[first], value[first]
+        fresh = ~np.isin(ids, self.arrays["uvi_data_id"], assume_unique=True)
+        if not fresh.any():
+            return 0
+
+        all_ids = np.concatenate([self.arrays["uvi_data_id"], ids[fresh]])
+        order = np.argsort(all_ids, kind="stable")
+        self.arrays["uvi_data_id"] = all_ids[order]
+        self.arrays["uvi_epoch"] = np.concatenate([self.arrays["uvi_epoch"], epoch[fresh]])[order]
+        self.arrays["uvi_value"] = np.concatenate([self.arrays["uvi_value"], value[fresh]])[order]
+        return int(fresh.sum())
+
+    def ingest_niwa(self, path: str, full_rescan: bool = False) -> int:
+        """
+        Adds the forecasts in a NIWA export that are new (or have a newer UpdatedAt).
+
+        Only forecasts that are new or newer than the stored copy are decoded. In JSON
+        exports, the records before the new tail are matched by a byte scan of their
+        ForecastId and UpdatedAt, and only changed ones are parsed.
+
+        Returns:
+            int: Number of forecasts added or replaced.
+        """
+        if not full_rescan and self.already_ingested(path):
+            return 0
+        forecast_ids, updated_at, blobs = [], [], []
+        if detect_format(path) == "csv":
+            from csvImporting import read_niwa_csv
+
+            # CSV can't be searched by byte offset; _merge_niwa drops unchanged forecasts
+            csv_ids, csv_blobs, csv_updated_at = read_niwa_csv(path, location_id=self.location_id)
+            for forecast_id, blob, updated in zip(csv_ids, csv_blobs, csv_updated_at):
+                if forecast_id:
+                    forecast_ids.append(int(forecast_id))
+                    updated_at.append(updated)
+                    blobs.append(blob)
+            offset = None
+        else:
+            offset = self._tail(path, "ForecastId", self.niwa_high_water, full_rescan)
+            if offset != 0:
+                self._append_updated_forecasts(path, offset, forecast_ids, updated_at, blobs)
+        if offset is not None:
+            location = str(self.location_id)
+            with split_stages("file read", "json decode") as splits:
+                for record in iter_json_array(path, start_offset=offset, splits=splits):
+                    if record.get("ForecastId") is None or str(record.get("GeoLocationId")) != location:
+                        continue
+                    forecast_ids.append(int(record["ForecastId"]))
+                    updated_at.append(record.get("UpdatedAt"))
+                    blobs.append(record.get("ForecastData"))
+
+        changed = self._merge_niwa(forecast_ids, updated_at, blobs)
+        self._mark_ingested(path, "niwa", changed)
+        return changed
+
+    def _append_updated_forecasts(self, path: str, end_offset: Optional[int], forecast_ids, updated_at, blobs) -> None:
+        """Appends this location's records before ``end_offset`` that are missing or newer than the stored copy."""
+        location = str(self.location_id)
+        scanned = [
+            (key_pos, forecast_id, updated)
+            for key_pos, forecast_id, (record_location, updated) in scan_id_fields(
+                path, "ForecastId", ("GeoLocationId", "UpdatedAt"), end_offset
+            )
+            if record_location == location
+        ]
+        if not scanned:
+            return
+        key_pos, ids, stamps = zip(*scanned)
+        ids = np.array(ids, dtype=np.int64)
+        updated = parse_updated_at(list(stamps))
+        stored_ids = self.arrays["niwa_forecast_id"]
+        changed = np.ones(len(ids), dtype=bool)
+        if len(stored_ids):
+            pos = np.clip(np.searchsorted(stored_ids, ids), 0, len(stored_ids) - 1)
+            changed = (stored_ids[pos] != ids) | (updated > self.arrays["niwa_updated_at"][pos])
+        for i in np.flatnonzero(changed):
+            record = element_at(path, key_pos[i])
+            if record is None or record.get("ForecastId") is None:
+                continue
+            forecast_ids.append(int(record["ForecastId"]))
+            updated_at.append(record.get("UpdatedAt"))
+            blobs.append(record.get("ForecastData"))
+
+    def _merge_niwa(self, forecast_ids, updated_at, blobs) -> int:
+        if not forecast_ids:
+            return 0
+        ids = np.array(forecast_ids, dtype=np.int64)
+        updated = parse_updated_at(updated_at)
+
+        # Keep the newest copy of each forecast, and only if it beats the stored one
+        stored_ids = self.arrays["niwa_forecast_id"]
+        stored_updated = self.arrays["niwa_updated_at"]
+        order = np.lexsort((-updated, ids))
+        ids, updated = ids[order], updated[order]
+        first = np.concatenate([[True], ids[1:] != ids[:-1]])
+        keep_rows = order[first]
+        ids, updated = ids[first], updated[first]
+        newer = np.ones(len(ids), dtype=bool)
+        if len(stored_ids):
+            pos = np.clip(np.searchsorted(stored_ids, ids), 0, len(stored_ids) - 1)
+            exists = stored_ids[pos] == ids
+            newer = ~exists | (updated > stored_updated[pos])
+        if not newer.any():
+            return 0
+        keep_rows, ids, updated = keep_rows[newer], ids[newer], updated[newer]
+
+        decoded = decode_forecasts([blobs[i] for i in keep_rows])
+
+        # Remove replaced forecasts, then append and re-sort by ForecastId
+        replaced = np.isin(stored_ids, ids)
+        old_values = ~np.isin(self.arrays["niwa_value_forecast_id"], ids)
+        record_ids = np.concatenate([stored_ids[~replaced], ids])
+        record_order = np.argsort(record_ids, kind="stable")
+        self.arrays["niwa_forecast_id"] = record_ids[record_order]
+        self.arrays["niwa_updated_at"] = np.concatenate([stored_updated[~replaced], updated])[record_order]
+        self.arrays["niwa_first_clear"] = np.concatenate(
+            [self.arrays["niwa_first_clear"][~replaced], decoded.first_clear_epoch]
+        )[record_order]
+
+        for name, new in (
+            ("niwa_value_forecast_id", ids[decoded.record]),
+            ("niwa_product", decoded.product),
+            ("niwa_epoch", decoded.epoch),
+            ("niwa_uvi", decoded.uvi),
+        ):
+            self.arrays[name] = np.concatenate([self.arrays[name][old_values], new])
+        value_order = np.argsort(self.arrays["niwa_value_forecast_id"], kind="stable")
+        for name in _NIWA_VALUE_ARRAYS:
+            self.arrays[name] = self.arrays[name][value_order]
+        return int(len(ids))
+
+    def datasets(self) -> Tuple[UviDataset, NiwaDataset, NiwaDataset]:
+        """
+        Builds date-indexed NZ-time datasets from the consolidated store.
+
+        Returns:
+            tuple: (uvi_5min, niwa_clear_sky_hourly, niwa_cloudy_sky_hourly)
+        """
+        uvi_5min = UviDataset(self.arrays["uvi_epoch"], self.arrays["uvi_value"])
+        record_ids = self.arrays["niwa_forecast_id"]
+        decoded = DecodedForecasts(
+            np.searchsorted(record_ids, self.arrays["niwa_value_forecast_id"]),
+            self.arrays["niwa_product"],
+            self.arrays["niwa_epoch"],
+            self.arrays["niwa_uvi"],
+            self.arrays["niwa_first_clear"],
+        )
+        with stage("forecast cutoffs", rows=len(decoded.epoch)):
+            niwa_clear, niwa_cloudy = niwa_datasets_from_decoded(decoded, self.arrays["niwa_updated_at"])
+        apply_nz_time_conversion(niwa_clear, niwa_cloudy, uvi_5min)
+        niwa_clear, niwa_cloudy, uvi_5min = create_data_by_date(niwa_clear, niwa_cloudy, uvi_5min)
+        return uvi_5min, niwa_clear, niwa_cloudy
+
+
+def find_exports(data_dir: str) -> Tuple[List[str], List[str]]:
+    """
+    Lists the UVI and NIWA exports (JSON or CSV) in a directory, oldest first by modification time.
+    """
+    uvi_files, niwa_files = [], []
+    paths = glob.glob(os.path.join(data_dir, "*.json")) + glob.glob(os.path.join(data_dir, "*.csv"))
+    for path in sorted(paths, key=os.path.getmtime):
+        name = os.path.basename(path).lower()
+        if "niwa" in name:
+            niwa_files.append(path)
+        elif "uvi" in name:
+            uvi_files.append(path)
+    return uvi_files, niwa_files
+
+
+def refresh_store(
+    data_dir: str = "data",
+    store_dir: str = DEFAULT_STORE_DIR,
+    full_rescan: bool = False,
+    device_id: int = DEFAULT_DEVICE_ID,
+    location_id: int = DEFAULT_LOCATION_ID
+) -> IngestStore:
+    """
+    Ingests any new or changed exports in ``data_dir`` into the store and saves it.
+
+    Unchanged files are skipped after a stat, and changed ones cost time proportional
+    to the rows they add. Only ``device_id``'s readings and ``location_id``'s forecasts
+    are kept.
+    """
+    # Only the manifest is needed to see whether anything changed
+    store = IngestStore(store_dir, device_id, location_id, load_arrays=False)
+    uvi_files, niwa_files = find_exports(data_dir)
+    pending_uvi = [p for p in uvi_files if full_rescan or not store.already_ingested(p)]
+    pending_niwa = [p for p in niwa_files if full_rescan or not store.already_ingested(p)]
+    if not pending_uvi and not pending_niwa:
+        return store
+
+    with stage("ingest") as timing:
+        store.load_arrays()
+        timing.rows = 0
+        for path in pending_uvi:
+            added = store.ingest_uvi(path, full_rescan)
+            timing.rows += added
+            print(f"Ingested {added} new UVI rows from {path}")
+        for path in pending_niwa:
+            added = store.ingest_niwa(path, full_rescan)
+            timing.rows += added
+            print(f"Ingested {added} new/updated forecasts from {path}")
+        store.save()
+    return store
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Consolidate UVI/NIWA exports into the local store")
+    parser.add_argument("--data-dir", default="data")
+    parser.add_argument("--store-dir", default=DEFAULT_STORE_DIR)
+    parser.add_argument("--device-id", type=int, default=DEFAULT_DEVICE_ID, help="DeviceId of the readings to keep")
+    parser.add_argument("--location-id", type=int, default=DEFAULT_LOCATION_ID,
+                        help="GeoLocationId of the forecasts to keep")
+    parser.add_argument("--full-rescan", action="store_true",
+                        help="Parse every file completely (picks up edits to already stored rows)")
+    args = parser.parse_args()
+
+    store = refresh_store(args.data_dir, args.store_dir, args.full_rescan, args.device_id, args.location_id)
+    store.load_arrays()
+    print(f"Store has {len(store.arrays['uvi_data_id'])} UVI rows and "
+          f"{len(store.arrays['niwa_forecast_id'])} forecasts")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,246 @@
+import contextvars
+import json
+import os
+import threading
+import time
+import tracemalloc
+import uuid
+from contextlib import contextmanager
+from dataclasses import asdict, dataclass, field
+from typing import Dict, Iterator, List, Optional, Sequence
+
+# Set UVI_STAGE_LOG to a file path to append every stage as a JSON line ('-' for stdout),
+# and UVI_TRACE_MEMORY=1 to record peak allocations from startup
+STAGE_LOG_ENV = "UVI_STAGE_LOG"
+TRACE_MEMORY_ENV = "UVI_TRACE_MEMORY"
+
+
+@dataclass
+class StageRecord:
+    """Timing of one pipeline stage."""
+    name: str
+    seconds: float
+    rows: Optional[int] = None
+    # Peak bytes allocated above the stage's starting point (None when not tracing memory)
+    peak_bytes: Optional[int] = None
+    depth: int = 0
+    # '<label>:<run_id>' of the run the stage belonged to, if any
+    run: Optional[str] = None
+    started_at: float = 0.0
+
+
+@dataclass
+class RunTrace:
+    """Every stage recorded during one run (e.g. one Streamlit rerun)."""
+    label: str
+    # In start order; a stage still running holds a None slot
+    records: List[Optional[StageRecord]] = field(default_factory=list)
+    started_at: float = field(default_factory=time.time)
+    # Ties the JSON lines of one run together
+    run_id: str = field(default_factory=lambda: uuid.uuid4().hex[:12])
+
+    @property
+    def total_seconds(self) -> float:
+        return sum(r.seconds for r in self.records if r is not None and r.depth == 0)
+
+    def to_dataframe(self):
+        import pandas as pd
+
+        frame = pd.DataFrame([{
+            "stage": "  " * r.depth + r.name,
+            "ms": round(r.seconds * 1000, 2),
+            "rows": r.rows,
+            "peak MB": None if r.peak_bytes is None else round(r.peak_bytes / 2**20, 2),
+        } for r in self.records if r is not None], columns=["stage", "ms", "rows", "peak MB"])
+        frame["rows"] = frame["rows"].astype("Int64")
+        return frame
+
+
+class _Frame:
+    __slots__ = ("name", "rows", "start", "start_memory", "peak_seen")
+
+    def __init__(self, name: str, rows: Optional[int]):
+        self.name = name
+        self.rows = rows
+        self.start = 0.0
+        self.start_memory = 0
+        self.peak_seen = 0
+
+
+_current_run: contextvars.ContextVar = contextvars.ContextVar("uvi_current_run", default=None)
+_stack: contextvars.ContextVar = contextvars.ContextVar("uvi_stage_stack", default=())
+_log_lock = threading.Lock()
+_log_path: Optional[str] = os.environ.get(STAGE_LOG_ENV) or None
+
+# With the env var set, tracing stays on whatever set_memory_tracking is asked
+_memory_floor = os.environ.get(TRACE_MEMORY_ENV) == "1"
+if _memory_floor:
+    tracemalloc.start()
+
+
+def set_stage_log(path: Optional[str]) -> None:
+    """Sets (or with None, stops) the JSON lines log of stage timings."""
+    global _log_path
+    _log_path = path
+
+
+def set_memory_tracking(enabled: bool) -> None:
+    """
+    Turns tracemalloc on or off; peak allocations are only recorded while it is on.
+
+    Tracing is process-wide, so this affects every thread and session (and the peaks
+    they record include each other's allocations). It is never turned off while
+    UVI_TRACE_MEMORY=1 is set.
+    """
+    if enabled and not tracemalloc.is_tracing():
+        tracemalloc.start()
+    elif not enabled and not _memory_floor and tracemalloc.is_tracing():
+        tracemalloc.stop()
+
+
+def memory_tracking() -> bool:
+    """Whether peak allocations are currently being recorded."""
+    return tracemalloc.is_tracing()
+
+
+def _emit(record: StageRecord) -> None:
+    if _log_path is None:
+        return
+    line = json.dumps(asdict(record))
+    with _log_lock:
+        if _log_path == "-":
+            print(line)
+        else:
+            with open(_log_path, "a") as f:
+                f.write(line + "\n")
+
+
+@contextmanager
+def stage(name: str, rows: Optional[int] = None) -> Iterator[_Frame]:
+    """
+    Times a block as a named pipeline stage.
+
+    Records wall time, the row count (pass it in or set ``.rows`` on the yielded frame)
+    and, while tracemalloc is on, the peak allocation within the block. Stages nest;
+    the record goes to the active run (if any) and to the JSON lines log.
+
+    Example:
+        with stage("decode forecasts") as s:
+            decoded = decode_forecasts(blobs)
+            s.rows = len(blobs)
+    """
+    frame = _Frame(name, rows)
+    parents = _stack.get()
+    tracing = tracemalloc.is_tracing()
+    if tracing:
+        current, peak = tracemalloc.get_traced_memory()
+        # The parent's peak so far is kept before the peak counter is reset for this stage
+        if parents:
+            parents[-1].peak_seen = max(parents[-1].peak_seen, peak)
+        tracemalloc.reset_peak()
+        frame.start_memory = current
+        frame.peak_seen = current
+    token = _stack.set(parents + (frame,))
+    # The run's slot is taken on entry so records stay in start order (parents before children)
+    run = _current_run.get()
+    slot = None
+    if run is not None:
+        slot = len(run.records)
+        run.records.append(None)
+    started_at = time.time()
+    frame.start = time.perf_counter()
+    try:
+        yield frame
+    finally:
+        seconds = time.perf_counter() - frame.start
+        _stack.reset(token)
+        peak_bytes = None
+        if tracing and tracemalloc.is_tracing():
+            peak = tracemalloc.get_traced_memory()[1]
+            frame.peak_seen = max(frame.peak_seen, peak)
+            peak_bytes = frame.peak_seen - frame.start_memory
+            if parents:
+                parents[-1].peak_seen = max(parents[-1].peak_seen, frame.peak_seen)
+
+        record = StageRecord(
+            name, seconds, frame.rows, peak_bytes, len(parents),
+            f"{run.label}:{run.run_id}" if run else None, started_at
+        )
+        if run is not None:
+            run.records[slot] = record
+        _emit(record)
+
+
+class StageSplits:
+    """
+    Time spent in each named part of a loop that alternates between them, see ``split_stages``.
+
+    Attributes:
+        seconds (dict): Accumulated seconds per name.
+        rows (dict): Row count per name (None until set).
+    """
+
+    def __init__(self, names: Sequence[str]):
+        self.seconds: Dict[str, float] = dict.fromkeys(names, 0.0)
+        self.rows: Dict[str, Optional[int]] = dict.fromkeys(names)
+
+    @contextmanager
+    def time(self, name: str) -> Iterator[None]:
+        """Adds the time spent in the block to ``name``."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.seconds[name] += time.perf_counter() - start
+
+    def add_rows(self, name: str, rows: int) -> None:
+        self.rows[name] = (self.rows[name] or 0) + rows
+
+
+@contextmanager
+def split_stages(*names: str) -> Iterator[StageSplits]:
+    """
+    Records one stage per name for work that interleaves them at a fine grain.
+
+    Streaming a file reads and decodes it chunk by chunk, so a ``stage`` per chunk would
+    flood the records; the chunks are timed with ``StageSplits.time`` instead, and each
+    name is recorded once, with its total, as a child of the enclosing stage. Peak memory
+    is not recorded for them.
+
+    Example:
+        with split_stages("file read", "json decode") as splits:
+            items = list(iter_json_array(path, splits=splits))
+    """
+    splits = StageSplits(names)
+    depth = len(_stack.get())
+    run = _current_run.get()
+    slots = []
+    if run is not None:
+        slots = list(range(len(run.records), len(run.records) + len(names)))
+        run.records.extend([None] * len(names))
+    started_at = time.time()
+    try:
+        yield splits
+    finally:
+        for i, name in enumerate(names):
+            record = StageRecord(
+                name, splits.seconds[name], splits.rows[name], None, depth,
+                f"{run.label}:{run.run_id}" if run else None, started_at
+            )
+            if run is not None:
+                run.records[slots[i]] = record
+            _emit(record)
+
+
+def start_run(label: str) -> RunTrace:
+    """Starts collecting the stages run in this context (thread / Streamlit session)."""
+    run = RunTrace(label)
+    _current_run.set(run)
+    return run
+
+
+def finish_run() -> Optional[RunTrace]:
+    """Stops collecting and returns the finished run."""
+    run = _current_run.get()
+    _current_run.set(None)
+    return run
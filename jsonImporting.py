@@ -1,98 +1,251 @@
 import json
-from datetime import datetime, timezone
-from typing import List, Dict, Optional, Tuple
+from typing import Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from datasets import NiwaDataset, UviDataset
+from fast_parsing import detect_format, iter_json_array, parse_fixed_width_timestamps, parse_float_strings
+from instrumentation import split_stages, stage
+from niwa_decoder import build_niwa_datasets
+
+# Rows converted per bulk parse in the streaming UVI reader
+UVI_BATCH_ROWS = 100_000
+
+
+def uvi_columns_from_strings(
+    timestamps: Sequence[str],
+    values: Sequence
+) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Bulk converts raw UVI 'Timestamp'/'Value' columns to (epoch, uvi) arrays.
+
+    Timestamps are truncated to the minute, matching the original strptime('%Y-%m-%d %H:%M')
+    parsing. Rows whose timestamp or value cannot be parsed are reported and dropped.
+    """
+    epoch, ts_valid = parse_fixed_width_timestamps(timestamps)
+    uvi, value_valid = parse_float_strings(values)
+    valid = ts_valid & value_valid
+    if not valid.all():
+        for i in np.flatnonzero(~valid)[:10]:
+            print(f"Could not parse UVI row: {timestamps[i]!r}, {values[i]!r}")
+        print(f"Skipped {int((~valid).sum())} unparseable UVI rows")
+    epoch = epoch[valid]
+    return epoch - epoch % 60, uvi[valid].astype(np.float32)
+
+
+def iter_uvi_batches(
+    items: Iterable[dict],
+    batch_rows: int = UVI_BATCH_ROWS,
+    device_id: Optional[int] = None
+) -> Iterator[Tuple[np.ndarray, np.ndarray]]:
+    """
+    Groups UVI export rows into batches and yields their (epoch, uvi) arrays.
+
+    Only the raw strings of one batch are alive at a time. When ``device_id`` is given,
+    rows from other devices are skipped.
+    """
+    wanted_device = None if device_id is None else str(device_id)
+    timestamps: List[str] = []
+    values: List = []
+    for item in items:
+        if wanted_device is not None and str(item.get("DeviceId")) != wanted_device:
+            continue
+        ts = item.get("Timestamp")
+        val = item.get("Value")
+        if not ts or val is None:
+            continue
+        timestamps.append(ts)
+        values.append(val)
+        if len(timestamps) >= batch_rows:
+            yield uvi_columns_from_strings(timestamps, values)
+            timestamps, values = [], []
+    if timestamps:
+        yield uvi_columns_from_strings(timestamps, values)
+
+
+def uvi_dataset_from_batches(batches: Iterable[Tuple[np.ndarray, np.ndarray]]) -> UviDataset:
+    """Concatenates (epoch, uvi) batches into a single UviDataset."""
+    batches = list(batches)
+    if not batches:
+        return UviDataset.empty()
+    epoch = np.concatenate([b[0] for b in batches])
+    uvi = np.concatenate([b[1] for b in batches])
+    return UviDataset(epoch, uvi)
+
+
+def load_uvi_streaming(
+    uvi_file_path: str,
+    batch_rows: int = UVI_BATCH_ROWS,
+    device_id: Optional[int] = None
+) -> UviDataset:
+    """
+    Loads a UVI export by streaming its JSON array instead of json.load-ing the whole file.
+
+    Memory use is bounded by one read chunk plus one batch of raw strings, on top of
+    the 12 bytes per reading of the resulting columns. Reading and decoding are recorded
+    as the 'file read' and 'json decode' stages, like the non-streaming path.
+    """
+    with split_stages("file read", "json decode") as splits:
+        items = iter_json_array(uvi_file_path, splits=splits)
+        return uvi_dataset_from_batches(iter_uvi_batches(items, batch_rows, device_id))
+
+def load_uvi_by_device(
+    uvi_file_path: str,
+    device_ids: Iterable,
+    batch_rows: int = UVI_BATCH_ROWS
+) -> Dict[str, UviDataset]:
+    """
+    Loads the readings of several devices from one UVI export (JSON or CSV) in a single pass.
+
+    Raises on a file that can't be read, so the caller can report why.
+
+    Returns:
+        dict: UviDataset per device id (as a string); empty for ids with no rows.
+    """
+    wanted = {str(d) for d in device_ids}
+    batches: Dict[str, List[Tuple[np.ndarray, np.ndarray]]] = {d: [] for d in wanted}
+    if detect_format(uvi_file_path) == "csv":
+        from csvImporting import iter_uvi_csv_rows
+
+        for chunk in iter_uvi_csv_rows(uvi_file_path):
+            chunk = chunk[chunk["DeviceId"].isin(wanted)]
+            for device, rows in chunk.groupby("DeviceId", sort=False):
+                batches[device].append(uvi_columns_from_strings(rows["Timestamp"].to_numpy(), rows["Value"].to_numpy()))
+    else:
+        raw: Dict[str, Tuple[List[str], List]] = {d: ([], []) for d in wanted}
+        for item in iter_json_array(uvi_file_path):
+            device = str(item.get("DeviceId"))
+            ts = item.get("Timestamp")
+            val = item.get("Value")
+            if device not in raw or not ts or val is None:
+                continue
+            timestamps, values = raw[device]
+            timestamps.append(ts)
+            values.append(val)
+            if len(timestamps) >= batch_rows:
+                batches[device].append(uvi_columns_from_strings(timestamps, values))
+                raw[device] = ([], [])
+        for device, (timestamps, values) in raw.items():
+            if timestamps:
+                batches[device].append(uvi_columns_from_strings(timestamps, values))
+    return {d: uvi_dataset_from_batches(b) for d, b in batches.items()}
+
+
+def read_niwa_by_location(
+    niwa_file_path: str,
+    location_ids: Iterable
+) -> Dict[str, Tuple[List[Optional[str]], List[Optional[str]]]]:
+    """
+    Reads the forecast records of several locations from one NIWA export in a single pass.
+
+    The ForecastData blobs are left undecoded (see ``niwa_decoder.build_niwa_datasets``).
+    Raises on a file that can't be read.
+
+    Returns:
+        dict: (forecast_blobs, updated_at) per location id (as a string), in file order.
+    """
+    wanted = {str(location) for location in location_ids}
+    records: Dict[str, Tuple[List[Optional[str]], List[Optional[str]]]] = {l: ([], []) for l in wanted}
+    if detect_format(niwa_file_path) == "csv":
+        from csvImporting import NIWA_CSV_COLUMNS, iter_csv_columns
+
+        for chunk in iter_csv_columns(niwa_file_path, NIWA_CSV_COLUMNS):
+            chunk = chunk[chunk["GeoLocationId"].isin(wanted)]
+            for location, rows in chunk.groupby("GeoLocationId", sort=False):
+                blobs, updated_at = records[location]
+                # '' means missing, like an absent key in the JSON export
+                blobs.extend(np.where(rows["ForecastData"] == "", None, rows["ForecastData"]).tolist())
+                updated_at.extend(np.where(rows["UpdatedAt"] == "", None, rows["UpdatedAt"]).tolist())
+    else:
+        for record in iter_json_array(niwa_file_path):
+            location = str(record.get('GeoLocationId'))
+            if location in records:
+                blobs, updated_at = records[location]
+                blobs.append(record.get('ForecastData'))
+                updated_at.append(record.get('UpdatedAt'))
+    return records
+
 
 def load_uvi_and_niwa(
     uvi_file_path: str,
-    niwa_file_path: str
-) -> Tuple[List[Dict], List[Dict], List[Dict]]:
+    niwa_file_path: str,
+    streaming: bool = True,
+    niwa_workers: Optional[int] = None,
+    device_id: Optional[int] = None,
+    location_id: Optional[int] = None
+) -> Tuple[UviDataset, NiwaDataset, NiwaDataset]:
     """
-    Loads and processes UVI and NIWA forecast data from given JSON files.
+    Loads and processes UVI and NIWA forecast data from given JSON or CSV files.
+
+    The format of each file is detected from its content; CSV exports go through the
+    chunked pandas reader in csvImporting and give the same datasets.
 
     Args:
-        uvi_file_path (str): Path to the UVI JSON data file.
-        niwa_file_path (str): Path to the NIWA JSON forecast file.
+        uvi_file_path (str): Path to the UVI JSON/CSV data file.
+        niwa_file_path (str): Path to the NIWA JSON/CSV forecast file.
+        streaming (bool): Stream the UVI array in batches rather than json.load-ing it whole.
+        niwa_workers (int, optional): Process pool size for decoding large forecast archives.
+        device_id (int, optional): Only keep UVI rows with this DeviceId.
+        location_id (int, optional): Only keep forecasts with this GeoLocationId.
 
     Returns:
         tuple: (uvi_5min, niwa_clear_sky_hourly, niwa_cloudy_sky_hourly)
-            - uvi_5min: List of 5-minute UVI data dicts
-            - niwa_clear_sky_hourly: List of hourly clear sky forecast dicts
-            - niwa_cloudy_sky_hourly: List of hourly cloudy sky forecast dicts
+            - uvi_5min: UviDataset of 5-minute UVI readings
+            - niwa_clear_sky_hourly: NiwaDataset of hourly clear sky forecast values
+            - niwa_cloudy_sky_hourly: NiwaDataset of hourly cloudy sky forecast values
     """
 
-    def parse_datetime_z(dt_str: str) -> Optional[datetime]:
-        try:
-            return datetime.fromisoformat(dt_str.replace('Z', '+00:00'))
-        except ValueError:
-            return None
+    empty = (UviDataset.empty(), NiwaDataset.empty(), NiwaDataset.empty())
 
     # Load UVI data
     try:
-        with open(uvi_file_path, 'r') as f:
-            data1_UVI = json.load(f)
+        with stage("read uvi") as timing:
+            if detect_format(uvi_file_path) == "csv":
+                # Imported here so the JSON path doesn't pay for importing pandas
+                from csvImporting import load_uvi_csv
+
+                uvi_5min = load_uvi_csv(uvi_file_path, device_id=device_id)
+            elif streaming:
+                # File read and JSON decode are interleaved when streaming; their totals are
+                # recorded as the same stages as below
+                uvi_5min = load_uvi_streaming(uvi_file_path, device_id=device_id)
+            else:
+                with stage("file read"):
+                    with open(uvi_file_path, 'r') as f:
+                        text = f.read()
+                with stage("json decode") as decode_timing:
+                    data1_UVI = json.loads(text)
+                    decode_timing.rows = len(data1_UVI)
+                uvi_5min = uvi_dataset_from_batches(iter_uvi_batches(data1_UVI, device_id=device_id))
+            timing.rows = len(uvi_5min)
     except Exception as e:
         print(f"Failed to load UVI file: {e}")
-        return [], [], []
+        return empty
 
+    # Process NIWA data: each ForecastData blob is decoded exactly once
     try:
-        with open(niwa_file_path, 'r') as f:
-            data2_Niwa = json.load(f)
+        forecast_blobs: List[Optional[str]] = []
+        updated_at: List[Optional[str]] = []
+        with stage("read niwa") as timing:
+            if detect_format(niwa_file_path) == "csv":
+                from csvImporting import read_niwa_csv
+
+                _, forecast_blobs, updated_at = read_niwa_csv(niwa_file_path, location_id=location_id)
+            else:
+                wanted_location = None if location_id is None else str(location_id)
+                with split_stages("file read", "json decode") as splits:
+                    for record in iter_json_array(niwa_file_path, splits=splits):
+                        if wanted_location is not None and str(record.get('GeoLocationId')) != wanted_location:
+                            continue
+                        forecast_blobs.append(record.get('ForecastData'))
+                        updated_at.append(record.get('UpdatedAt'))
+            timing.rows = len(forecast_blobs)
     except Exception as e:
         print(f"Failed to load NIWA file: {e}")
-        return [], [], []
-
-    # Process NIWA data
-    niwa_clear_sky_hourly = []
-    niwa_cloudy_sky_hourly = []
-
-    for i, current_day_data in enumerate(data2_Niwa):
-        current_day_updated_at = current_day_data.get('UpdatedAt')
-        cutoff_time = None
-
-        if i + 1 < len(data2_Niwa):
-            next_day_data = data2_Niwa[i+1]
-            try:
-                forecast_data = json.loads(next_day_data.get('ForecastData', '{}'))
-            except json.JSONDecodeError:
-                forecast_data = {}
-
-            for product in forecast_data.get("products", []):
-                if product.get("name") == "clear_sky_uv_index" and product.get("values"):
-                    first_next = product["values"][0]
-                    if "time" in first_next:
-                        cutoff_time = parse_datetime_z(first_next["time"])
-
-        try:
-            current_forecast_data = json.loads(current_day_data.get("ForecastData", '{}'))
-        except json.JSONDecodeError:
-            current_forecast_data = {}
-
-        for product in current_forecast_data.get("products", []):
-            name = product.get("name")
-            for entry in product.get("values", []):
-                dt = parse_datetime_z(entry.get("time", ""))
-                if not dt or (cutoff_time and dt >= cutoff_time):
-                    continue
-                if name == "clear_sky_uv_index":
-                    niwa_clear_sky_hourly.append({'datetime': dt, 'uvi': entry['value'], 'updatedAt': current_day_updated_at})
-                elif name == "cloudy_sky_uv_index":
-                    niwa_cloudy_sky_hourly.append({'datetime': dt, 'uvi': entry['value'], 'updatedAt': current_day_updated_at})
-
-    # Process UVI data
-    uvi_5min = []
-    for item in data1_UVI:
-        ts = item.get("Timestamp")
-        val = item.get("Value")
-        if not ts or val is None:
-            continue
-        if '.' in ts:
-            ts = ts.split('.')[0]
-        if ts.count(':') > 1:
-            ts = ':'.join(ts.split(':')[:2])
-        try:
-            dt = datetime.strptime(ts, '%Y-%m-%d %H:%M').replace(tzinfo=timezone.utc)
-            uvi_5min.append({'datetime': dt, 'uvi': val})
-        except ValueError:
-            print(f"Could not parse datetime from UVI data: {ts}")
+        return empty
+
+    niwa_clear_sky_hourly, niwa_cloudy_sky_hourly = build_niwa_datasets(
+        forecast_blobs, updated_at, max_workers=niwa_workers
+    )
 
     return uvi_5min, niwa_clear_sky_hourly, niwa_cloudy_sky_hourly
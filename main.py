@@ -1,19 +1,93 @@
 
-from matplotlib import pyplot as plt
 import streamlit as st
-from jsonImporting import load_uvi_and_niwa
-from adjustTimeZone import apply_nz_time_conversion
-from UI.plotter import update_graph
+from bisect import bisect_left
+from dataset_registry import get_shared_sql_source, get_shared_store_data
+from UI.plotter import update_range_graph
+from UI.render_cache import get_render_cache, get_window_render_cache, neighbouring_dates
+from UI.client_scaler import client_scaler
 from datetime import date
 from UI.ui_functions import setup_navigation
-from data_functions import create_data_by_date, find_unique_dates, find_date_counts
 from UI.graph_controller import make_update_graph_fn
-from persist_settings import load_uvi_settings, save_uvi_settings
+from persist_settings import load_database_settings, load_uvi_settings, save_uvi_settings
+from calibration import fit_calibration, save_calibration
+from calibration_curves import DeviceCurveHistory, TwoFactorCurve, load_curve_histories
+from datasets import date_to_day
+from drift_tracker import DEFAULT_HALF_LIFE_DAYS, DEFAULT_WINDOW_DAYS
+from ingest_store import DEFAULT_DEVICE_ID
+from instrumentation import finish_run, memory_tracking, set_memory_tracking, stage, start_run
+
+
+def jump_to_selected_stats_row(stats_dates, unique_dates):
+   """Moves date_index to the date picked in the per-date summary table."""
+   rows = st.session_state.date_stats_table.selection.rows
+   if rows and stats_dates[rows[0]] in unique_dates:
+      st.session_state.date_index = unique_dates.index(stats_dates[rows[0]])
+
+
+def keep_selected_date(all_dates, clear_dates):
+   """Keeps date_index on the same (or the next) date when the clear-day filter is toggled."""
+   old_dates, new_dates = (all_dates, clear_dates) if st.session_state.clear_days_only else (clear_dates, all_dates)
+   if not old_dates or not new_dates:
+      st.session_state.date_index = 0
+      return
+   current = old_dates[min(st.session_state.date_index, len(old_dates) - 1)]
+   st.session_state.date_index = min(bisect_left(new_dates, current), len(new_dates) - 1)
+
+
+def show_drift(drift, selected_date):
+   """Rolling-window and EWMA calibration gain over the whole history."""
+   st.subheader("Calibration drift")
+   if drift is None or drift.n_days == 0:
+      st.caption("Drift tracking needs the full history of the ingest store (not available in database mode).")
+      return
+   window_col, half_life_col = st.columns(2)
+   with window_col:
+      window_days = st.number_input("Window (days)", min_value=3, max_value=365, value=DEFAULT_WINDOW_DAYS)
+   with half_life_col:
+      half_life_days = st.number_input("EWMA half-life (days)", min_value=1, max_value=365, value=DEFAULT_HALF_LIFE_DAYS)
+   clear_only = st.checkbox("Clear days only", value=True, key="drift_clear_only")
+   # Both estimates come from the per-day sums kept by the tracker, not the readings
+   chart = drift.chart_frame(window_days, half_life_days, clear_only)
+   st.line_chart(chart)
+   k = min(max(date_to_day(selected_date) - drift.first_day, 0), drift.n_days - 1)
+   if chart.iloc[k].isna().all():
+      st.caption(f"No {'clear-day ' if clear_only else ''}pairs up to {selected_date} yet.")
+   else:
+      rolling_gain, ewma_gain = chart.iloc[k]
+      st.caption(
+         f"{selected_date}: {window_days}-day gain {rolling_gain:.3f}, EWMA gain {ewma_gain:.3f} "
+         f"(device x gain ~ NIWA clear sky; saved uvi_scale {st.session_state.uvi_scale:.2f})"
+      )
+
+
+def show_stage_timings(run):
+   """Sidebar table of this rerun's pipeline stages (nested stages are indented)."""
+   st.sidebar.subheader("Stage timings")
+   if not run.records:
+      st.sidebar.write("No stages ran.")
+      return
+   st.sidebar.dataframe(run.to_dataframe(), hide_index=True)
+   st.sidebar.caption(f"Total {run.total_seconds * 1000:.1f} ms")
 
 
 def main():
-   uvi_path = "data/studio_results_20250722_2108_uvi.json"
-   niwa_path = "data/studio_results_20250722_2109_niwa.json"
+   data_dir = "data"
+   st.set_page_config(layout="wide")
+   # Every stage of this rerun is recorded (and logged as JSON lines if UVI_STAGE_LOG is set);
+   # the sidebar panel is optional
+   run = start_run("rerun")
+   show_timings = st.sidebar.checkbox("Show stage timings", value=False)
+   # tracemalloc is process-wide, so it is only switched when this checkbox changes
+   # (not on every rerun of every session), and the checkbox starts from its current state
+   st.sidebar.checkbox(
+      "Track peak memory", value=memory_tracking(), key="track_memory",
+      on_change=lambda: set_memory_tracking(st.session_state.track_memory),
+      help=(
+         "Uses tracemalloc for the whole process: it slows every session while it is on, and "
+         "peaks include allocations by other sessions and the plot prefetch thread running at "
+         "the same time. UVI_TRACE_MEMORY=1 keeps it on."
+      )
+   )
    # Load settings at startup
    load_uvi_settings()
    # Set a default value if not already set
@@ -22,21 +96,22 @@ def main():
    if "uvi_scale_upper" not in st.session_state:
       st.session_state.uvi_scale_upper = 0.0
 
-   uvi_5min, niwa_clear, niwa_cloudy = load_uvi_and_niwa(uvi_path, niwa_path)
-
-   print(f"Loaded {len(uvi_5min)} UVI entries")
-   print(f"Loaded {len(niwa_clear)} NIWA clear sky entries")
-   print(f"Loaded {len(niwa_cloudy)} NIWA cloudy sky entries")
-
-   # Data is loaded so now need to apply timezone conversion
-   apply_nz_time_conversion(niwa_clear, niwa_cloudy, uvi_5min)
-
-   unique_dates = find_unique_dates(niwa_clear, uvi_5min) 
-
-   # first speed up is to group by date
-   niwa_clear_by_date, niwa_cloudy_by_date, uvi_5min_by_date = create_data_by_date(niwa_clear, niwa_cloudy, uvi_5min)
-
-   st.set_page_config(layout="wide")
+   database_settings = load_database_settings()
+   if database_settings is not None:
+      # Database mode: only the list of dates is queried up front; the week around the
+      # viewed date is fetched on demand and kept in the shared window cache
+      sql_source = get_shared_sql_source(database_settings)
+      unique_dates = list(sql_source.available_dates())
+      with stage("load window"):
+         shared = sql_source.window(unique_dates[min(st.session_state.get("date_index", 0), len(unique_dates) - 1)])
+   else:
+      # Every export in data_dir is consolidated into the ingest store (only new rows are
+      # parsed) and the datasets are shared read-only by every session;
+      # session_state only holds date_index, uvi_scale and uvi_scale_upper
+      with stage("load data"):
+         shared = get_shared_store_data(data_dir)
+      unique_dates = list(shared.unique_dates)
+   uvi_5min, niwa_clear, niwa_cloudy = shared.uvi_5min, shared.niwa_clear, shared.niwa_cloudy
 
    # UI controls
    # selected_date = st.date_input("Select date", unique_dates[0], min_value=min(unique_dates), max_value=max(unique_dates))
@@ -47,12 +122,42 @@ def main():
    if "date_index" not in st.session_state:
       st.session_state.date_index = 0
 
-   # Add a slider to let the user change uvi_scale
-   st.session_state.uvi_scale = st.slider("UVI Scale - Overall", min_value=0.1, max_value=2.0, value=st.session_state.uvi_scale, step=0.05)
-   st.session_state.uvi_scale_upper = st.slider("UVI Scale Upper additional factor at starts at UVI2 and goes to 10 linear between, zero at UVI2", min_value=-1.0, max_value=1.0, value=st.session_state.uvi_scale_upper, step=0.05)
+   view = st.radio("View", ["Single day", "Interactive day", "Date range"], horizontal=True)
+   # Curve versions fitted by fleet.py for this device; each date is drawn with the
+   # version in force on it, so readings from before a refit keep their old curve
+   device_id = database_settings.get("device_id", DEFAULT_DEVICE_ID) if database_settings is not None else DEFAULT_DEVICE_ID
+   history = load_curve_histories().get(str(device_id))
+   use_history = False
+   if view != "Interactive day" and history is not None and history.versions:
+      use_history = st.radio(
+         "Calibration", ["Sliders", "Fitted curve versions"], horizontal=True
+      ) == "Fitted curve versions"
+   if view != "Interactive day" and not use_history:
+      # Add a slider to let the user change uvi_scale
+      st.session_state.uvi_scale = st.slider("UVI Scale - Overall", min_value=0.1, max_value=2.0, value=st.session_state.uvi_scale, step=0.05)
+      st.session_state.uvi_scale_upper = st.slider("UVI Scale Upper additional factor at starts at UVI2 and goes to 10 linear between, zero at UVI2", min_value=-1.0, max_value=1.0, value=st.session_state.uvi_scale_upper, step=0.05)
 
 
 
+   # Clear-day screening is built with the shared data; in database mode only the
+   # current window is screened, so the filter is only offered for the full history
+   clear_dates = shared.clear_days.clear_dates()
+   if database_settings is not None:
+      clear_days_label = "Clear days only (not available in database mode, which loads one week at a time)"
+   else:
+      clear_days_label = f"Clear days only ({len(clear_dates)} of {len(unique_dates)})"
+   clear_days_only = st.checkbox(
+      clear_days_label,
+      key="clear_days_only",
+      disabled=database_settings is not None or not clear_dates,
+      on_change=keep_selected_date,
+      args=(unique_dates, clear_dates),
+   )
+   filter_clear_days = bool(clear_days_only and clear_dates and database_settings is None)
+   if filter_clear_days:
+      unique_dates = clear_dates
+   st.session_state.date_index = min(st.session_state.date_index, len(unique_dates) - 1)
+
    # Navigation controls
    col1, col2, col3, col4 = st.columns([1, 1, 3, 7])
    with col1:
@@ -72,19 +177,130 @@ def main():
       if picked_date in unique_dates:
          st.session_state.date_index = unique_dates.index(picked_date)
    with col4:
-      if st.button("Save UVI Settings"):
+      # The interactive view has its own Save, which knows where the in-browser sliders are
+      if view != "Interactive day" and st.button("Save UVI Settings"):
          save_uvi_settings()
          st.success("Settings saved!")
+      if st.button(
+         "Auto-fit Calibration",
+         help="Fits the week being viewed (database mode loads one week at a time)." if database_settings is not None else None
+      ):
+         # Least-squares fit over every date (or the clear days when filtered), saved so
+         # the sliders pick it up on rerun
+         try:
+            result = fit_calibration(uvi_5min, niwa_clear, dates=clear_dates if filter_clear_days else None)
+         except ValueError as e:
+            # e.g. no readings pair with a NIWA value on the chosen dates
+            st.error(f"Auto-fit failed: {e}")
+         else:
+            save_calibration(result)
+            st.rerun()
 
    selected_date = unique_dates[st.session_state.date_index]
+   # Dates the range view and the summaries cover: everything, or in database mode the
+   # window holding the selected date
+   loaded_dates = unique_dates
+   if database_settings is not None:
+      # Navigation may have moved into another window
+      with stage("load window"):
+         shared = sql_source.window(selected_date)
+      uvi_5min, niwa_clear, niwa_cloudy = shared.uvi_5min, shared.niwa_clear, shared.niwa_cloudy
+      loaded_dates = list(shared.unique_dates)
+      window_note = (
+         f"Database mode: only {loaded_dates[0]} to {loaded_dates[-1]}, the week holding {selected_date}, "
+         "is loaded. Step to another date to move it."
+      )
+   if use_history:
+      calibration = history
+      version = next((v for v in reversed(history.versions) if v.effective_from <= selected_date), None)
+      st.caption(
+         f"Device {device_id}: no curve version is in force on {selected_date}, readings are unscaled" if version is None
+         else f"Device {device_id}: {version.curve.kind} curve effective from {version.effective_from} {version.note}".rstrip()
+      )
+   else:
+      calibration = DeviceCurveHistory.single(TwoFactorCurve(st.session_state.uvi_scale, st.session_state.uvi_scale_upper))
    # st.write(f"Showing data for {selected_date}")
 
 
    # Plot (use Plotly for best results)
    # fig = update_graph(selected_date, niwa_clear, niwa_cloudy, uvi_5min, st.session_state.uvi_scale)
-   fig = update_graph(selected_date, niwa_clear_by_date, niwa_cloudy_by_date, uvi_5min_by_date, st.session_state.uvi_scale, st.session_state.uvi_scale_upper)
-   st.pyplot(fig)
-   plt.close(fig)  # This is the correct place to close the figure
+   if view in ("Single day", "Interactive day"):
+      # The day plot with the long-run calibration drift beside it
+      plot_col, drift_col = st.columns([3, 2])
+      with drift_col:
+         show_drift(shared.drift, selected_date)
+      with plot_col:
+         if view == "Single day":
+            # Plots come from the shared render cache; the days either side are rendered ahead
+            # in the background so Previous/Next Day are cache hits (in database mode one
+            # cache spans the windows, and each date is drawn from its own window)
+            if database_settings is not None:
+               render_cache = get_window_render_cache(sql_source)
+            else:
+               render_cache = get_render_cache(shared)
+            with stage("plot"):
+               png = render_cache.get(selected_date, calibration.curve_for(selected_date))
+            with stage("st.image render"):
+               st.image(png, width="stretch")
+            render_cache.prefetch(
+               neighbouring_dates(unique_dates, st.session_state.date_index), calibration
+            )
+         elif view == "Interactive day":
+            # The sliders live in the browser and rescale the plot there, so dragging them
+            # costs no reruns; the script only hears about the settings when they are saved
+            saved = client_scaler(
+               selected_date, niwa_clear, niwa_cloudy, uvi_5min,
+               st.session_state.uvi_scale, st.session_state.uvi_scale_upper
+            )
+            if saved is not None and saved["saved_at"] != st.session_state.get("client_scaler_saved_at"):
+               st.session_state.client_scaler_saved_at = saved["saved_at"]
+               st.session_state.uvi_scale = saved["uvi_scale"]
+               st.session_state.uvi_scale_upper = saved["uvi_scale_upper"]
+               save_uvi_settings()
+               st.success("Settings saved!")
+   else:
+      # Multi-day view for spotting drift; the device series is decimated to screen resolution
+      range_col, method_col = st.columns([3, 1])
+      with range_col:
+         picked_range = st.date_input(
+            "Date range",
+            (loaded_dates[0], loaded_dates[-1]),
+            min_value=min(loaded_dates),
+            max_value=max(loaded_dates)
+         )
+         if database_settings is not None:
+            st.caption(window_note)
+      with method_col:
+         decimation_method = st.selectbox("Decimation", ["minmax", "lttb"])
+      # The picker returns a single date while the second end is being chosen
+      start_date, end_date = (picked_range[0], picked_range[-1]) if picked_range else (loaded_dates[0], loaded_dates[-1])
+      with stage("figure build"):
+         fig = update_range_graph(
+            start_date, end_date, niwa_clear, niwa_cloudy, uvi_5min,
+            calibration, shared.uvi_pyramid, method=decimation_method
+         )
+      with stage("st.pyplot render"):
+         st.pyplot(fig)
+
+   # Per-date summary, built once at load time; click a row to jump to that date
+   with st.expander("Per-date summary"):
+      if database_settings is not None:
+         st.caption(window_note)
+      st.dataframe(
+         shared.date_stats.to_dataframe(),
+         key="date_stats_table",
+         on_select=lambda: jump_to_selected_stats_row(shared.date_stats.dates, unique_dates),
+         selection_mode="single-row",
+         hide_index=True,
+      )
+   with st.expander("Clear-day screening"):
+      if database_settings is not None:
+         st.caption(window_note)
+      st.dataframe(shared.clear_days.to_dataframe(), hide_index=True)
+
+   finish_run()
+   if show_timings:
+      show_stage_timings(run)
 
    # update_graph_fn = make_update_graph_fn(niwa_clear, niwa_cloudy, uvi_5min)
    # setup_navigation(unique_dates, update_graph_fn)
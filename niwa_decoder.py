@@ -0,0 +1,202 @@
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from datasets import MISSING_EPOCH, NiwaDataset
+from fast_parsing import parse_fixed_width_timestamps, parse_float_strings
+from instrumentation import stage
+
+CLEAR_SKY_PRODUCT = "clear_sky_uv_index"
+CLOUDY_SKY_PRODUCT = "cloudy_sky_uv_index"
+# Product codes used in the decoded arrays
+PRODUCT_CODES = {CLEAR_SKY_PRODUCT: 0, CLOUDY_SKY_PRODUCT: 1}
+
+# Below this many forecasts a process pool costs more than it saves
+PARALLEL_MIN_RECORDS = 2000
+RECORDS_PER_CHUNK = 500
+
+NO_CUTOFF = np.iinfo(np.int64).max
+
+
+class DecodedForecasts:
+    """
+    Flat arrays of every clear/cloudy sky value in a run of forecast records.
+
+    Attributes:
+        record (np.ndarray): int64 index of the source forecast record for each value.
+        product (np.ndarray): int8 product code (see ``PRODUCT_CODES``).
+        epoch (np.ndarray): int64 UTC epoch seconds of each value.
+        uvi (np.ndarray): float64 forecast UVI.
+        first_clear_epoch (np.ndarray): int64, per record, the first clear sky time
+            (``NO_CUTOFF`` when the record has none).
+    """
+
+    def __init__(self, record, product, epoch, uvi, first_clear_epoch):
+        self.record = record
+        self.product = product
+        self.epoch = epoch
+        self.uvi = uvi
+        self.first_clear_epoch = first_clear_epoch
+
+    @classmethod
+    def concatenate(cls, parts: Sequence["DecodedForecasts"]) -> "DecodedForecasts":
+        """Joins decoded chunks, shifting record indices so they stay global."""
+        offset = 0
+        records = []
+        for part in parts:
+            records.append(part.record + offset)
+            offset += len(part.first_clear_epoch)
+        return cls(
+            np.concatenate(records) if records else np.empty(0, dtype=np.int64),
+            np.concatenate([p.product for p in parts]) if parts else np.empty(0, dtype=np.int8),
+            np.concatenate([p.epoch for p in parts]) if parts else np.empty(0, dtype=np.int64),
+            np.concatenate([p.uvi for p in parts]) if parts else np.empty(0, dtype=np.float64),
+            np.concatenate([p.first_clear_epoch for p in parts]) if parts else np.empty(0, dtype=np.int64),
+        )
+
+
+def decode_forecast_chunk(forecast_blobs: Sequence[Optional[str]]) -> DecodedForecasts:
+    """
+    Decodes a run of ``ForecastData`` strings, each exactly once.
+
+    Only the clear and cloudy sky products are kept; their time strings are parsed
+    in one bulk call rather than with fromisoformat per value.
+    """
+    record_idx: List[int] = []
+    product_codes: List[int] = []
+    times: List[str] = []
+    values: List[float] = []
+    first_clear_time: List[Optional[str]] = [None] * len(forecast_blobs)
+
+    for i, blob in enumerate(forecast_blobs):
+        try:
+            forecast = json.loads(blob or '{}')
+        except json.JSONDecodeError:
+            continue
+        for product in forecast.get("products", []):
+            code = PRODUCT_CODES.get(product.get("name"))
+            if code is None:
+                continue
+            entries = product.get("values") or []
+            if code == PRODUCT_CODES[CLEAR_SKY_PRODUCT] and entries:
+                first_clear_time[i] = entries[0].get("time")
+            for entry in entries:
+                value = entry.get("value")
+                if value is None:
+                    continue
+                record_idx.append(i)
+                product_codes.append(code)
+                times.append(entry.get("time") or "")
+                values.append(value)
+
+    epoch, valid = parse_fixed_width_timestamps(times)
+    # A non-numeric value drops that entry only, like an undecodable blob drops its record
+    uvi, value_valid = parse_float_strings(values)
+    valid &= value_valid
+
+    # Records with no (parseable) clear sky values don't impose a cutoff
+    have_first = [i for i, t in enumerate(first_clear_time) if t]
+    first_clear_epoch = np.full(len(forecast_blobs), NO_CUTOFF, dtype=np.int64)
+    if have_first:
+        first_epoch, first_valid = parse_fixed_width_timestamps([first_clear_time[i] for i in have_first])
+        first_clear_epoch[np.array(have_first)[first_valid]] = first_epoch[first_valid]
+
+    return DecodedForecasts(
+        np.array(record_idx, dtype=np.int64)[valid],
+        np.array(product_codes, dtype=np.int8)[valid],
+        epoch[valid],
+        uvi[valid],
+        first_clear_epoch,
+    )
+
+
+def decode_forecasts(
+    forecast_blobs: Sequence[Optional[str]],
+    max_workers: Optional[int] = None,
+    chunk_size: int = RECORDS_PER_CHUNK
+) -> DecodedForecasts:
+    """
+    Decodes every ``ForecastData`` blob, fanning out over a process pool for large archives.
+
+    Args:
+        forecast_blobs (Sequence[str]): ForecastData JSON strings, in record order.
+        max_workers (int, optional): Pool size; 1 forces in-process decoding.
+        chunk_size (int): Records per pool task.
+    """
+    n = len(forecast_blobs)
+    workers = max_workers if max_workers is not None else (os.cpu_count() or 1)
+    if n < PARALLEL_MIN_RECORDS or workers <= 1:
+        return decode_forecast_chunk(forecast_blobs)
+
+    chunks = [list(forecast_blobs[i:i + chunk_size]) for i in range(0, n, chunk_size)]
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        parts = list(pool.map(decode_forecast_chunk, chunks))
+    return DecodedForecasts.concatenate(parts)
+
+
+def apply_forecast_cutoffs(decoded: DecodedForecasts) -> np.ndarray:
+    """
+    Returns a mask keeping each value only until the next forecast takes over.
+
+    A record's values are valid up to (not including) the first clear sky time of the
+    following record, so overlapping forecasts don't double up.
+    """
+    cutoffs = np.empty_like(decoded.first_clear_epoch)
+    cutoffs[:-1] = decoded.first_clear_epoch[1:]
+    if len(cutoffs):
+        cutoffs[-1] = NO_CUTOFF
+    return decoded.epoch < cutoffs[decoded.record]
+
+
+def parse_updated_at(updated_at: Sequence[Optional[str]]) -> np.ndarray:
+    """Bulk parses UpdatedAt strings to epoch seconds (``MISSING_EPOCH`` when absent)."""
+    epoch, valid = parse_fixed_width_timestamps([u or "" for u in updated_at])
+    return np.where(valid, epoch, MISSING_EPOCH)
+
+
+def build_niwa_datasets(
+    forecast_blobs: Sequence[Optional[str]],
+    updated_at: Sequence[Optional[str]],
+    max_workers: Optional[int] = None
+) -> Tuple[NiwaDataset, NiwaDataset]:
+    """
+    Turns raw forecast records into clear and cloudy sky NiwaDatasets.
+
+    Args:
+        forecast_blobs (Sequence[str]): ForecastData JSON strings, in record order.
+        updated_at (Sequence[str]): UpdatedAt strings, one per record.
+        max_workers (int, optional): Process pool size for large archives.
+
+    Returns:
+        tuple: (niwa_clear_sky_hourly, niwa_cloudy_sky_hourly)
+    """
+    with stage("decode forecasts", rows=len(forecast_blobs)):
+        decoded = decode_forecasts(forecast_blobs, max_workers=max_workers)
+        return niwa_datasets_from_decoded(decoded, parse_updated_at(updated_at))
+
+
+def niwa_datasets_from_decoded(
+    decoded: DecodedForecasts,
+    record_updated_at: np.ndarray
+) -> Tuple[NiwaDataset, NiwaDataset]:
+    """
+    Applies the forecast cutoffs and splits decoded values into clear and cloudy datasets.
+
+    Args:
+        decoded (DecodedForecasts): Values of a run of records, in record order.
+        record_updated_at (np.ndarray): UpdatedAt epoch per record.
+    """
+    keep = apply_forecast_cutoffs(decoded)
+
+    datasets: Dict[int, NiwaDataset] = {}
+    for code in PRODUCT_CODES.values():
+        mask = keep & (decoded.product == code)
+        datasets[code] = NiwaDataset(
+            decoded.epoch[mask],
+            decoded.uvi[mask],
+            record_updated_at[decoded.record[mask]],
+        )
+    return datasets[PRODUCT_CODES[CLEAR_SKY_PRODUCT]], datasets[PRODUCT_CODES[CLOUDY_SKY_PRODUCT]]
@@ -5,20 +5,60 @@ import streamlit as st
 
 SETTINGS_FILE = "uvi_settings.json"
 
-def save_uvi_settings():
+def save_uvi_settings(uvi_scale=None, uvi_scale_upper=None):
+    """Saves the calibration factors (defaults to the values in session state)."""
+    if uvi_scale is None:
+        uvi_scale = st.session_state.uvi_scale
+    if uvi_scale_upper is None:
+        uvi_scale_upper = st.session_state.uvi_scale_upper
     settings = {
-        "uvi_scale": st.session_state.uvi_scale,
-        "uvi_scale_upper": st.session_state.uvi_scale_upper
+        "uvi_scale": float(uvi_scale),
+        "uvi_scale_upper": float(uvi_scale_upper)
     }
     with open(SETTINGS_FILE, "w") as f:
         json.dump(settings, f)
 
-def load_uvi_settings():
-    if os.path.exists(SETTINGS_FILE):
-        with open(SETTINGS_FILE, "r") as f:
+def read_uvi_settings(path=SETTINGS_FILE):
+    """Returns the saved (uvi_scale, uvi_scale_upper), or the defaults if nothing is saved."""
+    if os.path.exists(path):
+        with open(path, "r") as f:
             settings = json.load(f)
-        st.session_state.uvi_scale = settings.get("uvi_scale", 1.0)
-        st.session_state.uvi_scale_upper = settings.get("uvi_scale_upper", 0.0)
-    else:
-        st.session_state.uvi_scale = 1.0
-        st.session_state.uvi_scale_upper = 0.0
\ No newline at end of file
+        return settings.get("uvi_scale", 1.0), settings.get("uvi_scale_upper", 0.0)
+    return 1.0, 0.0
+
+def load_uvi_settings():
+    st.session_state.uvi_scale, st.session_state.uvi_scale_upper = read_uvi_settings()
+
+DEVICE_SETTINGS_FILE = "fleet_settings.json"
+
+def save_device_settings(device_settings, path=DEVICE_SETTINGS_FILE):
+    """
+    Saves a per-device settings table: {device_id: {"uvi_scale": ..., "uvi_scale_upper": ..., ...}}.
+
+    Rows already in the file for devices not in ``device_settings`` are kept.
+    """
+    table = load_device_settings(path)
+    table.update({str(device_id): row for device_id, row in device_settings.items()})
+    with open(path, "w") as f:
+        json.dump(table, f, indent=2, sort_keys=True)
+
+def load_device_settings(path=DEVICE_SETTINGS_FILE):
+    """Loads the per-device settings table (empty if there is none yet)."""
+    if not os.path.exists(path):
+        return {}
+    with open(path, "r") as f:
+        return json.load(f)
+
+DATABASE_SETTINGS_FILE = "database_settings.json"
+
+def load_database_settings(path=DATABASE_SETTINGS_FILE):
+    """
+    Loads the database connection settings, or None to use the exports in data/.
+
+    e.g. {"driver": "sqlite", "database": "data/uvi_database.sqlite", "device_id": 4, "location_id": 4}
+    or {"driver": "mysql", "host": ..., "user": ..., "password": ..., "database": "uvi-database", ...}
+    """
+    if not os.path.exists(path):
+        return None
+    with open(path, "r") as f:
+        return json.load(f)
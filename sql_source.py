@@ -0,0 +1,426 @@
+import argparse
+import os
+import queue
+import sqlite3
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+from datetime import date, datetime, time, timedelta, timezone
+from typing import Callable, Dict, Iterator, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from adjustTimeZone import NZ_ZONE_NAME, apply_nz_time_conversion, to_local_epoch
+from data_functions import create_data_by_date
+from datasets import NiwaDataset, UviDataset, date_to_day, day_to_date
+from fast_parsing import iter_json_array, parse_fixed_width_timestamps
+from jsonImporting import uvi_columns_from_strings, uvi_dataset_from_batches
+from niwa_decoder import build_niwa_datasets
+
+# Rows per fetchmany call; only one chunk of raw rows is alive at a time
+FETCH_ROWS = 20_000
+DEFAULT_POOL_SIZE = 4
+# Dates fetched per query as the user navigates, and how many windows are kept
+DEFAULT_WINDOW_DAYS = 7
+DEFAULT_CACHED_WINDOWS = 16
+
+SQL_TIME_FORMAT = "%Y-%m-%d %H:%M:%S"
+
+# Same tables and columns as `uvi-database` (see data/sql_statements_in_google_cloud.txt)
+SQLITE_SCHEMA = """
+CREATE TABLE IF NOT EXISTS Data (
+    DataId INTEGER PRIMARY KEY,
+    Timestamp TEXT NOT NULL,
+    Value REAL,
+    DataTypeId INTEGER,
+    DeviceId INTEGER
+);
+CREATE INDEX IF NOT EXISTS Data_Device_Timestamp ON Data (DeviceId, Timestamp);
+CREATE TABLE IF NOT EXISTS NiwaForecasts (
+    ForecastId INTEGER PRIMARY KEY,
+    ForecastData TEXT,
+    GenerationDate TEXT,
+    GeoLocationId INTEGER,
+    Error TEXT,
+    UpdatedAt TEXT
+);
+CREATE INDEX IF NOT EXISTS NiwaForecasts_Location ON NiwaForecasts (GeoLocationId, ForecastId);
+"""
+
+
+class ConnectionPool:
+    """
+    A fixed-size pool of DB-API connections shared by every session.
+
+    Connections are opened on demand up to ``size``; after that callers wait for one
+    to be returned. A connection that raised is closed rather than reused.
+
+    Args:
+        connect (Callable): Opens a new connection.
+        size (int): Most connections open at once.
+        paramstyle (str): 'qmark' (sqlite3) or 'format' (pymysql / MySQLdb).
+    """
+
+    def __init__(self, connect: Callable[[], object], size: int = DEFAULT_POOL_SIZE, paramstyle: str = "qmark"):
+        self._connect = connect
+        self.size = size
+        self.paramstyle = paramstyle
+        self._idle: "queue.LifoQueue" = queue.LifoQueue()
+        self._opened = 0
+        self._lock = threading.Lock()
+
+    @property
+    def placeholder(self) -> str:
+        return "?" if self.paramstyle == "qmark" else "%s"
+
+    @contextmanager
+    def connection(self):
+        try:
+            conn = self._idle.get_nowait()
+        except queue.Empty:
+            with self._lock:
+                can_open = self._opened < self.size
+                if can_open:
+                    self._opened += 1
+            if can_open:
+                try:
+                    conn = self._connect()
+                except Exception:
+                    with self._lock:
+                        self._opened -= 1
+                    raise
+            else:
+                conn = self._idle.get()
+
+        try:
+            yield conn
+        except Exception:
+            conn.close()
+            with self._lock:
+                self._opened -= 1
+            conn = None
+            raise
+        finally:
+            # Also reached on GeneratorExit, when a fetch_chunks generator is closed early
+            if conn is not None:
+                self._idle.put(conn)
+
+    def close_all(self) -> None:
+        while True:
+            try:
+                conn = self._idle.get_nowait()
+            except queue.Empty:
+                return
+            conn.close()
+            with self._lock:
+                self._opened -= 1
+
+
+def sqlite_pool(db_path: str, size: int = DEFAULT_POOL_SIZE) -> ConnectionPool:
+    """Pool for the local SQLite stand-in (connections may move between threads)."""
+    return ConnectionPool(lambda: sqlite3.connect(db_path, check_same_thread=False), size, "qmark")
+
+
+def mysql_pool(size: int = DEFAULT_POOL_SIZE, **connect_args) -> ConnectionPool:
+    """
+    Pool for the Cloud SQL (MySQL) database.
+
+    Uses pymysql's unbuffered SSCursor, so fetchmany streams rows from the server
+    instead of buffering the whole result client-side.
+    """
+    try:
+        import pymysql
+        import pymysql.cursors
+    except ImportError as e:
+        raise ImportError("pymysql is required for the MySQL source (pip install pymysql)") from e
+    return ConnectionPool(
+        lambda: pymysql.connect(cursorclass=pymysql.cursors.SSCursor, **connect_args), size, "format"
+    )
+
+
+def _as_text(values: Sequence) -> Sequence:
+    # MySQL drivers return datetime objects where SQLite returns the stored strings
+    if len(values) and not isinstance(values[0], str):
+        return [None if v is None else str(v) for v in values]
+    return values
+
+
+def _utc_text(moment: datetime) -> str:
+    return moment.astimezone(timezone.utc).strftime(SQL_TIME_FORMAT)
+
+
+def local_day_bounds(start_date: date, end_date: date, zone_name: str = NZ_ZONE_NAME) -> Tuple[datetime, datetime]:
+    """UTC instants of local midnight starting start_date and ending end_date."""
+    from zoneinfo import ZoneInfo
+
+    zone = ZoneInfo(zone_name)
+    start = datetime.combine(start_date, time(), tzinfo=zone)
+    end = datetime.combine(end_date + timedelta(days=1), time(), tzinfo=zone)
+    return start.astimezone(timezone.utc), end.astimezone(timezone.utc)
+
+
+def fetch_chunks(pool: ConnectionPool, sql: str, params: Sequence) -> Iterator[List[tuple]]:
+    """Runs a query on a pooled connection and yields its rows FETCH_ROWS at a time."""
+    with pool.connection() as conn:
+        cursor = conn.cursor()
+        try:
+            cursor.execute(sql, params)
+            while True:
+                rows = cursor.fetchmany(FETCH_ROWS)
+                if not rows:
+                    break
+                yield rows
+        finally:
+            cursor.close()
+
+
+def load_niwa_sql(
+    pool: ConnectionPool,
+    location_id: int,
+    niwa_workers: Optional[int] = None
+) -> Tuple[NiwaDataset, NiwaDataset]:
+    """
+    Fetches and decodes every forecast for a location, with the forecast cutoffs applied.
+
+    The times a forecast covers are only inside its ForecastData, and a forecast may be
+    re-exported with a later UpdatedAt, so no column can pick the forecasts for a date
+    range. They are all fetched (one small record per day) and cut off against each
+    other in ForecastId order, exactly as the JSON loader and the ingest store do.
+
+    Returns:
+        tuple: (niwa_clear_sky_hourly, niwa_cloudy_sky_hourly), UTC only.
+    """
+    niwa_sql = (
+        f"SELECT ForecastData, UpdatedAt FROM NiwaForecasts WHERE GeoLocationId = {pool.placeholder} "
+        "ORDER BY ForecastId"
+    )
+    forecast_blobs: List[Optional[str]] = []
+    updated_at: List[Optional[str]] = []
+    for rows in fetch_chunks(pool, niwa_sql, [location_id]):
+        forecast_blobs.extend(row[0] for row in rows)
+        updated_at.extend(_as_text([row[1] for row in rows]))
+    return build_niwa_datasets(forecast_blobs, updated_at, max_workers=niwa_workers)
+
+
+def _between(dataset: NiwaDataset, start: Optional[datetime], end: Optional[datetime]) -> NiwaDataset:
+    """The rows of a UTC-only dataset from ``start`` (inclusive) to ``end`` (exclusive)."""
+    lo = 0 if start is None else np.searchsorted(dataset.epoch, int(start.timestamp()), side="left")
+    hi = len(dataset) if end is None else np.searchsorted(dataset.epoch, int(end.timestamp()), side="left")
+    return NiwaDataset(dataset.epoch[lo:hi], dataset.uvi[lo:hi], dataset.updated_at[lo:hi])
+
+
+def load_uvi_and_niwa_sql(
+    pool: ConnectionPool,
+    device_id: int,
+    location_id: int,
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    niwa_workers: Optional[int] = None,
+    forecasts: Optional[Tuple[NiwaDataset, NiwaDataset]] = None
+) -> Tuple[UviDataset, NiwaDataset, NiwaDataset]:
+    """
+    The database counterpart of ``jsonImporting.load_uvi_and_niwa``.
+
+    The device and time range are pushed down into the readings' WHERE clause, and
+    rows are parsed in bulk one fetchmany chunk at a time. Forecasts can't be selected
+    by the time they cover (see ``load_niwa_sql``), so they are trimmed to the range
+    after decoding.
+
+    Args:
+        pool (ConnectionPool): Connections to the database.
+        device_id (int): DeviceId of the readings.
+        location_id (int): GeoLocationId of the forecasts.
+        start (datetime, optional): First instant (inclusive, aware); default: all history.
+        end (datetime, optional): Last instant (exclusive, aware).
+        forecasts (tuple, optional): ``load_niwa_sql`` output to reuse instead of fetching it.
+
+    Returns:
+        tuple: (uvi_5min, niwa_clear_sky_hourly, niwa_cloudy_sky_hourly), UTC only.
+    """
+    p = pool.placeholder
+
+    uvi_sql = f"SELECT Timestamp, Value FROM Data WHERE DeviceId = {p}"
+    uvi_params: List = [device_id]
+    if start is not None:
+        uvi_sql += f" AND Timestamp >= {p}"
+        uvi_params.append(_utc_text(start))
+    if end is not None:
+        uvi_sql += f" AND Timestamp < {p}"
+        uvi_params.append(_utc_text(end))
+    uvi_sql += " ORDER BY Timestamp"
+
+    batches = []
+    for rows in fetch_chunks(pool, uvi_sql, uvi_params):
+        rows = [row for row in rows if row[0] is not None and row[1] is not None]
+        if rows:
+            timestamps, values = zip(*rows)
+            batches.append(uvi_columns_from_strings(_as_text(timestamps), values))
+    uvi_5min = uvi_dataset_from_batches(batches)
+
+    if forecasts is None:
+        forecasts = load_niwa_sql(pool, location_id, niwa_workers)
+    niwa_clear, niwa_cloudy = (_between(dataset, start, end) for dataset in forecasts)
+    return uvi_5min, niwa_clear, niwa_cloudy
+
+
+class SqlSource:
+    """
+    Date windows of one device's data, fetched from the database as they are viewed.
+
+    Only the list of dates is queried up front. A window of ``window_days`` local dates
+    is fetched the first time one of its dates is asked for, processed to NZ time and
+    date-indexed, passed through ``build_window`` and kept in a bounded LRU. The
+    location's forecasts are fetched once, with the readings of the first window, and
+    every window takes its part of them.
+
+    Args:
+        pool (ConnectionPool): Connections to the database.
+        device_id (int): DeviceId of the readings.
+        location_id (int): GeoLocationId of the forecasts.
+        window_days (int): Local dates per fetched window.
+        cached_windows (int): Windows kept in memory.
+        build_window (Callable, optional): Turns (uvi_5min, niwa_clear, niwa_cloudy)
+            into the cached value (default: the tuple itself).
+    """
+
+    def __init__(
+        self,
+        pool: ConnectionPool,
+        device_id: int,
+        location_id: int,
+        window_days: int = DEFAULT_WINDOW_DAYS,
+        cached_windows: int = DEFAULT_CACHED_WINDOWS,
+        build_window: Optional[Callable] = None
+    ):
+        self.pool = pool
+        self.device_id = device_id
+        self.location_id = location_id
+        self.window_days = window_days
+        self.cached_windows = cached_windows
+        self.build_window = build_window or (lambda *datasets: datasets)
+        self._windows: "OrderedDict[date, object]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._window_locks: Dict[date, threading.Lock] = {}
+        self._dates: Optional[Tuple[date, ...]] = None
+        self._forecasts: Optional[Tuple[NiwaDataset, NiwaDataset]] = None
+
+    def available_dates(self, refresh: bool = False) -> Tuple[date, ...]:
+        """
+        Local dates with device readings, from one small query of distinct UTC hours.
+
+        ``refresh`` also drops the fetched forecasts, so windows fetched afterwards see
+        new ones.
+        """
+        if self._dates is not None and not refresh:
+            return self._dates
+        self._forecasts = None
+        sql = f"SELECT DISTINCT SUBSTR(Timestamp, 1, 13) FROM Data WHERE DeviceId = {self.pool.placeholder}"
+        hours: List[str] = []
+        for rows in fetch_chunks(self.pool, sql, [self.device_id]):
+            hours.extend(f"{h}:00" for (h,) in rows if h)
+        epoch, valid = parse_fixed_width_timestamps(hours)
+        _, local_days = to_local_epoch(epoch[valid])
+        self._dates = tuple(day_to_date(d) for d in np.unique(local_days))
+        return self._dates
+
+    def window_start(self, selected_date: date) -> date:
+        day = date_to_day(selected_date)
+        return day_to_date(day - day % self.window_days)
+
+    def forecasts(self) -> Tuple[NiwaDataset, NiwaDataset]:
+        """The location's (clear, cloudy) forecasts in UTC, fetched on first use."""
+        with self._lock:
+            forecasts = self._forecasts
+        if forecasts is None:
+            # Concurrent first windows may both fetch; the results are the same
+            forecasts = load_niwa_sql(self.pool, self.location_id, niwa_workers=1)
+            with self._lock:
+                self._forecasts = forecasts
+        return forecasts
+
+    def fetch_window(self, start_date: date) -> Tuple[UviDataset, NiwaDataset, NiwaDataset]:
+        """Queries and processes one window (bypassing the cache)."""
+        end_date = start_date + timedelta(days=self.window_days - 1)
+        start, end = local_day_bounds(start_date, end_date)
+        uvi_5min, niwa_clear, niwa_cloudy = load_uvi_and_niwa_sql(
+            self.pool, self.device_id, self.location_id, start, end, forecasts=self.forecasts()
+        )
+        apply_nz_time_conversion(niwa_clear, niwa_cloudy, uvi_5min)
+        niwa_clear, niwa_cloudy, uvi_5min = create_data_by_date(niwa_clear, niwa_cloudy, uvi_5min)
+        return uvi_5min, niwa_clear, niwa_cloudy
+
+    def window(self, selected_date: date):
+        """
+        Returns the (built) window holding selected_date, fetching it on first use.
+
+        Concurrent sessions asking for the same window wait for one fetch.
+        """
+        start_date = self.window_start(selected_date)
+        with self._lock:
+            if start_date in self._windows:
+                self._windows.move_to_end(start_date)
+                return self._windows[start_date]
+            window_lock = self._window_locks.setdefault(start_date, threading.Lock())
+
+        with window_lock:
+            with self._lock:
+                if start_date in self._windows:
+                    return self._windows[start_date]
+            built = self.build_window(*self.fetch_window(start_date))
+            with self._lock:
+                self._windows[start_date] = built
+                while len(self._windows) > self.cached_windows:
+                    evicted, _ = self._windows.popitem(last=False)
+                    self._window_locks.pop(evicted, None)
+            return built
+
+
+def build_sqlite_standin(db_path: str, uvi_paths: Sequence[str], niwa_paths: Sequence[str]) -> Tuple[int, int]:
+    """
+    Creates (or tops up) a SQLite copy of the database from JSON exports.
+
+    Rows are keyed by DataId / ForecastId, so overlapping exports don't duplicate.
+
+    Returns:
+        tuple: (Data rows, NiwaForecasts rows) in the database afterwards.
+    """
+    conn = sqlite3.connect(db_path)
+    try:
+        conn.executescript(SQLITE_SCHEMA)
+        for path in uvi_paths:
+            conn.executemany(
+                "INSERT OR IGNORE INTO Data VALUES (?, ?, ?, ?, ?)",
+                ((r.get("DataId"), r.get("Timestamp"), r.get("Value"), r.get("DataTypeId"), r.get("DeviceId"))
+                 for r in iter_json_array(path)),
+            )
+        for path in niwa_paths:
+            conn.executemany(
+                "INSERT OR REPLACE INTO NiwaForecasts VALUES (?, ?, ?, ?, ?, ?)",
+                ((r.get("ForecastId"), r.get("ForecastData"), r.get("GenerationDate"), r.get("GeoLocationId"),
+                  r.get("Error"), r.get("UpdatedAt"))
+                 for r in iter_json_array(path)),
+            )
+        conn.commit()
+        counts = tuple(conn.execute(f"SELECT COUNT(*) FROM {t}").fetchone()[0] for t in ("Data", "NiwaForecasts"))
+    finally:
+        conn.close()
+    return counts
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build a local SQLite stand-in of uvi-database from JSON exports")
+    parser.add_argument("--data-dir", default="data", help="Folder of UVI / NIWA JSON exports")
+    parser.add_argument("--out", default=os.path.join("data", "uvi_database.sqlite"))
+    args = parser.parse_args()
+
+    from ingest_store import find_exports
+
+    uvi_files, niwa_files = find_exports(args.data_dir)
+    uvi_files = [p for p in uvi_files if p.endswith(".json")]
+    niwa_files = [p for p in niwa_files if p.endswith(".json")]
+    data_rows, forecast_rows = build_sqlite_standin(args.out, uvi_files, niwa_files)
+    print(f"{args.out}: {data_rows} Data rows, {forecast_rows} NiwaForecasts rows")
+
+
+if __name__ == "__main__":
+    main()
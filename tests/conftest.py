@@ -0,0 +1,26 @@
+import os
+import sys
+
+# The modules live flat in the repository root
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DATA_DIR = os.path.join(REPO_DIR, "data")
+sys.path.insert(0, REPO_DIR)
+
+import pytest  # noqa: E402
+
+from adjustTimeZone import apply_nz_time_conversion  # noqa: E402
+from data_functions import create_data_by_date  # noqa: E402
+from jsonImporting import load_uvi_and_niwa  # noqa: E402
+
+# Newest JSON export pair; it holds every reading in the older exports as well
+UVI_EXPORT = os.path.join(DATA_DIR, "studio_results_20250722_2108_uvi.json")
+NIWA_EXPORT = os.path.join(DATA_DIR, "studio_results_20250722_2109_niwa.json")
+
+
+@pytest.fixture(scope="session")
+def json_datasets():
+    """(uvi_5min, niwa_clear, niwa_cloudy) from the plain JSON loader, in NZ time and date-indexed."""
+    uvi_5min, niwa_clear, niwa_cloudy = load_uvi_and_niwa(UVI_EXPORT, NIWA_EXPORT)
+    apply_nz_time_conversion(niwa_clear, niwa_cloudy, uvi_5min)
+    niwa_clear, niwa_cloudy, uvi_5min = create_data_by_date(niwa_clear, niwa_cloudy, uvi_5min)
+    return uvi_5min, niwa_clear, niwa_cloudy
@@ -0,0 +1,48 @@
+from datetime import datetime, timezone
+from zoneinfo import ZoneInfo
+
+import numpy as np
+
+from adjustTimeZone import NZ_ZONE_NAME, transition_table, to_local_epoch
+from datasets import SECONDS_PER_DAY
+
+NZ = ZoneInfo(NZ_ZONE_NAME)
+# 2025: NZDT ends 2025-04-06 03:00 (14:00 UTC the day before), NZST ends 2025-09-28 02:00
+FALL_BACK = int(datetime(2025, 4, 5, 14, tzinfo=timezone.utc).timestamp())
+SPRING_FORWARD = int(datetime(2025, 9, 27, 14, tzinfo=timezone.utc).timestamp())
+
+
+def zoneinfo_local_epoch(epoch):
+    """Per-element reference conversion through zoneinfo."""
+    return np.array([
+        t + int(datetime.fromtimestamp(int(t), tz=NZ).utcoffset().total_seconds()) for t in epoch
+    ], dtype=np.int64)
+
+
+def test_transition_table_finds_both_changes():
+    starts, offsets = transition_table(NZ_ZONE_NAME, 2025, 2025)
+    assert starts.tolist() == [int(datetime(2025, 1, 1, tzinfo=timezone.utc).timestamp()), FALL_BACK, SPRING_FORWARD]
+    assert offsets.tolist() == [13 * 3600, 12 * 3600, 13 * 3600]
+
+
+def test_to_local_epoch_across_both_transitions():
+    # Every minute for two hours either side of each change, plus the instants themselves
+    epoch = np.concatenate([
+        np.arange(change - 7200, change + 7200, 60, dtype=np.int64) for change in (FALL_BACK, SPRING_FORWARD)
+    ])
+    local_epoch, local_days = to_local_epoch(epoch)
+    np.testing.assert_array_equal(local_epoch, zoneinfo_local_epoch(epoch))
+    np.testing.assert_array_equal(local_days, local_epoch // SECONDS_PER_DAY)
+
+    # The repeated hour at fall-back maps twice onto 02:00-03:00 local; spring-forward skips one
+    fall_back_local = local_epoch[:240]
+    assert np.count_nonzero(np.diff(fall_back_local) < 0) == 1
+    spring_local = local_epoch[240:]
+    assert np.diff(spring_local).max() == 3600 + 60
+
+
+def test_datasets_match_zoneinfo(json_datasets):
+    for dataset in json_datasets:
+        # A sample spread over the whole export, including the April change
+        sample = np.linspace(0, len(dataset) - 1, 500).astype(int)
+        np.testing.assert_array_equal(dataset.local_epoch[sample], zoneinfo_local_epoch(dataset.epoch[sample]))
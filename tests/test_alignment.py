@@ -0,0 +1,66 @@
+import numpy as np
+import pytest
+
+from alignment import (
+    ALIGN_METHODS, DEFAULT_MAX_GAP_SECONDS, DEFAULT_TOLERANCE_SECONDS, DEFAULT_WINDOW_SECONDS, align_niwa_with_device,
+)
+from datasets import SECONDS_PER_DAY
+
+
+def reference_value(device_epoch, device_uvi, t, method):
+    """One NIWA time aligned by a plain scan over the readings."""
+    if method == "nearest":
+        distance = np.abs(device_epoch - t)
+        if distance.min() > DEFAULT_TOLERANCE_SECONDS:
+            return np.nan
+        # Ties go to the earlier reading; of duplicated times, the one closest in file order
+        nearest_time = device_epoch[distance == distance.min()].min()
+        rows = np.flatnonzero(device_epoch == nearest_time)
+        return device_uvi[rows[-1] if nearest_time < t else rows[0]]
+    if method == "mean":
+        half = DEFAULT_WINDOW_SECONDS // 2
+        inside = (device_epoch >= t - half) & (device_epoch <= t + half)
+        return device_uvi[inside].mean() if inside.any() else np.nan
+    exact = np.flatnonzero(device_epoch == t)
+    if len(exact):
+        return device_uvi[exact[0]]
+    before, after = np.flatnonzero(device_epoch < t), np.flatnonzero(device_epoch > t)
+    if not len(before) or not len(after):
+        return np.nan
+    t0, t1 = device_epoch[before[-1]], device_epoch[after[0]]
+    if t1 - t0 > DEFAULT_MAX_GAP_SECONDS:
+        return np.nan
+    v0, v1 = device_uvi[before[-1]], device_uvi[after[0]]
+    return v0 + (t - t0) / (t1 - t0) * (v1 - v0)
+
+
+@pytest.mark.parametrize("method", ALIGN_METHODS)
+def test_day_edges_match_a_plain_scan(json_datasets, method):
+    uvi_5min, niwa_clear, _ = json_datasets
+    pairs = align_niwa_with_device(niwa_clear, uvi_5min, method=method, drop_gaps=False)
+    assert len(pairs) == len(niwa_clear)
+
+    # The device only reports in daylight, so each day's readings start and stop near
+    # these local hours; also check the very first and last NIWA hours
+    local_hour = (niwa_clear.local_epoch % SECONDS_PER_DAY) // 3600
+    rows = np.flatnonzero(np.isin(local_hour, (0, 7, 8, 17, 18, 23)))
+    rows = np.union1d(rows, [0, len(niwa_clear) - 1])
+
+    device_uvi = uvi_5min.uvi.astype(np.float64)
+    expected = np.array([reference_value(uvi_5min.epoch, device_uvi, niwa_clear.epoch[i], method) for i in rows])
+    np.testing.assert_allclose(pairs.device_uvi[rows], expected, rtol=1e-12, equal_nan=True)
+    # Both sides of the daylight edges occur, so the test isn't vacuous
+    assert np.isnan(expected).any() and (~np.isnan(expected)).any()
+
+
+@pytest.mark.parametrize("method", ALIGN_METHODS)
+def test_pairs_stay_on_the_niwa_date(json_datasets, method):
+    uvi_5min, niwa_clear, _ = json_datasets
+    pairs = align_niwa_with_device(niwa_clear, uvi_5min, method=method)
+    assert pairs.matched.all()
+    for selected_date in (pairs.dates[0], pairs.dates[len(pairs.dates) // 2], pairs.dates[-1]):
+        sl = pairs.date_slice(selected_date)
+        # Each pair is dated by its NIWA hour, whichever day the readings came from
+        niwa_rows = np.searchsorted(niwa_clear.epoch, pairs.epoch[sl])
+        np.testing.assert_array_equal(niwa_clear.local_epoch[niwa_rows], pairs.local_epoch[sl])
+        assert (pairs.local_days[sl] == pairs.local_days[sl][0]).all()
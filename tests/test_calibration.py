@@ -0,0 +1,66 @@
+import numpy as np
+import pytest
+
+from calibration import (
+    SCALE_RANGE, SCALE_UPPER_RANGE, calibration_objective, fit_calibration, least_squares_fit, pair_with_niwa,
+    scale_uvi,
+)
+from datasets import UviDataset
+
+
+def scaled_copy(uvi_5min, factor):
+    """The device series with every reading multiplied by ``factor``, in the same local time."""
+    scaled = UviDataset(uvi_5min.epoch, uvi_5min.uvi * factor)
+    scaled.set_local_time(uvi_5min.local_epoch)
+    scaled.build_date_index()
+    return scaled
+
+
+def test_least_squares_recovers_the_model():
+    u = np.linspace(0.0, 12.0, 200)
+    assert least_squares_fit(u, scale_uvi(u, 1.2, 0.3)) == pytest.approx((1.2, 0.3))
+    # Nothing above UVI 2 to fit the upper factor on
+    low = np.linspace(0.1, 1.9, 50)
+    assert least_squares_fit(low, 0.8 * low) == pytest.approx((0.8, 0.0))
+
+
+def test_fit_matches_the_bounded_search(json_datasets):
+    uvi_5min, niwa_clear, _ = json_datasets
+    lstsq = fit_calibration(uvi_5min, niwa_clear)
+    grid = fit_calibration(uvi_5min, niwa_clear, method="grid")
+
+    device_uvi, reference_uvi = pair_with_niwa(uvi_5min, niwa_clear)
+    assert lstsq.n_pairs == grid.n_pairs == len(device_uvi) > 0
+    assert SCALE_RANGE[0] <= lstsq.uvi_scale <= SCALE_RANGE[1]
+    assert SCALE_UPPER_RANGE[0] <= lstsq.uvi_scale_upper <= SCALE_UPPER_RANGE[1]
+    # The closed form is the exact RMSE minimum; the grid gets within its final cell
+    assert lstsq.rmse <= grid.rmse + 1e-9
+    assert grid.rmse == pytest.approx(lstsq.rmse, rel=1e-3)
+    assert lstsq.rmse == pytest.approx(
+        calibration_objective(device_uvi, reference_uvi, [lstsq.uvi_scale], [lstsq.uvi_scale_upper])[0]
+    )
+
+
+def test_out_of_range_fit_falls_back_to_grid(json_datasets):
+    uvi_5min, niwa_clear, _ = json_datasets
+    # Readings 50x too low need a uvi_scale far beyond the sliders
+    quiet = scaled_copy(uvi_5min, 0.02)
+    unbounded, _ = least_squares_fit(*pair_with_niwa(quiet, niwa_clear))
+    assert unbounded > SCALE_RANGE[1]
+
+    result = fit_calibration(quiet, niwa_clear)
+    grid = fit_calibration(quiet, niwa_clear, method="grid")
+    assert (result.uvi_scale, result.uvi_scale_upper) == (grid.uvi_scale, grid.uvi_scale_upper)
+    assert SCALE_RANGE[0] <= result.uvi_scale <= SCALE_RANGE[1]
+    assert SCALE_UPPER_RANGE[0] <= result.uvi_scale_upper <= SCALE_UPPER_RANGE[1]
+
+
+def test_no_pairs_raises(json_datasets):
+    uvi_5min, niwa_clear, _ = json_datasets
+    with pytest.raises(ValueError, match="No paired"):
+        fit_calibration(uvi_5min, niwa_clear, dates=[])
+    last = uvi_5min.dates[-1]
+    with pytest.raises(ValueError, match="No paired"):
+        fit_calibration(uvi_5min, niwa_clear, start_date=last.replace(year=last.year + 1))
+    with pytest.raises(ValueError, match="Unknown method"):
+        fit_calibration(uvi_5min, niwa_clear, method="newton")
@@ -0,0 +1,36 @@
+from datetime import date, datetime, timezone
+
+import numpy as np
+import pytest
+
+from adjustTimeZone import apply_nz_time_conversion
+from data_functions import UVI_CADENCE_SECONDS, build_date_stats
+from datasets import NiwaDataset, UviDataset
+
+
+def constant_day_stats(local_date):
+    """Date stats for readings of UVI 1 every 5 minutes through the NZ local ``local_date``."""
+    # NZ is at least 12 hours ahead of UTC, so this covers the local day with margin
+    start = int(datetime(local_date.year, local_date.month, local_date.day, tzinfo=timezone.utc).timestamp()) - 86400
+    epoch = np.arange(start, start + 3 * 86400, UVI_CADENCE_SECONDS)
+    uvi_5min = UviDataset(epoch, np.ones(len(epoch)))
+    niwa_clear, niwa_cloudy = NiwaDataset.empty(), NiwaDataset.empty()
+    apply_nz_time_conversion(niwa_clear, niwa_cloudy, uvi_5min)
+    stats = build_date_stats(niwa_clear, niwa_cloudy, uvi_5min)
+    return stats, stats.dates.index(local_date)
+
+
+def test_dose_on_daylight_saving_fall_back_day():
+    # 2025-04-06 NZDT -> NZST: the local day lasts 25 hours
+    stats, k = constant_day_stats(date(2025, 4, 6))
+    assert stats.uvi_counts[k] == 25 * 12
+    assert stats.device_dose[k] == pytest.approx(25 - UVI_CADENCE_SECONDS / 3600)
+    assert stats.max_gap_minutes[k] == pytest.approx(UVI_CADENCE_SECONDS / 60)
+
+
+def test_gaps_on_daylight_saving_spring_forward_day():
+    # 2025-09-28 NZST -> NZDT: the local day lasts 23 hours and 02:00-03:00 never happens
+    stats, k = constant_day_stats(date(2025, 9, 28))
+    assert stats.uvi_counts[k] == 23 * 12
+    assert stats.device_dose[k] == pytest.approx(23 - UVI_CADENCE_SECONDS / 3600)
+    assert stats.max_gap_minutes[k] == pytest.approx(UVI_CADENCE_SECONDS / 60)
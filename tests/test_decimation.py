@@ -0,0 +1,69 @@
+import numpy as np
+import pytest
+
+from data_functions import UVI_CADENCE_SECONDS
+from decimation import LTTB_OVERSAMPLE, DecimationPyramid, lttb_indices, minmax_indices
+
+HOUR = 3600
+
+
+@pytest.mark.parametrize("n_out", [3, 10, 500])
+def test_lttb_keeps_the_endpoints(json_datasets, n_out):
+    uvi_5min = json_datasets[0]
+    idx = lttb_indices(uvi_5min.epoch, uvi_5min.uvi, n_out)
+    assert len(idx) == n_out
+    assert idx[0] == 0 and idx[-1] == len(uvi_5min) - 1
+    assert (np.diff(idx) > 0).all()
+
+
+def test_lttb_short_series_is_unchanged():
+    x = np.arange(5)
+    np.testing.assert_array_equal(lttb_indices(x, x, 5), x)
+    np.testing.assert_array_equal(lttb_indices(x, x, 2), x)
+    assert len(lttb_indices(x[:0], x[:0], 10)) == 0
+
+
+def test_minmax_keeps_each_buckets_extremes(json_datasets):
+    uvi_5min = json_datasets[0]
+    epoch, values = uvi_5min.epoch, uvi_5min.uvi
+    idx = minmax_indices(epoch, values, HOUR)
+    assert (np.diff(idx) > 0).all()
+
+    bucket = epoch // HOUR
+    kept_bucket = bucket[idx]
+    # Every bucket, including the first and last, keeps at most two points: its min and max
+    np.testing.assert_array_equal(np.unique(kept_bucket), np.unique(bucket))
+    assert np.bincount(kept_bucket - bucket[0]).max() <= 2
+    for b in (bucket[0], bucket[-1], bucket[len(bucket) // 2]):
+        kept = values[idx[kept_bucket == b]]
+        assert kept.min() == values[bucket == b].min() and kept.max() == values[bucket == b].max()
+    assert values[idx].max() == values.max() and values[idx].min() == values.min()
+
+
+def test_minmax_of_a_slice_is_the_slice_of_minmax(json_datasets):
+    uvi_5min = json_datasets[0]
+    epoch, values = uvi_5min.epoch, uvi_5min.uvi
+    full = minmax_indices(epoch, values, HOUR)
+    # A slice from the start of one hour bucket to the end of another
+    lo = int(np.searchsorted(epoch, (epoch[len(epoch) // 3] // HOUR) * HOUR))
+    hi = int(np.searchsorted(epoch, (epoch[2 * len(epoch) // 3] // HOUR) * HOUR))
+    np.testing.assert_array_equal(lo + minmax_indices(epoch[lo:hi], values[lo:hi], HOUR), full[(full >= lo) & (full < hi)])
+
+
+@pytest.mark.parametrize("method", ["minmax", "lttb"])
+def test_pyramid_range_stays_inside_the_slice(json_datasets, method):
+    uvi_5min = json_datasets[0]
+    pyramid = DecimationPyramid(uvi_5min.epoch, uvi_5min.uvi, UVI_CADENCE_SECONDS)
+    dates = uvi_5min.dates
+    for start, end in ((dates[0], dates[-1]), (dates[10], dates[40]), (dates[5], dates[5])):
+        row_slice = uvi_5min.date_range_slice(start, end)
+        idx = pyramid.indices(row_slice, max_points=300, method=method)
+        assert 0 < len(idx) <= 300
+        assert row_slice.start <= idx[0] and idx[-1] < row_slice.stop
+        assert (np.diff(idx) > 0).all()
+        if method == "lttb" and len(idx) == 300:
+            # LTTB keeps the first and last point of the level it started from
+            level = next(level for level in pyramid.levels
+                         if np.count_nonzero((level >= row_slice.start) & (level < row_slice.stop)) <= 300 * LTTB_OVERSAMPLE)
+            inside = level[(level >= row_slice.start) & (level < row_slice.stop)]
+            assert idx[0] == inside[0] and idx[-1] == inside[-1]
@@ -0,0 +1,67 @@
+import numpy as np
+
+from clear_sky import classify_days
+from datasets import NiwaDataset, UviDataset, date_to_day
+from drift_tracker import DriftTracker
+
+
+def rebuilt(dataset, rows, uvi=None):
+    """A date-indexed copy of some rows of a dataset (optionally with new values)."""
+    uvi = dataset.uvi[rows] if uvi is None else uvi
+    if isinstance(dataset, NiwaDataset):
+        copy = NiwaDataset(dataset.epoch[rows], uvi, dataset.updated_at[rows])
+    else:
+        copy = UviDataset(dataset.epoch[rows], uvi)
+    copy.set_local_time(dataset.local_epoch[rows])
+    copy.build_date_index()
+    return copy
+
+
+def assert_same_estimates(tracker, full):
+    assert tracker.first_day == full.first_day
+    np.testing.assert_allclose(tracker.stats, full.stats, rtol=1e-12)
+    np.testing.assert_array_equal(tracker.clear, full.clear)
+    np.testing.assert_allclose(tracker.rolling().gain, full.rolling().gain, rtol=1e-12, equal_nan=True)
+    np.testing.assert_allclose(tracker.ewma().gain, full.ewma().gain, rtol=1e-12, equal_nan=True)
+
+
+def test_incremental_updates_match_a_full_recompute(json_datasets):
+    uvi_5min, niwa_clear, niwa_cloudy = json_datasets
+    clear_days = classify_days(niwa_clear, niwa_cloudy, uvi_5min)
+    full = DriftTracker()
+    assert full.update(uvi_5min, niwa_clear, clear_days) == full.n_days
+
+    # The first half of the history, then the rest
+    dates = uvi_5min.dates
+    cut = date_to_day(dates[len(dates) // 2])
+    tracker = DriftTracker()
+    tracker.update(
+        rebuilt(uvi_5min, uvi_5min.local_days < cut), rebuilt(niwa_clear, niwa_clear.local_days < cut), clear_days
+    )
+    # Prefix sums built before the update must not survive it
+    tracker.rolling()
+    realigned = tracker.update(uvi_5min, niwa_clear, clear_days)
+    assert realigned == full.n_days - (cut - full.first_day)
+    assert_same_estimates(tracker, full)
+
+    # Nothing new: nothing realigned
+    assert tracker.update(uvi_5min, niwa_clear, clear_days) == 0
+
+
+def test_only_changed_days_are_realigned(json_datasets):
+    uvi_5min, niwa_clear, niwa_cloudy = json_datasets
+    clear_days = classify_days(niwa_clear, niwa_cloudy, uvi_5min)
+    tracker = DriftTracker()
+    tracker.update(uvi_5min, niwa_clear, clear_days)
+
+    # Replaced forecasts on two days far apart
+    dates = niwa_clear.dates
+    changed = [date_to_day(dates[5]), date_to_day(dates[-10])]
+    uvi = niwa_clear.uvi.copy()
+    uvi[np.isin(niwa_clear.local_days, changed)] *= 1.5
+    replaced = rebuilt(niwa_clear, slice(None), uvi)
+
+    assert tracker.update(uvi_5min, replaced, clear_days) == 2
+    full = DriftTracker()
+    full.update(uvi_5min, replaced, clear_days)
+    assert_same_estimates(tracker, full)
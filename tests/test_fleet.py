@@ -0,0 +1,36 @@
+import json
+
+import pytest
+
+from conftest import NIWA_EXPORT, UVI_EXPORT
+from fleet import calibrate_fleet, load_fleet_mapping
+
+
+def write_mapping(tmp_path, device_ids):
+    path = tmp_path / "fleet.json"
+    entries = [
+        {"device_id": device_id, "location_id": 4, "uvi_path": UVI_EXPORT, "niwa_path": NIWA_EXPORT}
+        for device_id in device_ids
+    ]
+    path.write_text(json.dumps(entries))
+    return str(path)
+
+
+def test_repeated_devices_are_rejected(tmp_path):
+    with pytest.raises(ValueError, match="4"):
+        load_fleet_mapping(write_mapping(tmp_path, [4, 5, 4]))
+    devices = load_fleet_mapping(write_mapping(tmp_path, [4, 5]))
+    with pytest.raises(ValueError, match="5"):
+        calibrate_fleet(devices + devices[1:], workers=1)
+
+
+def test_workers_load_their_own_device(tmp_path):
+    devices = load_fleet_mapping(write_mapping(tmp_path, [4, 5]))
+    in_process = calibrate_fleet(devices, workers=1)
+    pooled = calibrate_fleet(devices, workers=2)
+
+    assert set(pooled) == {"4", "5"}
+    # The export only holds device 4
+    assert "No readings for device 5" in pooled["5"]["error"]
+    for key in ("fitted_from", "uvi_scale", "uvi_scale_upper", "rmse", "n_pairs"):
+        assert pooled["4"][key] == in_process["4"][key]
@@ -0,0 +1,115 @@
+import json
+import os
+
+import numpy as np
+import pytest
+
+from conftest import NIWA_EXPORT, UVI_EXPORT
+from fast_parsing import find_tail_offset, iter_json_array
+from ingest_store import refresh_store
+
+
+def assert_same_datasets(actual, expected):
+    for got, want in zip(actual, expected):
+        np.testing.assert_array_equal(got.epoch, want.epoch)
+        np.testing.assert_array_equal(got.uvi, want.uvi)
+        np.testing.assert_array_equal(got.local_epoch, want.local_epoch)
+        assert got.dates == want.dates
+
+
+def write_export(path, records):
+    # Same layout as the database exports: one indented object per record, id key first
+    with open(path, "w") as f:
+        json.dump(records, f, indent=2)
+
+
+@pytest.fixture(scope="module")
+def uvi_records():
+    return list(iter_json_array(UVI_EXPORT))
+
+
+@pytest.fixture(scope="module")
+def niwa_records():
+    return list(iter_json_array(NIWA_EXPORT))
+
+
+def test_find_tail_offset_matches_linear_scan(tmp_path, uvi_records):
+    path = str(tmp_path / "uvi.json")
+    write_export(path, uvi_records)
+    ids = [int(r["DataId"]) for r in uvi_records]
+
+    for high_water in (ids[0] - 1, ids[0], ids[len(ids) // 3], ids[len(ids) // 2] + 1, ids[-2]):
+        # A small linear window forces the byte-level binary search to do the work
+        offset = find_tail_offset(path, "DataId", high_water, linear_bytes=256)
+        expected = next(r for r in uvi_records if int(r["DataId"]) > high_water)
+        assert next(iter_json_array(path, start_offset=offset)) == expected
+
+    assert find_tail_offset(path, "DataId", ids[-1]) is None
+
+
+def test_store_matches_json_loader(tmp_path, json_datasets):
+    data_dir = tmp_path / "data"
+    data_dir.mkdir()
+    for source in (UVI_EXPORT, NIWA_EXPORT):
+        with open(source, "rb") as src, open(data_dir / os.path.basename(source), "wb") as dst:
+            dst.write(src.read())
+
+    store = refresh_store(str(data_dir), str(tmp_path / "store"))
+    assert_same_datasets(store.datasets(), json_datasets)
+
+
+def test_tail_ingest_matches_full_export(tmp_path, uvi_records, niwa_records, json_datasets):
+    data_dir = tmp_path / "data"
+    data_dir.mkdir()
+    store_dir = str(tmp_path / "store")
+
+    # An early export, then a later one that repeats it and adds the tail
+    write_export(data_dir / "early_uvi.json", uvi_records[:len(uvi_records) // 2])
+    write_export(data_dir / "early_niwa.json", niwa_records[:len(niwa_records) // 2])
+    refresh_store(str(data_dir), store_dir)
+    write_export(data_dir / "later_uvi.json", uvi_records)
+    write_export(data_dir / "later_niwa.json", niwa_records)
+    store = refresh_store(str(data_dir), store_dir)
+
+    later = store.manifest["files"]
+    assert later[str(data_dir / "later_uvi.json")]["new_rows"] == len(uvi_records) - len(uvi_records) // 2
+    assert later[str(data_dir / "later_niwa.json")]["new_rows"] == len(niwa_records) - len(niwa_records) // 2
+    assert_same_datasets(store.datasets(), json_datasets)
+
+
+def interleave(records, id_key, owner_key):
+    # Owner 4 gets the real records under even ids, owner 5 a copy of each under the odd id after it
+    mixed = []
+    for i, record in enumerate(records):
+        mixed.append({**record, id_key: str(2 * i), owner_key: "4"})
+        mixed.append({**record, id_key: str(2 * i + 1), owner_key: "5"})
+    return mixed
+
+
+def test_interleaved_devices_are_kept_apart(tmp_path, uvi_records, niwa_records, json_datasets):
+    data_dir = tmp_path / "data"
+    data_dir.mkdir()
+    uvi_mixed = interleave(uvi_records, "DataId", "DeviceId")
+    niwa_mixed = interleave(niwa_records, "ForecastId", "GeoLocationId")
+
+    # Device 5's full history first, so its ids run past every device 4 row still to come
+    write_export(data_dir / "device5_uvi.json", uvi_mixed[1::2])
+    write_export(data_dir / "location5_niwa.json", niwa_mixed[1::2])
+    for store_dir in ("store4", "store5"):
+        refresh_store(str(data_dir), str(tmp_path / store_dir), device_id=int(store_dir[-1]),
+                      location_id=int(store_dir[-1]))
+    write_export(data_dir / "early_uvi.json", uvi_mixed[:len(uvi_mixed) // 2])
+    write_export(data_dir / "early_niwa.json", niwa_mixed[:len(niwa_mixed) // 2])
+    for store_dir in ("store4", "store5"):
+        refresh_store(str(data_dir), str(tmp_path / store_dir), device_id=int(store_dir[-1]),
+                      location_id=int(store_dir[-1]))
+    write_export(data_dir / "later_uvi.json", uvi_mixed)
+    write_export(data_dir / "later_niwa.json", niwa_mixed)
+    store4 = refresh_store(str(data_dir), str(tmp_path / "store4"), device_id=4, location_id=4)
+    store5 = refresh_store(str(data_dir), str(tmp_path / "store5"), device_id=5, location_id=5)
+
+    assert_same_datasets(store4.datasets(), json_datasets)
+    np.testing.assert_array_equal(store4.arrays["uvi_data_id"], np.arange(0, len(uvi_mixed), 2))
+    np.testing.assert_array_equal(store4.arrays["niwa_forecast_id"], np.arange(0, len(niwa_mixed), 2))
+    np.testing.assert_array_equal(store5.arrays["uvi_data_id"], np.arange(1, len(uvi_mixed), 2))
+    np.testing.assert_array_equal(store5.arrays["niwa_forecast_id"], np.arange(1, len(niwa_mixed), 2))
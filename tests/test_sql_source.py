@@ -0,0 +1,65 @@
+import sqlite3
+
+import numpy as np
+import pytest
+
+from conftest import NIWA_EXPORT, UVI_EXPORT
+from sql_source import SqlSource, build_sqlite_standin, fetch_chunks, sqlite_pool
+
+DEVICE_ID = 4
+LOCATION_ID = 4
+
+
+@pytest.fixture(scope="module")
+def standin(tmp_path_factory):
+    db_path = str(tmp_path_factory.mktemp("sql") / "uvi_database.sqlite")
+    build_sqlite_standin(db_path, [UVI_EXPORT], [NIWA_EXPORT])
+    return db_path
+
+
+def test_available_dates_match_json_loader(standin, json_datasets):
+    source = SqlSource(sqlite_pool(standin), DEVICE_ID, LOCATION_ID)
+    assert list(source.available_dates()) == json_datasets[0].dates
+
+
+def test_windows_match_json_loader(standin, json_datasets):
+    source = SqlSource(sqlite_pool(standin), DEVICE_ID, LOCATION_ID, cached_windows=2)
+    dates = json_datasets[0].dates
+    # Dates either side of a window boundary, plus the first and last
+    boundary = next(i for i in range(len(dates) - 1) if source.window_start(dates[i]) != source.window_start(dates[i + 1]))
+    for selected_date in (dates[0], dates[boundary], dates[boundary + 1], dates[len(dates) // 2], dates[-1]):
+        window = source.window(selected_date)
+        for got, want in zip(window, json_datasets):
+            np.testing.assert_array_equal(got.for_date(selected_date)[1], want.for_date(selected_date)[1])
+            np.testing.assert_array_equal(got.local_epoch[got.date_slice(selected_date)],
+                                          want.local_epoch[want.date_slice(selected_date)])
+
+
+def test_windows_include_re_exported_forecasts(tmp_path, json_datasets):
+    db_path = str(tmp_path / "uvi_database.sqlite")
+    build_sqlite_standin(db_path, [UVI_EXPORT], [NIWA_EXPORT])
+    # Every third forecast was re-exported long after the days it covers
+    conn = sqlite3.connect(db_path)
+    conn.execute("UPDATE NiwaForecasts SET UpdatedAt = '2026-01-01 00:00:00' WHERE ForecastId % 3 = 0")
+    conn.commit()
+    conn.close()
+
+    source = SqlSource(sqlite_pool(db_path), DEVICE_ID, LOCATION_ID)
+    dates = json_datasets[0].dates
+    for selected_date in dates[::9]:
+        window = source.window(selected_date)
+        for got, want in zip(window[1:], json_datasets[1:]):
+            np.testing.assert_array_equal(got.local_epoch[got.date_slice(selected_date)],
+                                          want.local_epoch[want.date_slice(selected_date)])
+            np.testing.assert_array_equal(got.for_date(selected_date)[1], want.for_date(selected_date)[1])
+
+
+def test_closed_fetch_returns_connection_to_pool(standin):
+    pool = sqlite_pool(standin, size=2)
+    for _ in range(2):
+        chunks = fetch_chunks(pool, "SELECT DataId FROM Data", [])
+        next(chunks)
+        chunks.close()
+    # The connection is reused; leaked ones would leave the pool full with nothing idle, so
+    # the next query would block forever
+    assert pool._opened == 1 and pool._idle.qsize() == 1